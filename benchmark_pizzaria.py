@@ -0,0 +1,322 @@
+"""Suíte de benchmarks reprodutível do núcleo da pizzaria.
+
+Gera históricos sintéticos (semente fixa) com distribuições realistas de
+sabores, tamanhos, adicionais e horários, e mede:
+
+    carga        tempo de inicialização do SistemaPizzaria (carregar_dados)
+    salvar       latência por pedido criado com salvar_dados()
+    busca        latência de busca de pedido por número
+    relatorio    geração do relatório de vendas (último mês e histórico todo)
+    binario      o mesmo relatório sobre o histórico binário mapeado (historico_binario)
+    django       número de queries da view buscar_pedidos (opcional)
+
+Os resultados são gravados em JSON para comparação entre commits:
+
+    python benchmark_pizzaria.py --tamanhos 10000 100000 --saida antes.json
+    python benchmark_pizzaria.py --tamanhos 10000 100000 --saida depois.json --comparar antes.json
+
+O app Django também se chama pizzaria, então as queries são contadas num
+subprocesso em que o diretório atual vem antes deste no sys.path: rode a
+partir do diretório do projeto Django.
+
+    cd site && python /caminho/do/cli/benchmark_pizzaria.py --django-settings site.settings
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from medicao import configurar_django
+
+# O CLI só é importado dentro das funções: o subprocesso do Django precisa do app pizzaria
+if TYPE_CHECKING:
+    from pizzaria import Pedido
+
+# Pesos aproximados das vendas reais por sabor, tamanho e adicional
+PESOS_SABORES = {
+    "Calabresa": 24, "Marguerita": 20, "Frango c/ Catupiry": 18, "Portuguesa": 11,
+    "Quatro Queijos": 10, "Bacon": 8, "Presunto": 5, "Napolitana": 4,
+}
+PESOS_TAMANHOS = {"Pequena": 10, "Média": 33, "Grande": 42, "Família": 15}
+PESOS_ADICIONAIS = {
+    "Borda recheada": 40, "Catupiry extra": 20, "Cheddar extra": 15,
+    "Bacon": 12, "Azeitona": 8, "Palmito": 5,
+}
+# Probabilidade de um pedido ter 0, 1, 2 ou 3 adicionais
+PESOS_QTD_ADICIONAIS = [55, 30, 12, 3]
+# Distribuição dos pedidos pelas horas do dia (pico no jantar)
+PESOS_HORAS = {11: 4, 12: 8, 13: 6, 14: 2, 17: 3, 18: 10, 19: 20, 20: 22, 21: 15, 22: 7, 23: 3}
+# Sexta e sábado vendem mais
+PESOS_DIAS_SEMANA = [10, 10, 11, 12, 18, 22, 17]
+
+
+def gerar_historico(quantidade: int, semente: int = 42,
+                    fim: Optional[datetime.datetime] = None,
+                    pedidos_por_dia: int = 150) -> List["Pedido"]:
+    """Gera um histórico sintético de pedidos entregues, em ordem cronológica"""
+    from pizzaria import Pedido
+    rng = random.Random(semente)
+    fim = fim or datetime.datetime(2026, 1, 1)
+    dias = max(1, quantidade // pedidos_por_dia)
+    inicio = fim - datetime.timedelta(days=dias)
+
+    sabores, pesos_sabores = zip(*PESOS_SABORES.items())
+    tamanhos, pesos_tamanhos = zip(*PESOS_TAMANHOS.items())
+    adicionais, pesos_adicionais = zip(*PESOS_ADICIONAIS.items())
+    horas, pesos_horas = zip(*PESOS_HORAS.items())
+
+    # Sorteia os dias respeitando o peso de cada dia da semana
+    pesos_dias = [PESOS_DIAS_SEMANA[(inicio + datetime.timedelta(days=d)).weekday()]
+                  for d in range(dias)]
+    datas = []
+    for dia in rng.choices(range(dias), pesos_dias, k=quantidade):
+        hora = rng.choices(horas, pesos_horas)[0]
+        datas.append(inicio + datetime.timedelta(days=dia, hours=hora,
+                                                 seconds=rng.randrange(3600)))
+    datas.sort()
+
+    historico = []
+    for numero, data_hora in enumerate(datas, 1):
+        qtd = rng.choices(range(len(PESOS_QTD_ADICIONAIS)), PESOS_QTD_ADICIONAIS)[0]
+        escolhidos = []
+        while len(escolhidos) < qtd:
+            adicional = rng.choices(adicionais, pesos_adicionais)[0]
+            if adicional not in escolhidos:
+                escolhidos.append(adicional)
+        pedido = Pedido(
+            numero=numero,
+            cliente=f"Cliente {rng.randrange(quantidade // 4 + 1)} (11{rng.randrange(10**8, 10**9)})",
+            sabor=rng.choices(sabores, pesos_sabores)[0],
+            tamanho=rng.choices(tamanhos, pesos_tamanhos)[0],
+            adicional=escolhidos,
+            data_hora=data_hora,
+        )
+        pedido.status = "Entregue"
+        historico.append(pedido)
+    return historico
+
+
+def _cronometrar(funcao: Callable, repeticoes: int) -> List[float]:
+    """Executa a função várias vezes e retorna os tempos em segundos"""
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - t0)
+    return tempos
+
+
+class Benchmark:
+    """Executa os benchmarks de um conjunto de dados e acumula os resultados"""
+
+    def __init__(self, repeticoes: int = 5, semente: int = 42):
+        self.repeticoes = repeticoes
+        self.semente = semente
+        self.resultados: List[Dict] = []
+
+    def registrar(self, nome: str, dataset: str, valores: List[float], unidade: str) -> None:
+        self.resultados.append({
+            "nome": nome,
+            "dataset": dataset,
+            "mediana": statistics.median(valores),
+            "minimo": min(valores),
+            "maximo": max(valores),
+            "n": len(valores),
+            "unidade": unidade,
+        })
+        print(f"  {nome:<28} mediana={statistics.median(valores):10.3f} {unidade} "
+              f"(min {min(valores):.3f}, n={len(valores)})")
+
+    def executar(self, quantidade: int) -> None:
+        from historico_binario import HistoricoBinario, gravar_historico
+        from pizzaria import SistemaPizzaria
+
+        dataset = _rotulo(quantidade)
+        print(f"\n== Dataset {dataset} ({quantidade} pedidos) ==")
+        historico = gerar_historico(quantidade, self.semente)
+        diretorio = tempfile.mkdtemp(prefix="bench_pizzaria_")
+        try:
+            arquivo_pedidos = os.path.join(diretorio, "pedidos.pickle")
+            arquivo_cardapio = os.path.join(diretorio, "cardapio.pickle")
+            sistema = SistemaPizzaria(arquivo_pedidos, arquivo_cardapio)
+            sistema.historico_pedidos = historico
+            sistema.contador_pedidos = quantidade + 1
+            sistema.salvar_dados()
+            tamanho = sum(os.path.getsize(os.path.join(diretorio, nome)) for nome in os.listdir(diretorio))
+            self.registrar("tamanho_arquivo", dataset, [tamanho / 1024 / 1024], "MiB")
+
+            # Tempo de inicialização (inclui carregar_dados)
+            tempos = _cronometrar(lambda: SistemaPizzaria(arquivo_pedidos, arquivo_cardapio),
+                                  self.repeticoes)
+            self.registrar("carga_inicial", dataset, [t * 1000 for t in tempos], "ms")
+
+            # Latência de gravação por pedido novo
+            sistema = SistemaPizzaria(arquivo_pedidos, arquivo_cardapio)
+            tempos = _cronometrar(lambda: sistema.criar_pedido("Bench", "11999999999", "Calabresa",
+                                                              "Grande", ["Bacon"]),
+                                  self.repeticoes)
+            self.registrar("salvar_por_pedido", dataset, [t * 1000 for t in tempos], "ms")
+
+            # Busca por número (pedidos antigos, no histórico)
+            rng = random.Random(self.semente)
+            numeros = [rng.randint(1, quantidade) for _ in range(200)]
+            tempos = []
+            for numero in numeros:
+                t0 = time.perf_counter()
+                sistema.buscar_pedido(numero)
+                tempos.append(time.perf_counter() - t0)
+            self.registrar("busca_por_numero", dataset, [t * 1e6 for t in tempos], "us")
+
+            # Relatórios
+            fim = historico[-1].data_hora
+            ultimo_mes = fim - datetime.timedelta(days=30)
+            tempos = _cronometrar(lambda: sistema.gerar_relatorio(ultimo_mes, fim), self.repeticoes)
+            self.registrar("relatorio_ultimo_mes", dataset, [t * 1000 for t in tempos], "ms")
+            inicio = datetime.datetime(1900, 1, 1)
+            tempos = _cronometrar(lambda: sistema.gerar_relatorio(inicio, fim), self.repeticoes)
+            self.registrar("relatorio_historico", dataset, [t * 1000 for t in tempos], "ms")
+
+            # Mesmo relatório sobre o histórico binário mapeado
+            arquivo_binario = os.path.join(diretorio, "historico.bin")
+            gravar_historico(historico, arquivo_binario, sistema.motor_precos)
+            with HistoricoBinario(arquivo_binario) as binario:
+                tempos = _cronometrar(lambda: binario.relatorio(inicio, fim), self.repeticoes)
+            self.registrar("relatorio_binario_historico", dataset, [t * 1000 for t in tempos], "ms")
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    def executar_django(self, app: str, settings: str) -> None:
+        """Conta as queries das views Django num subprocesso (sem o CLI importado)"""
+        diretorio = os.path.dirname(os.path.abspath(__file__))
+        ambiente = dict(os.environ)
+        # Com -m, o diretório atual (o projeto Django) vem antes deste no sys.path
+        ambiente["PYTHONPATH"] = os.pathsep.join(filter(None, [ambiente.get("PYTHONPATH"), diretorio]))
+        with tempfile.TemporaryDirectory(prefix="bench_django_") as temporario:
+            saida = os.path.join(temporario, "django.json")
+            subprocess.run([sys.executable, "-m", "benchmark_pizzaria", "--somente-django",
+                            "--django-settings", settings, "--app", app,
+                            "--repeticoes", str(self.repeticoes), "--saida", saida],
+                           env=ambiente, check=True)
+            with open(saida, encoding="utf-8") as f:
+                self.resultados.extend(json.load(f)["resultados"])
+
+    def contar_queries_django(self, app: str) -> None:
+        """Conta as queries da view buscar_pedidos no banco configurado"""
+        configurar_django(app)
+        from importlib import import_module
+        from asgiref.sync import async_to_sync
+        from django.db import connection
+        from django.test import RequestFactory
+        from django.test.utils import CaptureQueriesContext
+
+        views = import_module(f"{app}.views")
+        # buscar_pedidos é assíncrona; async_to_sync mantém as queries nesta thread
+        buscar_pedidos = async_to_sync(views.buscar_pedidos)
+        fabrica = RequestFactory()
+        print("\n== Django ==")
+        for rotulo, parametros in (("buscar_pedidos", {}), ("buscar_pedidos_termo", {"q": "a"})):
+            tempos, consultas = [], []
+            for _ in range(self.repeticoes):
+                requisicao = fabrica.get("/api/pedidos/", parametros)
+                with CaptureQueriesContext(connection) as contexto:
+                    t0 = time.perf_counter()
+                    buscar_pedidos(requisicao)
+                    tempos.append((time.perf_counter() - t0) * 1000)
+                consultas.append(len(contexto.captured_queries))
+            self.registrar(f"{rotulo}_queries", "django", consultas, "queries")
+            self.registrar(f"{rotulo}_latencia", "django", tempos, "ms")
+
+
+def _rotulo(quantidade: int) -> str:
+    if quantidade >= 1_000_000 and quantidade % 1_000_000 == 0:
+        return f"{quantidade // 1_000_000}M"
+    if quantidade >= 1000 and quantidade % 1000 == 0:
+        return f"{quantidade // 1000}k"
+    return str(quantidade)
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual: List[Dict], anterior: List[Dict]) -> None:
+    """Mostra a variação das medianas em relação a uma execução anterior"""
+    base = {(r["nome"], r["dataset"]): r for r in anterior}
+    print("\n== Comparação (mediana) ==")
+    for resultado in atual:
+        referencia = base.get((resultado["nome"], resultado["dataset"]))
+        if not referencia or not referencia["mediana"]:
+            continue
+        variacao = (resultado["mediana"] / referencia["mediana"] - 1) * 100
+        print(f"  {resultado['dataset']:>6} {resultado['nome']:<28} "
+              f"{referencia['mediana']:10.3f} -> {resultado['mediana']:10.3f} "
+              f"{resultado['unidade']} ({variacao:+.1f}%)")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks do sistema da pizzaria")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000],
+                        help="quantidades de pedidos no histórico (ex.: 10000 100000 1000000)")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default="benchmark_resultados.json")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--django-settings", help="inclui a contagem de queries das views Django")
+    parser.add_argument("--app", default="pizzaria", help="app Django com as views")
+    # Usada pelo subprocesso de executar_django
+    parser.add_argument("--somente-django", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    benchmark = Benchmark(args.repeticoes, args.semente)
+    if args.somente_django:
+        os.environ["DJANGO_SETTINGS_MODULE"] = args.django_settings
+        try:
+            benchmark.contar_queries_django(args.app)
+        except ImportError as erro:
+            parser.error(str(erro))
+    else:
+        for quantidade in args.tamanhos:
+            benchmark.executar(quantidade)
+        if args.django_settings:
+            try:
+                benchmark.executar_django(args.app, args.django_settings)
+            except subprocess.CalledProcessError:
+                print("⚠️ Contagem de queries do Django falhou (veja o erro acima).")
+
+    saida = {
+        "meta": {
+            "commit": _commit_atual(),
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "semente": args.semente,
+            "repeticoes": args.repeticoes,
+        },
+        "resultados": benchmark.resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(saida, f, indent=2, ensure_ascii=False)
+    if not args.somente_django:
+        print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(benchmark.resultados, json.load(f)["resultados"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Teste de carga das APIs JSON consultadas em polling.
+
+Simula muitos clientes (tablets da cozinha, caixas) fazendo requisições em
+loop fechado contra um servidor já rodando, com conexões keep-alive, e mede
+a vazão e os percentis de latência para cada nível de concorrência. Só usa a
+biblioteca padrão (asyncio).
+
+Além dos GETs de polling, --post inclui escritas na rotação, como a troca
+de status que os tablets fazem (o token CSRF é gerado pelo próprio cliente,
+no cookie e no cabeçalho):
+
+    python carga_api.py http://127.0.0.1:8000 --caminho /api/pedidos/ \
+        --post /api/pedido/1/status/ "status=Em preparo"
+
+Para comparar WSGI e ASGI com o mesmo número de workers, rode o mesmo teste
+contra cada servidor e compare a vazão nos níveis com p99 equivalente:
+
+    gunicorn site.wsgi -w 4 --threads 4
+    python carga_api.py http://127.0.0.1:8000 --clientes 10 50 200 --saida wsgi.json
+
+    uvicorn site.asgi:application --workers 4
+    python carga_api.py http://127.0.0.1:8000 --clientes 10 50 200 --saida asgi.json --comparar wsgi.json
+"""
+import argparse
+import asyncio
+import json
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote_plus, urlsplit
+
+from medicao import percentil
+
+CAMINHOS_PADRAO = ["/api/pedidos/", "/api/pedidos/?q=a", "/api/sabor/1/precos/"]
+
+# (método, caminho, corpo form-urlencoded)
+Requisicao = Tuple[str, str, str]
+
+
+async def _abrir(host: str, porta: int) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    return await asyncio.open_connection(host, porta)
+
+
+def _corpo_formulario(corpo: str) -> str:
+    """Codifica "campo=valor&..." escrito à mão (aceita espaços nos valores)"""
+    pares = (par.partition("=") for par in corpo.split("&") if par)
+    return "&".join(f"{quote_plus(nome)}={quote_plus(valor)}" for nome, _, valor in pares)
+
+
+async def _ler_corpo(leitor: asyncio.StreamReader, cabecalhos: Dict[str, str], status: int) -> bool:
+    """Consome o corpo da resposta; retorna se a conexão pode ser reaproveitada"""
+    if status in (204, 304) or 100 <= status < 200:
+        return True
+    if "chunked" in cabecalhos.get("transfer-encoding", "").lower():
+        while True:
+            linha = await leitor.readuntil(b"\r\n")
+            tamanho = int(linha.split(b";")[0], 16)
+            if tamanho == 0:
+                # Trailers opcionais até a linha vazia
+                while await leitor.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return True
+            await leitor.readexactly(tamanho + 2)
+    if "content-length" in cabecalhos:
+        await leitor.readexactly(int(cabecalhos["content-length"]))
+        return cabecalhos.get("connection", "").lower() != "close"
+    # Sem tamanho: o corpo vai até o servidor fechar a conexão
+    await leitor.read()
+    return False
+
+
+async def _requisitar(leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter,
+                      host: str, requisicao: Requisicao, token_csrf: str) -> Tuple[int, bool]:
+    """Faz uma requisição keep-alive; retorna o status HTTP e se a conexão continua aberta"""
+    metodo, caminho, corpo = requisicao
+    linhas = [f"{metodo} {caminho} HTTP/1.1", f"Host: {host}", "Accept: application/json"]
+    if metodo == "POST":
+        dados = corpo.encode()
+        linhas += [
+            "Content-Type: application/x-www-form-urlencoded",
+            f"Content-Length: {len(dados)}",
+            f"Cookie: csrftoken={token_csrf}",
+            f"X-CSRFToken: {token_csrf}",
+        ]
+    else:
+        dados = b""
+    escritor.write(("\r\n".join(linhas) + "\r\n\r\n").encode() + dados)
+    await escritor.drain()
+    cabecalho = await leitor.readuntil(b"\r\n\r\n")
+    linhas = cabecalho.decode("latin-1").split("\r\n")
+    status = int(linhas[0].split()[1])
+    cabecalhos = {}
+    for linha in linhas[1:]:
+        nome, _, valor = linha.partition(":")
+        cabecalhos[nome.strip().lower()] = valor.strip()
+    return status, await _ler_corpo(leitor, cabecalhos, status)
+
+
+async def _cliente(host: str, porta: int, requisicoes: List[Requisicao], fim: float,
+                   latencias: Dict[str, List[float]], latencias_erro: Dict[int, List[float]],
+                   erros: List[int]) -> None:
+    conexao = None
+    indice = 0
+    token_csrf = secrets.token_hex(16)
+    while time.perf_counter() < fim:
+        requisicao = requisicoes[indice % len(requisicoes)]
+        indice += 1
+        inicio = time.perf_counter()
+        try:
+            if conexao is None:
+                conexao = await _abrir(host, porta)
+            status, manter = await _requisitar(*conexao, host, requisicao, token_csrf)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError):
+            erros[0] += 1
+            conexao = None
+            await asyncio.sleep(0.01)
+            continue
+        if not manter:
+            conexao[1].close()
+            conexao = None
+        latencia = (time.perf_counter() - inicio) * 1000
+        # Respostas de erro costumam ser rápidas: ficam fora da vazão e dos percentis
+        if status >= 400:
+            latencias_erro.setdefault(status, []).append(latencia)
+        else:
+            latencias.setdefault(requisicao[0], []).append(latencia)
+    if conexao is not None:
+        conexao[1].close()
+
+
+async def medir_nivel(url: str, clientes: int, duracao: float, requisicoes: List[Requisicao]) -> Dict:
+    """Roda `clientes` clientes concorrentes por `duracao` segundos.
+
+    Vazão e percentis contam só as respostas bem-sucedidas; as de erro
+    (status >= 400) são resumidas à parte, por status, em "erros_http", e
+    "erros" soma essas com as falhas de conexão.
+    """
+    partes = urlsplit(url)
+    host, porta = partes.hostname, partes.port or 80
+    por_metodo: Dict[str, List[float]] = {}
+    por_status: Dict[int, List[float]] = {}
+    erros = [0]
+    inicio = time.perf_counter()
+    fim = inicio + duracao
+    await asyncio.gather(*(_cliente(host, porta, requisicoes, fim, por_metodo, por_status, erros)
+                           for _ in range(clientes)))
+    decorrido = time.perf_counter() - inicio
+    latencias = sorted(latencia for valores in por_metodo.values() for latencia in valores)
+    resultado = {
+        "clientes": clientes,
+        "requisicoes": len(latencias),
+        "erros": erros[0] + sum(len(valores) for valores in por_status.values()),
+        "vazao_rps": len(latencias) / decorrido,
+        "p50_ms": percentil(latencias, 50) if latencias else 0.0,
+        "p90_ms": percentil(latencias, 90) if latencias else 0.0,
+        "p99_ms": percentil(latencias, 99) if latencias else 0.0,
+        "por_metodo": {},
+        "erros_http": {},
+    }
+    for metodo, valores in por_metodo.items():
+        valores.sort()
+        resultado["por_metodo"][metodo] = {
+            "requisicoes": len(valores),
+            "p50_ms": percentil(valores, 50),
+            "p99_ms": percentil(valores, 99),
+        }
+    for status, valores in sorted(por_status.items()):
+        valores.sort()
+        resultado["erros_http"][str(status)] = {
+            "requisicoes": len(valores),
+            "p50_ms": percentil(valores, 50),
+        }
+    return resultado
+
+
+def comparar(atual: List[Dict], anterior: List[Dict]) -> None:
+    """Compara vazão e p99 nível a nível com uma execução anterior"""
+    base = {r["clientes"]: r for r in anterior}
+    print("\n== Comparação ==")
+    for resultado in atual:
+        referencia = base.get(resultado["clientes"])
+        if not referencia or not referencia["vazao_rps"]:
+            continue
+        variacao = (resultado["vazao_rps"] / referencia["vazao_rps"] - 1) * 100
+        print(f"  {resultado['clientes']:>5} clientes: {referencia['vazao_rps']:8.1f} -> "
+              f"{resultado['vazao_rps']:8.1f} req/s ({variacao:+.1f}%) | p99 "
+              f"{referencia['p99_ms']:.1f} -> {resultado['p99_ms']:.1f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Teste de carga das APIs JSON da pizzaria")
+    parser.add_argument("url", help="endereço do servidor (ex.: http://127.0.0.1:8000)")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[10, 50, 200],
+                        help="níveis de concorrência")
+    parser.add_argument("--duracao", type=float, default=15.0, help="segundos por nível")
+    parser.add_argument("--caminho", action="append", dest="caminhos",
+                        help="caminho consultado com GET (repetível; padrão: APIs de polling)")
+    parser.add_argument("--post", nargs=2, action="append", metavar=("CAMINHO", "CORPO"),
+                        help='POST na rotação, corpo "campo=valor&..." (repetível)')
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    args = parser.parse_args(argv)
+
+    requisicoes: List[Requisicao] = [("GET", caminho, "") for caminho in args.caminhos or []]
+    requisicoes += [("POST", caminho, _corpo_formulario(corpo)) for caminho, corpo in args.post or []]
+    if not requisicoes:
+        requisicoes = [("GET", caminho, "") for caminho in CAMINHOS_PADRAO]
+    resultados = []
+    for clientes in args.clientes:
+        resultado = asyncio.run(medir_nivel(args.url, clientes, args.duracao, requisicoes))
+        resultados.append(resultado)
+        metodos = " ".join(f"{metodo} p99={valores['p99_ms']:.1f}ms"
+                           for metodo, valores in resultado["por_metodo"].items())
+        erros_http = " ".join(f"{status}x{valores['requisicoes']}"
+                              for status, valores in resultado["erros_http"].items())
+        print(f"{clientes:>5} clientes: {resultado['vazao_rps']:8.1f} req/s | "
+              f"p50={resultado['p50_ms']:.1f}ms p90={resultado['p90_ms']:.1f}ms "
+              f"p99={resultado['p99_ms']:.1f}ms | {metodos} | erros={resultado['erros']}"
+              + (f" ({erros_http})" if erros_http else ""))
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultados, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
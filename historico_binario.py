@@ -0,0 +1,245 @@
+"""Histórico de pedidos em registros binários de tamanho fixo, lido via mmap.
+
+Cada pizza de um pedido vira um registro de 24 bytes (little-endian):
+
+    numero       uint32   número do pedido (repetido nas pizzas do mesmo pedido)
+    data_hora    int64    segundos desde 1970-01-01 (horário local, sem fuso)
+    sabor        uint16   código no dicionário
+    tamanho      uint8    código no dicionário
+    status       uint8    código no dicionário (status do pedido)
+    adicionais   uint32   máscara de bits (bit i = adicional de código i)
+    valor        int32    centavos do pedido inteiro na primeira pizza e 0 nas
+                          demais (-1 em todas se algum item saiu do cardápio)
+
+Os nomes ficam no arquivo de dicionário ao lado (<arquivo>.json). Os
+registros são gravados em ordem de data (as pizzas de um pedido ficam
+juntas e nunca são separadas pelo período), então um período é localizado por
+busca binária e varrido direto no buffer mapeado: com NumPy via
+`frombuffer`, sem ele com `struct.iter_unpack` sobre um `memoryview`.
+Nenhum objeto Pedido é criado.
+
+    python historico_binario.py converter pedidos.pickle historico.bin
+    python historico_binario.py relatorio historico.bin --de 2025-01-01 --ate 2025-12-31
+"""
+import argparse
+import datetime
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, List, Optional
+
+from pizzaria import MotorPrecos, Pedido, SistemaPizzaria, exibir_relatorio
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FORMATO_REGISTRO = struct.Struct("<IqHBBIi")
+EPOCA = datetime.datetime(1970, 1, 1)
+SEGUNDOS_DIA = 86400
+MAXIMO_ADICIONAIS = 32
+
+if np is not None:
+    TIPO_REGISTRO = np.dtype([
+        ("numero", "<u4"), ("data_hora", "<i8"), ("sabor", "<u2"), ("tamanho", "u1"),
+        ("status", "u1"), ("adicionais", "<u4"), ("valor", "<i4"),
+    ])
+
+
+def _segundos(momento: datetime.datetime) -> int:
+    return int((momento - EPOCA).total_seconds())
+
+
+def _codigo(nomes: List[str], codigos: Dict[str, int], nome: str) -> int:
+    """Código do nome, acrescentando-o à lista (e ao índice nome -> código) se for novo"""
+    codigo = codigos.get(nome)
+    if codigo is None:
+        codigo = codigos[nome] = len(nomes)
+        nomes.append(nome)
+    return codigo
+
+
+def gravar_historico(pedidos: Iterable[Pedido], caminho: str, motor_precos: MotorPrecos) -> int:
+    """Converte os pedidos para o formato binário e retorna quantos foram gravados"""
+    dicionario = {"sabores": [], "tamanhos": [], "status": [], "adicionais": []}
+    codigos: Dict[str, Dict[str, int]] = {chave: {} for chave in dicionario}
+    pedidos = sorted(pedidos, key=lambda p: (p.data_hora, p.numero))
+    with open(caminho + ".tmp", "wb") as f:
+        for pedido in pedidos:
+            valor = motor_precos.valor_pedido(pedido)
+            centavos = -1 if valor is None else round(valor * 100)
+            for item in pedido.itens:
+                mascara = 0
+                for adicional in item.adicional:
+                    codigo = _codigo(dicionario["adicionais"], codigos["adicionais"], adicional)
+                    if codigo >= MAXIMO_ADICIONAIS:
+                        raise ValueError(f"Mais de {MAXIMO_ADICIONAIS} adicionais distintos no histórico")
+                    mascara |= 1 << codigo
+                f.write(FORMATO_REGISTRO.pack(
+                    pedido.numero,
+                    _segundos(pedido.data_hora),
+                    _codigo(dicionario["sabores"], codigos["sabores"], item.sabor),
+                    _codigo(dicionario["tamanhos"], codigos["tamanhos"], item.tamanho),
+                    _codigo(dicionario["status"], codigos["status"], pedido.status),
+                    mascara,
+                    centavos,
+                ))
+                centavos = min(centavos, 0)
+    with open(caminho + ".json", "w", encoding="utf-8") as f:
+        json.dump(dicionario, f, ensure_ascii=False)
+    os.replace(caminho + ".tmp", caminho)
+    return len(pedidos)
+
+
+class HistoricoBinario:
+    """Leitura do histórico binário mapeado em memória"""
+
+    def __init__(self, caminho: str):
+        with open(caminho + ".json", encoding="utf-8") as f:
+            self.dicionario: Dict[str, List[str]] = json.load(f)
+        self._arquivo = open(caminho, "rb")
+        tamanho = os.fstat(self._arquivo.fileno()).st_size
+        self._mapa = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ) if tamanho else None
+        self.buffer = memoryview(self._mapa) if self._mapa is not None else memoryview(b"")
+
+    def __len__(self) -> int:
+        return len(self.buffer) // FORMATO_REGISTRO.size
+
+    def fechar(self) -> None:
+        self.buffer.release()
+        if self._mapa is not None:
+            self._mapa.close()
+        self._arquivo.close()
+
+    def __enter__(self) -> "HistoricoBinario":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.fechar()
+
+    def _data_registro(self, posicao: int) -> int:
+        return struct.unpack_from("<q", self.buffer, posicao * FORMATO_REGISTRO.size + 4)[0]
+
+    def _posicao(self, segundos: int, depois: bool = False) -> int:
+        """Busca binária pela data (bisect_left, ou bisect_right se depois=True)"""
+        inicio, fim = 0, len(self)
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            data = self._data_registro(meio)
+            if data < segundos or (depois and data == segundos):
+                inicio = meio + 1
+            else:
+                fim = meio
+        return inicio
+
+    def _fatia(self, data_inicio: Optional[datetime.datetime],
+               data_fim: Optional[datetime.datetime]) -> memoryview:
+        primeiro = 0 if data_inicio is None else self._posicao(_segundos(data_inicio))
+        ultimo = len(self) if data_fim is None else self._posicao(_segundos(data_fim), depois=True)
+        return self.buffer[primeiro * FORMATO_REGISTRO.size:max(primeiro, ultimo) * FORMATO_REGISTRO.size]
+
+    def relatorio(self, data_inicio: Optional[datetime.datetime] = None,
+                  data_fim: Optional[datetime.datetime] = None) -> Optional[Dict]:
+        """Mesmos campos de SistemaPizzaria.gerar_relatorio, calculados sobre o buffer"""
+        fatia = self._fatia(data_inicio, data_fim)
+        if not len(fatia):
+            return None
+        if np is not None:
+            contagens = self._contar_numpy(fatia)
+        else:
+            contagens = self._contar_struct(fatia)
+        sabores, tamanhos, adicionais, dias, centavos, total = contagens
+
+        nomes = self.dicionario
+        return {
+            "total_pedidos": total,
+            "faturamento": centavos / 100,
+            "sabores": {nomes["sabores"][c]: q for c, q in enumerate(sabores) if q},
+            "adicionais": {nomes["adicionais"][c]: q for c, q in enumerate(adicionais) if q},
+            "tamanhos": {nomes["tamanhos"][c]: q for c, q in enumerate(tamanhos) if q},
+            "vendas_por_dia": {
+                (EPOCA + datetime.timedelta(days=dia)).strftime("%d/%m/%Y"): q
+                for dia, q in dias.items()
+            },
+        }
+
+    def _contar_numpy(self, fatia: memoryview):
+        registros = np.frombuffer(fatia, dtype=TIPO_REGISTRO)
+        sabores = np.bincount(registros["sabor"], minlength=len(self.dicionario["sabores"])).tolist()
+        tamanhos = np.bincount(registros["tamanho"], minlength=len(self.dicionario["tamanhos"])).tolist()
+        mascaras = registros["adicionais"]
+        adicionais = [int(np.count_nonzero(mascaras & np.uint32(1 << bit)))
+                      for bit in range(len(self.dicionario["adicionais"]))]
+        # Primeira pizza de cada pedido: pedidos e vendas por dia contam só ela
+        numeros = registros["numero"]
+        primeiras = np.ones(len(registros), dtype=bool)
+        primeiras[1:] = numeros[1:] != numeros[:-1]
+        dias, quantidades = np.unique(registros["data_hora"][primeiras] // SEGUNDOS_DIA, return_counts=True)
+        valores = registros["valor"]
+        centavos = int(valores[valores >= 0].sum(dtype=np.int64))
+        return (sabores, tamanhos, adicionais, dict(zip(dias.tolist(), quantidades.tolist())),
+                centavos, int(np.count_nonzero(primeiras)))
+
+    def _contar_struct(self, fatia: memoryview):
+        sabores = [0] * len(self.dicionario["sabores"])
+        tamanhos = [0] * len(self.dicionario["tamanhos"])
+        adicionais = [0] * len(self.dicionario["adicionais"])
+        dias: Dict[int, int] = {}
+        centavos = total = 0
+        numero_anterior = None
+        for numero, data, sabor, tamanho, _, mascara, valor in FORMATO_REGISTRO.iter_unpack(fatia):
+            sabores[sabor] += 1
+            tamanhos[tamanho] += 1
+            while mascara:
+                bit = mascara & -mascara
+                adicionais[bit.bit_length() - 1] += 1
+                mascara ^= bit
+            if numero != numero_anterior:
+                numero_anterior = numero
+                total += 1
+                dia = data // SEGUNDOS_DIA
+                dias[dia] = dias.get(dia, 0) + 1
+            if valor >= 0:
+                centavos += valor
+        return sabores, tamanhos, adicionais, dias, centavos, total
+
+
+def _data(valor: str) -> datetime.datetime:
+    return datetime.datetime.strptime(valor, "%Y-%m-%d")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Histórico de pedidos em formato binário mapeado")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    converter = comandos.add_parser("converter", help="gera o arquivo binário a partir do pickle")
+    converter.add_argument("pedidos", help="arquivo pickle de pedidos")
+    converter.add_argument("saida", help="arquivo binário de saída")
+    converter.add_argument("--cardapio", default="cardapio.pickle")
+
+    relatorio = comandos.add_parser("relatorio", help="relatório de vendas sobre o arquivo binário")
+    relatorio.add_argument("arquivo")
+    relatorio.add_argument("--de", type=_data, help="data inicial (AAAA-MM-DD)")
+    relatorio.add_argument("--ate", type=_data, help="data final (AAAA-MM-DD)")
+    args = parser.parse_args(argv)
+
+    if args.comando == "converter":
+        sistema = SistemaPizzaria(args.pedidos, args.cardapio)
+        total = gravar_historico(sistema.iterar_pedidos(incluir_fila=False), args.saida,
+                                 sistema.motor_precos)
+        print(f"✅ {total} pedidos gravados em {args.saida}")
+        return
+
+    data_fim = args.ate.replace(hour=23, minute=59, second=59) if args.ate else None
+    with HistoricoBinario(args.arquivo) as historico:
+        resultado = historico.relatorio(args.de, data_fim)
+    if resultado is None:
+        print("Nenhum pedido encontrado para o período!")
+        return
+    exibir_relatorio("do arquivo binário", resultado)
+
+
+if __name__ == "__main__":
+    main()
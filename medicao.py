@@ -0,0 +1,29 @@
+"""Funções comuns dos scripts de medição (replay, benchmark, teste de carga).
+
+Não importa o CLI (pizzaria.py) nem o Django: o app Django também se chama
+pizzaria, e só um dos dois pode ser o módulo `pizzaria` de um processo.
+"""
+import importlib.util
+from typing import List
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por interpolação linear (valores já ordenados)"""
+    if not valores:
+        return 0.0
+    posicao = (len(valores) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicao - inferior)
+
+
+def configurar_django(app: str) -> None:
+    """Inicializa o Django, recusando um `app` que resolve para o pizzaria.py do CLI"""
+    especificacao = importlib.util.find_spec(app)
+    if especificacao is not None and especificacao.submodule_search_locations is None:
+        raise ImportError(
+            f"'{app}' resolve para {especificacao.origin}, não para o app Django: o CLI e o app "
+            f"têm o mesmo nome. Rode a partir do diretório do projeto Django, com o diretório "
+            f"do CLI no PYTHONPATH")
+    import django
+    django.setup()
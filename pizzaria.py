@@ -1,52 +1,1410 @@
 import os
+import sys
+import argparse
+import contextlib
+import copy
+import csv
+import json
+import time
+import re
 import pickle
 import datetime
-from typing import List, Dict, Optional
+import bisect
+import functools
+import gzip
+import heapq
+import itertools
+import math
+import threading
+import tracemalloc
+from collections import deque, OrderedDict
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator, Callable
+
+from medicao import percentil
+
+# Tempo base de preparo (em minutos) por tamanho de pizza
+TEMPO_BASE_PREPARO = {
+    "Pequena": 15,
+    "Média": 20,
+    "Grande": 25,
+    "Família": 30
+}
+TEMPO_PADRAO_PREPARO = 20
+MINUTOS_POR_ADICIONAL = 2
+
+# Status que um pedido pode ter enquanto está na fila
+STATUS_FILA = ["Pendente", "Em preparo", "Pronto", "Saiu para entrega"]
+
+# Etapas de cada pizza (item) do pedido na cozinha
+STATUS_ITEM = ["Pendente", "Em preparo", "Pronto"]
+
+# Status em que o pedido ainda vai consumir ingredientes na cozinha
+STATUS_COZINHA = ("Pendente", "Em preparo")
+
+# Fornadas: pizzas idênticas pedidas dentro da janela vão juntas ao forno
+JANELA_LOTE_MINUTOS = 10
+CAPACIDADE_FORNO = 4
+MINUTOS_POR_PIZZA_EXTRA = 3  # montagem de cada pizza a mais na fornada
+
+# Consumo (em gramas) de cada ingrediente numa pizza Média
+CONSUMO_INGREDIENTES = {
+    "massa": 250,
+    "molho de tomate": 80,
+    "muçarela": 150,
+    "calabresa": 90,
+    "frango": 100,
+    "catupiry": 60,
+    "presunto": 80,
+    "ovos": 50,
+    "bacon": 70,
+    "provolone": 50,
+    "parmesão": 30,
+    "parmesão ralado": 20,
+    "gorgonzola": 40,
+    "borda recheada": 80,
+}
+CONSUMO_PADRAO = 50
+CONSUMO_ADICIONAL_PADRAO = 40
+FATOR_TAMANHO = {"Pequena": 0.6, "Média": 1.0, "Grande": 1.4, "Família": 1.8}
+
+# Colunas dos arquivos exportados e formatos suportados
+# (sabor/tamanho/adicionais são da primeira pizza; "itens" descreve todas)
+COLUNAS_EXPORTACAO = ["numero", "cliente", "sabor", "tamanho", "adicionais", "itens", "observacoes",
+                      "data_hora", "status", "tempo_preparo", "valor_total"]
+FORMATOS_EXPORTACAO = ("csv", "jsonl", "parquet")
+TAMANHO_SEGMENTO = 1000
+
+# Acima de tantos segmentos pequenos (anexados a cada salvamento) o histórico é regravado
+SEGMENTOS_EXTRAS_HISTORICO = 50
+
+# Pedidos entregues há mais dias que isso podem ir para o arquivo frio
+DIAS_ARQUIVAMENTO = 90
+PEDIDOS_POR_SEGMENTO_ARQUIVO = 5000
+SEGMENTOS_EM_MEMORIA = 4
+
+# Janelas (em minutos) das métricas da cozinha e limites dos buckets de espera
+JANELAS_METRICAS = (15, 60, 180)
+LIMITES_ESPERA_MINUTOS = [5, 10, 15, 20, 25, 30, 40, 50, 60, 75, 90, 120, 180]
+
+# "Em alta": meia-vida do decaimento e número de contadores de cada resumo
+MEIA_VIDA_TENDENCIAS_MINUTOS = 30
+CAPACIDADE_TENDENCIAS = 32
+
+
+@contextlib.contextmanager
+def gravacao_atomica(caminho: str) -> Iterator:
+    """Grava num temporário e só o renomeia sobre `caminho` se a escrita terminar.
+
+    Leitores (e um processo que caia no meio) veem o arquivo antigo ou o
+    novo inteiro, nunca um arquivo pela metade.
+    """
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as f:
+        yield f
+    os.replace(temporario, caminho)
+
+
+def normalizar_telefone(telefone: str) -> str:
+    """Mantém só os dígitos do telefone, sem o código do país (55)"""
+    digitos = re.sub(r"\D", "", telefone or "")
+    if len(digitos) in (12, 13) and digitos.startswith("55"):
+        digitos = digitos[2:]
+    return digitos
+
+
+def separar_cliente(cliente: str) -> Tuple[str, str]:
+    """Separa o campo cliente no formato "Nome (telefone)" em (nome, telefone)"""
+    # Telefones costumam ter parênteses no DDD, então o nome vai até o primeiro " ("
+    correspondencia = re.match(r"^(.*?) \((.*)\)$", cliente or "")
+    if correspondencia is None:
+        return cliente, ""
+    return correspondencia.group(1), correspondencia.group(2)
+
+
+def normalizar_ingrediente(nome: str) -> str:
+    """Normaliza o nome de um ingrediente para busca (espaços e maiúsculas)"""
+    return " ".join(nome.split()).casefold()
+
+
+def calcular_tempo_preparo(tamanho: str, qtd_adicionais: int) -> int:
+    """Calcula o tempo estimado de preparo em minutos"""
+    tempo = TEMPO_BASE_PREPARO.get(tamanho, TEMPO_PADRAO_PREPARO)
+    # Adiciona 2 minutos para cada adicional
+    return tempo + qtd_adicionais * MINUTOS_POR_ADICIONAL
+
+
+class ItemPedido:
+    """Uma pizza do pedido. Cada item passa pela cozinha (Pendente ->
+    Em preparo -> Pronto) independente das outras pizzas do mesmo pedido."""
+
+    def __init__(self, sabor: str, tamanho: str = "Média", adicional: List[str] = None):
+        self.sabor = sabor
+        self.tamanho = tamanho
+        self.adicional = adicional or []
+        self.status = "Pendente"
+        self.tempo_preparo = self._calcular_tempo_preparo()
+
+    def _calcular_tempo_preparo(self) -> int:
+        """Calcula o tempo estimado de preparo em minutos"""
+        return calcular_tempo_preparo(self.tamanho, len(self.adicional))
+
+    def __str__(self) -> str:
+        adicionais = ", ".join(self.adicional) if self.adicional else "Nenhum"
+        return f"{self.sabor} ({self.tamanho}) | Adicionais: {adicionais} | {self.status}"
+
 
 class Pedido:
     def __init__(self, numero: int, cliente: str, sabor: str, tamanho: str = "Média",
                  adicional: List[str] = None, observacoes: str = "",
-                 data_hora: datetime.datetime = None):
+                 data_hora: datetime.datetime = None,
+                 outras_pizzas: Optional[List[ItemPedido]] = None):
         self.numero = numero
         self.cliente = cliente
-        self.sabor = sabor
-        self.tamanho = tamanho
-        self.adicional = adicional or []
+        # sabor/tamanho/adicional descrevem a primeira pizza; `outras_pizzas` traz as demais
+        self.itens = [ItemPedido(sabor, tamanho, adicional)] + list(outras_pizzas or [])
         self.observacoes = observacoes
         self.data_hora = data_hora or datetime.datetime.now()
         self.status = "Pendente"
+        self.data_entrega: Optional[datetime.datetime] = None
         self.tempo_preparo = self._calcular_tempo_preparo()
+        # Incrementada a cada alteração; identifica o texto já formatado na fila
+        self.versao = 0
+
+    def __setstate__(self, estado: Dict) -> None:
+        # Pickles anteriores aos itens guardavam uma única pizza no próprio pedido
+        if "itens" not in estado:
+            item = ItemPedido(estado.pop("sabor"), estado.pop("tamanho"), estado.pop("adicional"))
+            item.status = estado["status"] if estado["status"] in STATUS_COZINHA else "Pronto"
+            estado["itens"] = [item]
+        estado.setdefault("data_entrega", None)
+        estado.setdefault("versao", 0)
+        self.__dict__.update(estado)
+
+    # A primeira pizza continua acessível pelos nomes antigos
+    @property
+    def sabor(self) -> str:
+        return self.itens[0].sabor
+
+    @sabor.setter
+    def sabor(self, valor: str) -> None:
+        self.itens[0].sabor = valor
+
+    @property
+    def tamanho(self) -> str:
+        return self.itens[0].tamanho
+
+    @tamanho.setter
+    def tamanho(self, valor: str) -> None:
+        self.itens[0].tamanho = valor
+
+    @property
+    def adicional(self) -> List[str]:
+        return self.itens[0].adicional
+
+    @adicional.setter
+    def adicional(self, valor: List[str]) -> None:
+        self.itens[0].adicional = valor
 
     def _calcular_tempo_preparo(self) -> int:
-        """Calcula o tempo estimado de preparo em minutos"""
-        tempo_base = {
-            "Pequena": 15,
-            "Média": 20,
-            "Grande": 25,
-            "Família": 30
-        }
-        tempo = tempo_base.get(self.tamanho, 20)
-        # Adiciona 2 minutos para cada adicional
-        tempo += len(self.adicional) * 2
-        return tempo
+        """Calcula o tempo estimado de preparo em minutos.
+
+        As pizzas vão ao forno em paralelo, então o pedido fica pronto
+        junto com o item mais demorado.
+        """
+        for item in self.itens:
+            item.tempo_preparo = item._calcular_tempo_preparo()
+        return max(item.tempo_preparo for item in self.itens)
+
+    def status_cozinha(self) -> str:
+        """Status do pedido derivado das etapas dos itens"""
+        etapas = {item.status for item in self.itens}
+        if len(etapas) == 1:
+            return etapas.pop()
+        return "Em preparo"
+
+    def resumo_itens(self) -> List[Tuple[str, str, Tuple[str, ...], str]]:
+        """(sabor, tamanho, adicionais, etapa) de cada pizza do pedido"""
+        return [(item.sabor, item.tamanho, tuple(item.adicional), item.status) for item in self.itens]
+
+    @property
+    def previsao_pronto(self) -> datetime.datetime:
+        """Horário previsto para o pedido sair da cozinha"""
+        return self.data_hora + datetime.timedelta(minutes=self.tempo_preparo)
+
+    @property
+    def telefone(self) -> str:
+        """Telefone normalizado do cliente (extraído do campo cliente)"""
+        return normalizar_telefone(separar_cliente(self.cliente)[1])
 
     def __str__(self) -> str:
-        adicionais = ", ".join(self.adicional) if self.adicional else "Nenhum"
+        if len(self.itens) == 1:
+            adicionais = ", ".join(self.adicional) if self.adicional else "Nenhum"
+            return (f"Pedido #{self.numero} | Cliente: {self.cliente} | "
+                    f"Pizza: {self.sabor} ({self.tamanho}) | "
+                    f"Adicionais: {adicionais} | Status: {self.status}")
+        pizzas = "".join(f"\n    {i}. {item}" for i, item in enumerate(self.itens, 1))
         return (f"Pedido #{self.numero} | Cliente: {self.cliente} | "
-                f"Pizza: {self.sabor} ({self.tamanho}) | "
-                f"Adicionais: {adicionais} | Status: {self.status}")
+                f"{len(self.itens)} pizzas | Status: {self.status}{pizzas}")
+
+
+class Instrumentacao:
+    """Coleta tempo, bytes gravados, contagem de objetos e pico de memória
+    das operações do SistemaPizzaria em um buffer circular.
+
+    As ações de menu incluem o tempo de digitação do usuário; as operações
+    internas (carregar_dados, salvar_dados, gerar_relatorio...) não.
+    """
+
+    def __init__(self, capacidade: int = 2000, medir_memoria: bool = False):
+        self.amostras: deque = deque(maxlen=capacidade)
+        self.medir_memoria = medir_memoria
+        # Um pico por medição em andamento (operações aninhadas, como o
+        # salvar_dados dentro de uma ação de menu)
+        self._picos: List[int] = []
+
+    def medir(self, operacao: str, sistema: "SistemaPizzaria", metodo: Callable,
+              args: tuple, kwargs: dict):
+        """Executa o método registrando uma amostra ao final"""
+        if self.medir_memoria:
+            if not self._picos:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+            else:
+                # O reset abaixo apagaria o pico da operação externa: guarda-o antes
+                self._picos[-1] = max(self._picos[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._picos.append(0)
+        bytes_antes = sistema.bytes_escritos
+        inicio = time.perf_counter()
+        try:
+            return metodo(sistema, *args, **kwargs)
+        finally:
+            duracao = time.perf_counter() - inicio
+            pico = 0
+            if self.medir_memoria:
+                pico = max(self._picos.pop(), tracemalloc.get_traced_memory()[1])
+                if self._picos:
+                    self._picos[-1] = max(self._picos[-1], pico)
+            self.amostras.append((
+                operacao,
+                duracao,
+                sistema.bytes_escritos - bytes_antes,
+                len(sistema.fila_pedidos) + sistema.quantidade_historico,
+                pico,
+            ))
+
+    def resumo(self) -> Dict[str, Dict]:
+        """Agrupa as amostras por operação com percentis de tempo"""
+        por_operacao: Dict[str, List[tuple]] = {}
+        for amostra in self.amostras:
+            por_operacao.setdefault(amostra[0], []).append(amostra)
+
+        resumo = {}
+        for operacao, amostras in por_operacao.items():
+            tempos = sorted(a[1] * 1000 for a in amostras)
+            resumo[operacao] = {
+                "n": len(amostras),
+                "p50_ms": percentil(tempos, 50),
+                "p90_ms": percentil(tempos, 90),
+                "p99_ms": percentil(tempos, 99),
+                "max_ms": tempos[-1],
+                "bytes_medio": sum(a[2] for a in amostras) / len(amostras),
+                "objetos": amostras[-1][3],
+                "pico_memoria_kib": max(a[4] for a in amostras) / 1024,
+            }
+        return resumo
+
+    def exibir(self) -> None:
+        """Imprime o resumo das métricas coletadas"""
+        resumo = self.resumo()
+        if not resumo:
+            print("📈 Nenhuma amostra coletada ainda.")
+            return
+        print(f"\n📈 == INSTRUMENTAÇÃO ({len(self.amostras)} amostras) ==")
+        for operacao, m in sorted(resumo.items()):
+            linha = (f"{operacao:<20} n={m['n']:<5} p50={m['p50_ms']:.2f}ms "
+                     f"p90={m['p90_ms']:.2f}ms p99={m['p99_ms']:.2f}ms max={m['max_ms']:.2f}ms "
+                     f"bytes={m['bytes_medio']:.0f} objetos={m['objetos']}")
+            if self.medir_memoria:
+                linha += f" pico={m['pico_memoria_kib']:.0f}KiB"
+            print(linha)
+
+
+def instrumentado(metodo: Callable) -> Callable:
+    """Mede o método quando o sistema tem instrumentação ativa.
+
+    Desativada, o custo é uma leitura de atributo por chamada.
+    """
+    nome = metodo.__name__
+
+    @functools.wraps(metodo)
+    def envoltorio(self, *args, **kwargs):
+        if self.instrumentacao is None:
+            return metodo(self, *args, **kwargs)
+        return self.instrumentacao.medir(nome, self, metodo, args, kwargs)
+    return envoltorio
+
+
+def estado_pedido(pedido: Pedido) -> Dict:
+    """Cópia dos campos de um pedido, enviada aos ouvintes antes de uma alteração"""
+    return {
+        "sabor": pedido.sabor,
+        "tamanho": pedido.tamanho,
+        "adicional": list(pedido.adicional),
+        "observacoes": pedido.observacoes,
+        "status": pedido.status,
+        "tempo_preparo": pedido.tempo_preparo,
+        "itens": pedido.resumo_itens(),
+    }
+
+
+def pizzas_na_cozinha(status: str, itens: Iterable[Tuple],
+                      etapas: Tuple[str, ...] = STATUS_COZINHA) -> Iterator[Tuple[int, Tuple]]:
+    """Posição e resumo das pizzas do pedido que estão nas etapas dadas.
+
+    Um pedido que já saiu da cozinha (pronto, a caminho ou entregue) não
+    tem pizza nenhuma nela, qualquer que seja a etapa registrada no item.
+    """
+    if status in STATUS_COZINHA:
+        for indice, item in enumerate(itens):
+            if item[3] in etapas:
+                yield indice, item
+
+
+class _CarregadorPickle(pickle.Unpickler):
+    """Unpickler que aceita pedidos gravados tanto por `python pizzaria.py`
+    (classes em __main__) quanto por quem importa o módulo (classes em pizzaria)"""
+
+    def find_class(self, module: str, name: str):
+        if module in ("__main__", "pizzaria"):
+            return getattr(sys.modules[__name__], name)
+        return super().find_class(module, name)
+
+
+class MotorPrecos:
+    """Calcula preço e tempo de preparo a partir de tabelas pré-computadas do cardápio.
+
+    Os resultados são memoizados por combinação (sabor, tamanho, adicionais
+    ordenados). Qualquer alteração no cardápio deve chamar `invalidar()`,
+    que incrementa a versão e reconstrói as tabelas.
+    """
+
+    def __init__(self, cardapio: Dict):
+        self.cardapio = cardapio
+        self.versao = 0
+        self._reconstruir()
+
+    def _reconstruir(self) -> None:
+        """Pré-computa as tabelas de preço da versão atual do cardápio"""
+        self._preco_base: Dict[Tuple[str, str], float] = {
+            (sabor, tamanho): preco
+            for sabor, info in self.cardapio["sabores"].items()
+            for tamanho, preco in info["preco"].items()
+        }
+        self._preco_adicional: Dict[str, float] = dict(self.cardapio["adicionais"])
+        self._combinacoes: Dict[Tuple, Tuple[Optional[float], int]] = {}
+
+    def invalidar(self, cardapio: Optional[Dict] = None) -> None:
+        """Descarta as tabelas após uma alteração (ou troca) do cardápio"""
+        if cardapio is not None:
+            self.cardapio = cardapio
+        self.versao += 1
+        self._reconstruir()
+
+    def _consultar(self, sabor: str, tamanho: str,
+                   adicionais: Iterable[str]) -> Tuple[Optional[float], int]:
+        chave = (sabor, tamanho, tuple(sorted(adicionais)))
+        resultado = self._combinacoes.get(chave)
+        if resultado is None:
+            valor_base = self._preco_base.get((sabor, tamanho))
+            if valor_base is None:
+                valor = None
+            else:
+                valor = valor_base + sum(self._preco_adicional.get(a, 0) for a in chave[2])
+            resultado = (valor, calcular_tempo_preparo(tamanho, len(chave[2])))
+            self._combinacoes[chave] = resultado
+        return resultado
+
+    def valor(self, sabor: str, tamanho: str,
+              adicionais: Iterable[str] = ()) -> Optional[float]:
+        """Retorna o valor total da pizza, ou None se o sabor/tamanho não está no cardápio"""
+        return self._consultar(sabor, tamanho, adicionais)[0]
+
+    def valor_pedido(self, pedido: Pedido) -> Optional[float]:
+        """Soma das pizzas do pedido, ou None se alguma saiu do cardápio"""
+        total = 0.0
+        for item in pedido.itens:
+            valor = self._consultar(item.sabor, item.tamanho, item.adicional)[0]
+            if valor is None:
+                return None
+            total += valor
+        return total
+
+    def tempo_preparo(self, sabor: str, tamanho: str,
+                      adicionais: Iterable[str] = ()) -> int:
+        """Retorna o tempo estimado de preparo em minutos"""
+        return self._consultar(sabor, tamanho, adicionais)[1]
+
+
+class IndiceClientes:
+    """Índice dos pedidos de cada cliente, pelo telefone normalizado.
+
+    Mantido incrementalmente: cada pedido criado é anexado à lista do
+    cliente, então os últimos pedidos ficam sempre no fim da lista.
+    """
+
+    def __init__(self, motor_precos: MotorPrecos):
+        self.motor_precos = motor_precos
+        self._pedidos: Dict[str, List[Pedido]] = {}
+
+    def construir(self, pedidos: Iterable[Pedido]) -> None:
+        """Monta o índice a partir de todos os pedidos existentes"""
+        self._pedidos = {}
+        for pedido in sorted(pedidos, key=lambda p: p.numero):
+            self.pedido_criado(pedido)
+
+    def pedido_criado(self, pedido: Pedido) -> None:
+        telefone = pedido.telefone
+        if telefone:
+            self._pedidos.setdefault(telefone, []).append(pedido)
+
+    def ultimos_pedidos(self, telefone: str, quantidade: int = 5) -> List[Pedido]:
+        """Retorna os últimos pedidos do cliente, do mais recente para o mais antigo"""
+        pedidos = self._pedidos.get(normalizar_telefone(telefone), [])
+        return pedidos[:-quantidade - 1:-1]
+
+    def estatisticas(self, telefone: str) -> Optional[Dict]:
+        """Estatísticas do cliente ao longo de todos os pedidos"""
+        pedidos = self._pedidos.get(normalizar_telefone(telefone))
+        if not pedidos:
+            return None
+
+        total_gasto = 0
+        sabores: Dict[str, int] = {}
+        for pedido in pedidos:
+            total_gasto += self.motor_precos.valor_pedido(pedido) or 0
+            for item in pedido.itens:
+                sabores[item.sabor] = sabores.get(item.sabor, 0) + 1
+
+        return {
+            "nome": separar_cliente(pedidos[-1].cliente)[0],
+            "total_pedidos": len(pedidos),
+            "total_gasto": total_gasto,
+            "ticket_medio": total_gasto / len(pedidos),
+            "primeiro_pedido": pedidos[0].data_hora,
+            "ultimo_pedido": pedidos[-1].data_hora,
+            "sabor_favorito": max(sabores.items(), key=lambda x: x[1])[0],
+        }
+
+
+class IndiceIngredientes:
+    """Índice invertido ingrediente -> sabores/adicionais -> pedidos.
+
+    As listas de pedidos ficam ordenadas por número, que cresce junto com a
+    data/hora, então filtros de período usam busca binária em vez de
+    percorrer o histórico. Um adicional conta como o próprio ingrediente
+    e também sem o sufixo "extra" ("Catupiry extra" -> "catupiry").
+    """
+
+    def __init__(self, cardapio: Dict):
+        self.cardapio = cardapio
+        self._pedidos_por_sabor: Dict[str, List[Pedido]] = {}
+        self._pedidos_por_adicional: Dict[str, List[Pedido]] = {}
+        self.cardapio_alterado()
+
+    def cardapio_alterado(self) -> None:
+        """Recalcula o mapa ingrediente -> sabores a partir do cardápio"""
+        self._sabores_por_ingrediente: Dict[str, set] = {}
+        for sabor, info in self.cardapio["sabores"].items():
+            for ingrediente in info["ingredientes"]:
+                self._sabores_por_ingrediente.setdefault(normalizar_ingrediente(ingrediente), set()).add(sabor)
+
+    @staticmethod
+    def _ingredientes_do_adicional(adicional: str) -> set:
+        nome = normalizar_ingrediente(adicional)
+        ingredientes = {nome}
+        if nome.endswith(" extra"):
+            ingredientes.add(nome[:-len(" extra")])
+        return ingredientes
+
+    def construir(self, pedidos: Iterable[Pedido]) -> None:
+        """Monta o índice a partir de todos os pedidos existentes"""
+        self._pedidos_por_sabor = {}
+        self._pedidos_por_adicional = {}
+        for pedido in sorted(pedidos, key=lambda p: p.numero):
+            self.pedido_criado(pedido)
+
+    @staticmethod
+    def _inserir(lista: List[Pedido], pedido: Pedido) -> None:
+        # Pedidos novos vão para o fim; alterados podem voltar para o meio
+        if not lista or lista[-1].numero < pedido.numero:
+            lista.append(pedido)
+        else:
+            bisect.insort(lista, pedido, key=lambda p: p.numero)
+
+    @staticmethod
+    def _remover(lista: List[Pedido], pedido: Pedido) -> None:
+        posicao = bisect.bisect_left(lista, pedido.numero, key=lambda p: p.numero)
+        if posicao < len(lista) and lista[posicao] is pedido:
+            del lista[posicao]
+
+    @staticmethod
+    def _sabores_e_adicionais(itens: Iterable[Tuple]) -> Tuple[set, set]:
+        sabores, adicionais = set(), set()
+        for item in itens:
+            sabores.add(item[0])
+            adicionais.update(item[2])
+        return sabores, adicionais
+
+    def pedido_criado(self, pedido: Pedido) -> None:
+        sabores, adicionais = self._sabores_e_adicionais(pedido.resumo_itens())
+        for sabor in sabores:
+            self._inserir(self._pedidos_por_sabor.setdefault(sabor, []), pedido)
+        for adicional in adicionais:
+            self._inserir(self._pedidos_por_adicional.setdefault(adicional, []), pedido)
+
+    def pedido_alterado(self, pedido: Pedido, anterior: Dict) -> None:
+        sabores_antigos, antigos = self._sabores_e_adicionais(anterior["itens"])
+        sabores_novos, novos = self._sabores_e_adicionais(pedido.resumo_itens())
+        for sabor in sabores_antigos - sabores_novos:
+            self._remover(self._pedidos_por_sabor.get(sabor, []), pedido)
+        for sabor in sabores_novos - sabores_antigos:
+            self._inserir(self._pedidos_por_sabor.setdefault(sabor, []), pedido)
+        for adicional in antigos - novos:
+            self._remover(self._pedidos_por_adicional.get(adicional, []), pedido)
+        for adicional in novos - antigos:
+            self._inserir(self._pedidos_por_adicional.setdefault(adicional, []), pedido)
+
+    def ingredientes_correspondentes(self, termo: str) -> List[str]:
+        """Ingredientes conhecidos que contêm o termo buscado"""
+        termo = normalizar_ingrediente(termo)
+        conhecidos = set(self._sabores_por_ingrediente)
+        for adicional in self._pedidos_por_adicional:
+            conhecidos |= self._ingredientes_do_adicional(adicional)
+        return sorted(i for i in conhecidos if termo in i)
+
+    def pedidos_com_ingrediente(self, termo: str, desde: Optional[datetime.datetime] = None,
+                                ate: Optional[datetime.datetime] = None) -> List[Pedido]:
+        """Pedidos cujo sabor ou adicionais contêm o ingrediente, em ordem de número"""
+        ingredientes = set(self.ingredientes_correspondentes(termo))
+        listas = []
+        for ingrediente in ingredientes:
+            for sabor in self._sabores_por_ingrediente.get(ingrediente, ()):
+                listas.append(self._pedidos_por_sabor.get(sabor, []))
+        for adicional, pedidos in self._pedidos_por_adicional.items():
+            if self._ingredientes_do_adicional(adicional) & ingredientes:
+                listas.append(pedidos)
+
+        encontrados: Dict[int, Pedido] = {}
+        for lista in listas:
+            inicio = 0 if desde is None else bisect.bisect_left(lista, desde, key=lambda p: p.data_hora)
+            fim = len(lista) if ate is None else bisect.bisect_right(lista, ate, key=lambda p: p.data_hora)
+            for pedido in lista[inicio:fim]:
+                encontrados[pedido.numero] = pedido
+        return [encontrados[numero] for numero in sorted(encontrados)]
+
+
+class ProjecaoDemanda:
+    """Demanda de ingredientes (em gramas) das pizzas ativas na cozinha.
+
+    Cada combinação sabor x tamanho x adicionais é compilada uma única vez
+    num vetor de quantidades; a demanda da fila é a soma desses vetores,
+    atualizada a cada criação, alteração ou saída de pedido. Uma pizza que
+    ficou pronta deixa de contar mesmo que o resto do pedido não esteja.
+    """
+
+    def __init__(self, cardapio: Dict, fila: List[Pedido]):
+        self.cardapio = cardapio
+        self.fila = fila
+        self._vetores: Dict[Tuple, Tuple[Tuple[str, int], ...]] = {}
+        self.demanda: Dict[str, int] = {}
+        self.construir()
+
+    def construir(self) -> None:
+        """Recalcula a demanda a partir da fila inteira"""
+        self.demanda = {}
+        for pedido in self.fila:
+            self._aplicar_pedido(pedido.status, pedido.resumo_itens(), 1)
+
+    def vetor(self, sabor: str, tamanho: str, adicionais: Iterable[str]) -> Tuple[Tuple[str, int], ...]:
+        """Quantidades de ingredientes de uma pizza, memoizadas pela combinação"""
+        chave = (sabor, tamanho, tuple(sorted(adicionais)))
+        vetor = self._vetores.get(chave)
+        if vetor is None:
+            fator = FATOR_TAMANHO.get(tamanho, 1.0)
+            quantidades: Dict[str, float] = {"massa": CONSUMO_INGREDIENTES["massa"] * fator}
+            info = self.cardapio["sabores"].get(sabor, {"ingredientes": []})
+            for ingrediente in info["ingredientes"]:
+                nome = normalizar_ingrediente(ingrediente)
+                quantidades[nome] = quantidades.get(nome, 0) + CONSUMO_INGREDIENTES.get(nome, CONSUMO_PADRAO) * fator
+            for adicional in chave[2]:
+                nome = normalizar_ingrediente(adicional)
+                if nome.endswith(" extra"):
+                    nome = nome[:-len(" extra")]
+                quantidades[nome] = quantidades.get(nome, 0) + CONSUMO_INGREDIENTES.get(nome, CONSUMO_ADICIONAL_PADRAO) * fator
+            # Gramas inteiros: somar e subtrair repetidamente não acumula erro
+            vetor = tuple((nome, round(qtd)) for nome, qtd in quantidades.items())
+            self._vetores[chave] = vetor
+        return vetor
+
+    def _aplicar(self, sabor: str, tamanho: str, adicionais: Iterable[str], sinal: int) -> None:
+        for ingrediente, quantidade in self.vetor(sabor, tamanho, adicionais):
+            total = self.demanda.get(ingrediente, 0) + sinal * quantidade
+            if total:
+                self.demanda[ingrediente] = total
+            else:
+                self.demanda.pop(ingrediente, None)
+
+    def _aplicar_pedido(self, status: str, itens: Iterable[Tuple], sinal: int) -> None:
+        for _, (sabor, tamanho, adicionais, _) in pizzas_na_cozinha(status, itens):
+            self._aplicar(sabor, tamanho, adicionais, sinal)
+
+    def pedido_criado(self, pedido: Pedido) -> None:
+        self._aplicar_pedido(pedido.status, pedido.resumo_itens(), 1)
+
+    def pedido_alterado(self, pedido: Pedido, anterior: Dict) -> None:
+        self._aplicar_pedido(anterior["status"], anterior["itens"], -1)
+        self._aplicar_pedido(pedido.status, pedido.resumo_itens(), 1)
+
+    def pedido_entregue(self, pedido: Pedido, anterior: Dict) -> None:
+        self._aplicar_pedido(anterior["status"], anterior["itens"], -1)
+
+    def cardapio_alterado(self) -> None:
+        # Ingredientes de um sabor podem ter mudado: recompila tudo (evento raro)
+        self._vetores = {}
+        self.construir()
+
+
+class LoteForno:
+    """Pizzas idênticas que vão juntas ao forno"""
+
+    def __init__(self, pizzas: List[Tuple[Pedido, int]]):
+        self.pizzas = pizzas
+        # Um pedido com duas pizzas iguais aparece uma vez só
+        self.pedidos = list({id(p): p for p, _ in pizzas}.values())
+        primeira = pizzas[0][0].itens[pizzas[0][1]]
+        self.sabor = primeira.sabor
+        self.tamanho = primeira.tamanho
+        self.adicionais = sorted(primeira.adicional)
+        self.mais_antigo = pizzas[0][0].data_hora
+        self.tempo_preparo = primeira._calcular_tempo_preparo() + (len(pizzas) - 1) * MINUTOS_POR_PIZZA_EXTRA
+        self.tempo_individual = primeira.tempo_preparo * len(pizzas)
+
+    def __str__(self) -> str:
+        adicionais = f" + {', '.join(self.adicionais)}" if self.adicionais else ""
+        numeros = ", ".join(f"#{p.numero}" for p in self.pedidos)
+        return f"{len(self.pizzas)}x {self.sabor} ({self.tamanho}){adicionais} | Pedidos {numeros}"
+
+
+class LotesForno:
+    """Agrupa as pizzas pendentes da fila em fornadas.
+
+    Pizzas com mesmo sabor, tamanho e adicionais entram na mesma fornada se
+    foram feitos até `janela_minutos` depois do mais antigo dela, até a
+    capacidade do forno. As fornadas saem ordenadas pelo pedido mais antigo,
+    então juntar pizzas nunca atrasa quem pediu primeiro. Só o grupo afetado
+    por uma criação, alteração ou entrega é remontado.
+    """
+
+    def __init__(self, fila: List[Pedido], janela_minutos: int = JANELA_LOTE_MINUTOS,
+                 capacidade: int = CAPACIDADE_FORNO):
+        self.janela = datetime.timedelta(minutes=janela_minutos)
+        self.capacidade = capacidade
+        self._grupos: Dict[Tuple, List[Tuple[Pedido, int]]] = {}
+        self._lotes: Dict[Tuple, List[LoteForno]] = {}
+        for pedido in fila:
+            self._inserir(pedido)
+
+    @staticmethod
+    def _chave(sabor: str, tamanho: str, adicionais: Iterable[str]) -> Tuple:
+        return sabor, tamanho, tuple(sorted(adicionais))
+
+    def _inserir(self, pedido: Pedido) -> None:
+        for indice, (sabor, tamanho, adicionais, _) in pizzas_na_cozinha(
+                pedido.status, pedido.resumo_itens(), ("Pendente",)):
+            chave = self._chave(sabor, tamanho, adicionais)
+            grupo = self._grupos.setdefault(chave, [])
+            bisect.insort(grupo, (pedido, indice), key=lambda e: (e[0].data_hora, e[0].numero, e[1]))
+            self._lotes.pop(chave, None)
+
+    def _remover(self, pedido: Pedido, estado: Dict) -> None:
+        for indice, (sabor, tamanho, adicionais, _) in pizzas_na_cozinha(
+                estado["status"], estado["itens"], ("Pendente",)):
+            chave = self._chave(sabor, tamanho, adicionais)
+            grupo = self._grupos.get(chave, [])
+            for posicao, (outro, outro_indice) in enumerate(grupo):
+                if outro is pedido and outro_indice == indice:
+                    del grupo[posicao]
+                    if not grupo:
+                        del self._grupos[chave]
+                    self._lotes.pop(chave, None)
+                    break
+
+    def pedido_criado(self, pedido: Pedido) -> None:
+        self._inserir(pedido)
+
+    def pedido_alterado(self, pedido: Pedido, anterior: Dict) -> None:
+        self._remover(pedido, anterior)
+        self._inserir(pedido)
+
+    def pedido_entregue(self, pedido: Pedido, anterior: Dict) -> None:
+        self._remover(pedido, anterior)
+
+    def _montar(self, grupo: List[Tuple[Pedido, int]]) -> List[LoteForno]:
+        lotes = []
+        atual: List[Tuple[Pedido, int]] = []
+        for pizza in grupo:
+            if atual and (len(atual) >= self.capacidade or pizza[0].data_hora - atual[0][0].data_hora > self.janela):
+                lotes.append(LoteForno(atual))
+                atual = []
+            atual.append(pizza)
+        if atual:
+            lotes.append(LoteForno(atual))
+        return lotes
+
+    def lotes(self) -> List[LoteForno]:
+        """Fornadas atuais, da que tem o pedido mais antigo para a mais nova"""
+        todos = []
+        for chave, grupo in self._grupos.items():
+            if chave not in self._lotes:
+                self._lotes[chave] = self._montar(grupo)
+            todos.extend(self._lotes[chave])
+        return sorted(todos, key=lambda lote: (lote.mais_antigo, lote.pedidos[0].numero))
+
+
+class ArquivoFrio:
+    """Arquivo de pedidos antigos em segmentos imutáveis (pickle + gzip).
+
+    Cada segmento guarda até PEDIDOS_POR_SEGMENTO_ARQUIVO pedidos ordenados
+    por número. O índice (indice.json) registra o intervalo de números e de
+    datas de cada segmento, então buscas e relatórios só descompactam os
+    segmentos que alcançam a consulta. Os últimos segmentos lidos ficam em
+    memória.
+    """
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        self.arquivo_indice = os.path.join(diretorio, "indice.json")
+        self.segmentos: List[Dict] = []
+        self._em_memoria: "OrderedDict[str, List[Pedido]]" = OrderedDict()
+        if os.path.exists(self.arquivo_indice):
+            with open(self.arquivo_indice, encoding="utf-8") as f:
+                self.segmentos = json.load(f)
+
+    @property
+    def quantidade(self) -> int:
+        return sum(segmento["quantidade"] for segmento in self.segmentos)
+
+    def copia(self) -> "ArquivoFrio":
+        """Leitor com o índice atual e cache próprio (os segmentos são imutáveis)"""
+        copia = ArquivoFrio.__new__(ArquivoFrio)
+        copia.diretorio = self.diretorio
+        copia.arquivo_indice = self.arquivo_indice
+        copia.segmentos = list(self.segmentos)
+        copia._em_memoria = OrderedDict()
+        return copia
+
+    def _gravar_atomico(self, caminho: str, dados: bytes) -> None:
+        with gravacao_atomica(caminho) as f:
+            f.write(dados)
+
+    def arquivar(self, pedidos: List[Pedido]) -> int:
+        """Grava os pedidos em novos segmentos e retorna quantos foram arquivados"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        pedidos = sorted(pedidos, key=lambda p: p.numero)
+        for inicio in range(0, len(pedidos), PEDIDOS_POR_SEGMENTO_ARQUIVO):
+            lote = pedidos[inicio:inicio + PEDIDOS_POR_SEGMENTO_ARQUIVO]
+            nome = f"segmento_{len(self.segmentos) + 1:05d}.pickle.gz"
+            self._gravar_atomico(os.path.join(self.diretorio, nome),
+                                 gzip.compress(pickle.dumps(lote)))
+            self.segmentos.append({
+                "arquivo": nome,
+                "quantidade": len(lote),
+                "numero_inicial": lote[0].numero,
+                "numero_final": lote[-1].numero,
+                "data_inicial": min(p.data_hora for p in lote).isoformat(),
+                "data_final": max(p.data_hora for p in lote).isoformat(),
+            })
+        # O índice é gravado por último: um segmento só existe depois de indexado
+        self._gravar_atomico(self.arquivo_indice,
+                             json.dumps(self.segmentos, indent=1).encode("utf-8"))
+        return len(pedidos)
+
+    def ler_segmento(self, segmento: Dict) -> List[Pedido]:
+        nome = segmento["arquivo"]
+        if nome in self._em_memoria:
+            self._em_memoria.move_to_end(nome)
+            return self._em_memoria[nome]
+        with gzip.open(os.path.join(self.diretorio, nome), "rb") as f:
+            pedidos = _CarregadorPickle(f).load()
+        self._em_memoria[nome] = pedidos
+        if len(self._em_memoria) > SEGMENTOS_EM_MEMORIA:
+            self._em_memoria.popitem(last=False)
+        return pedidos
+
+    def buscar(self, numero: int) -> Optional[Pedido]:
+        """Procura um pedido só nos segmentos cujo intervalo contém o número"""
+        for segmento in self.segmentos:
+            if segmento["numero_inicial"] <= numero <= segmento["numero_final"]:
+                pedidos = self.ler_segmento(segmento)
+                posicao = bisect.bisect_left(pedidos, numero, key=lambda p: p.numero)
+                if posicao < len(pedidos) and pedidos[posicao].numero == numero:
+                    return pedidos[posicao]
+        return None
+
+    def indices_no_periodo(self, data_inicio: Optional[datetime.datetime] = None,
+                           data_fim: Optional[datetime.datetime] = None) -> List[Dict]:
+        """Entradas do índice dos segmentos que têm alguma data dentro do período"""
+        return [
+            segmento for segmento in self.segmentos
+            if (data_inicio is None or datetime.datetime.fromisoformat(segmento["data_final"]) >= data_inicio)
+            and (data_fim is None or datetime.datetime.fromisoformat(segmento["data_inicial"]) <= data_fim)
+        ]
+
+    def segmentos_no_periodo(self, data_inicio: Optional[datetime.datetime] = None,
+                             data_fim: Optional[datetime.datetime] = None) -> Iterator[List[Pedido]]:
+        """Gera os pedidos dos segmentos que têm alguma data dentro do período"""
+        for segmento in self.indices_no_periodo(data_inicio, data_fim):
+            yield self.ler_segmento(segmento)
+
+
+HORAS_SEMANA = 7 * 24
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+
+def hora_da_semana(momento: datetime.datetime) -> int:
+    """Índice 0..167 da hora dentro da semana (segunda 0h = 0)"""
+    return momento.weekday() * 24 + momento.hour
+
+
+class PrevisaoDemanda:
+    """Previsão de pedidos e minutos de forno por hora, a partir do histórico.
+
+    O histórico é agregado em 168 faixas (hora da semana). A previsão para
+    uma hora futura é a média daquela faixa: total acumulado dividido pelo
+    número de vezes que a faixa ocorreu no período observado. Entregas novas
+    atualizam os totais incrementalmente.
+    """
+
+    def __init__(self):
+        self.pedidos = [0] * HORAS_SEMANA
+        self.minutos_forno = [0] * HORAS_SEMANA
+        self.inicio: Optional[datetime.datetime] = None
+        self.fim: Optional[datetime.datetime] = None
+
+    def construir(self, pedidos: List[Pedido]) -> None:
+        """Agrega o histórico inteiro (usa NumPy, se disponível)"""
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None:
+            # Horas desde 1970-01-01, uma quinta-feira (faixa 3 * 24); os arrays são tipados
+            # mesmo vazios, então um histórico vazio dá 168 zeros
+            horas = np.fromiter((p.data_hora for p in pedidos), dtype="datetime64[h]", count=len(pedidos))
+            faixas = (horas.astype(np.intp) + 3 * 24) % HORAS_SEMANA
+            minutos = np.fromiter((p.tempo_preparo for p in pedidos), dtype=np.int64, count=len(pedidos))
+            self.pedidos = np.bincount(faixas, minlength=HORAS_SEMANA).tolist()
+            self.minutos_forno = np.bincount(faixas, weights=minutos, minlength=HORAS_SEMANA).astype(int).tolist()
+        else:
+            self.pedidos = [0] * HORAS_SEMANA
+            self.minutos_forno = [0] * HORAS_SEMANA
+            for pedido in pedidos:
+                faixa = hora_da_semana(pedido.data_hora)
+                self.pedidos[faixa] += 1
+                self.minutos_forno[faixa] += pedido.tempo_preparo
+        if pedidos:
+            self.inicio = min(p.data_hora for p in pedidos)
+            self.fim = max(p.data_hora for p in pedidos)
+
+    def pedido_entregue(self, pedido: Pedido, anterior: Dict) -> None:
+        faixa = hora_da_semana(pedido.data_hora)
+        self.pedidos[faixa] += 1
+        self.minutos_forno[faixa] += pedido.tempo_preparo
+        if self.inicio is None or pedido.data_hora < self.inicio:
+            self.inicio = pedido.data_hora
+        if self.fim is None or pedido.data_hora > self.fim:
+            self.fim = pedido.data_hora
+
+    def _ocorrencias(self) -> List[int]:
+        """Quantas vezes cada hora da semana aparece no período observado"""
+        if self.inicio is None:
+            return [0] * HORAS_SEMANA
+        inicio = self.inicio.replace(minute=0, second=0, microsecond=0)
+        total_horas = int((self.fim - inicio).total_seconds() // 3600) + 1
+        ocorrencias = [total_horas // HORAS_SEMANA] * HORAS_SEMANA
+        primeira = hora_da_semana(inicio)
+        for deslocamento in range(total_horas % HORAS_SEMANA):
+            ocorrencias[(primeira + deslocamento) % HORAS_SEMANA] += 1
+        return ocorrencias
+
+    def prever(self, horas: int = 12,
+               a_partir: Optional[datetime.datetime] = None) -> List[Tuple[datetime.datetime, float, float]]:
+        """Retorna (hora, pedidos esperados, minutos de forno esperados) para as próximas horas"""
+        a_partir = (a_partir or datetime.datetime.now()).replace(minute=0, second=0, microsecond=0)
+        ocorrencias = self._ocorrencias()
+        previsao = []
+        for deslocamento in range(horas):
+            hora = a_partir + datetime.timedelta(hours=deslocamento)
+            faixa = hora_da_semana(hora)
+            vezes = ocorrencias[faixa] or 1
+            previsao.append((hora, self.pedidos[faixa] / vezes, self.minutos_forno[faixa] / vezes))
+        return previsao
+
+
+def _minuto(momento: datetime.datetime) -> int:
+    return int(momento.timestamp() // 60)
+
+
+class MetricasCozinha:
+    """Vazão, espera e atrasos da cozinha em janelas deslizantes.
+
+    Os eventos caem em baldes de um minuto; cada balde é um vetor de
+    contadores [criados, entregues, segundos de espera, atrasados,
+    histograma da espera...]. Cada janela guarda os próprios baldes e a
+    soma deles: registrar um evento soma no balde atual e nos totais, e o
+    balde que sai da janela é subtraído, então o custo por mudança de
+    status é constante. O p90 vem do histograma de buckets fixos (limite
+    superior do bucket). Eventos fora de ordem contam no balde mais recente.
+    """
+
+    CRIADOS, ENTREGUES, ESPERA, ATRASADOS, HISTOGRAMA = range(5)
+
+    def __init__(self, janelas: Tuple[int, ...] = JANELAS_METRICAS,
+                 limites: List[int] = LIMITES_ESPERA_MINUTOS):
+        self.janelas = janelas
+        self.limites = limites
+        self._tamanho = self.HISTOGRAMA + len(limites) + 1
+        self._baldes: Dict[int, deque] = {janela: deque() for janela in janelas}
+        self._totais: Dict[int, List[int]] = {janela: [0] * self._tamanho for janela in janelas}
+        self._ultimo_minuto: Optional[int] = None
+        self._vetor_atual: List[int] = []
+
+    def construir(self, criados: Iterable[Pedido], entregues: Iterable[Pedido]) -> None:
+        """Registra em ordem cronológica os pedidos criados e entregues recentemente"""
+        eventos = [(p.data_hora, 0, p) for p in criados]
+        eventos += [(p.data_entrega, 1, p) for p in entregues if p.data_entrega is not None]
+        for momento, entrega, pedido in sorted(eventos, key=lambda e: (e[0], e[1])):
+            if entrega:
+                self.pedido_entregue(pedido, None)
+            else:
+                self.pedido_criado(pedido)
+
+    def _expirar(self, minuto: int) -> None:
+        for janela, baldes in self._baldes.items():
+            totais = self._totais[janela]
+            while baldes and baldes[0][0] <= minuto - janela:
+                _, vetor = baldes.popleft()
+                for indice, valor in enumerate(vetor):
+                    totais[indice] -= valor
+
+    def _registrar(self, momento: datetime.datetime, campos: List[Tuple[int, int]]) -> None:
+        minuto = _minuto(momento)
+        if self._ultimo_minuto is None or minuto > self._ultimo_minuto:
+            self._expirar(minuto)
+            self._vetor_atual = [0] * self._tamanho
+            for baldes in self._baldes.values():
+                baldes.append((minuto, self._vetor_atual))
+            self._ultimo_minuto = minuto
+        vetor = self._vetor_atual
+        for indice, valor in campos:
+            vetor[indice] += valor
+        for janela, baldes in self._baldes.items():
+            # Só soma nas janelas que ainda contêm o balde atual
+            if baldes and baldes[-1][1] is vetor:
+                totais = self._totais[janela]
+                for indice, valor in campos:
+                    totais[indice] += valor
+
+    def pedido_criado(self, pedido: Pedido) -> None:
+        self._registrar(pedido.data_hora, [(self.CRIADOS, 1)])
+
+    def pedido_entregue(self, pedido: Pedido, anterior: Optional[Dict]) -> None:
+        espera = int((pedido.data_entrega - pedido.data_hora).total_seconds())
+        bucket = bisect.bisect_left(self.limites, espera / 60)
+        self._registrar(pedido.data_entrega, [
+            (self.ENTREGUES, 1),
+            (self.ESPERA, espera),
+            (self.ATRASADOS, int(espera > pedido.tempo_preparo * 60)),
+            (self.HISTOGRAMA + bucket, 1),
+        ])
+
+    def _p90(self, totais: List[int]) -> Optional[int]:
+        """Limite superior do bucket do p90 (None se passar do último limite)"""
+        entregues = totais[self.ENTREGUES]
+        acumulado = 0
+        for indice, contagem in enumerate(totais[self.HISTOGRAMA:]):
+            acumulado += contagem
+            if acumulado >= entregues * 0.9:
+                return self.limites[indice] if indice < len(self.limites) else None
+        return None
+
+    def resumo(self, agora: Optional[datetime.datetime] = None) -> Dict[int, Dict]:
+        """Métricas de cada janela: pedidos/hora, espera média e p90 (min) e atrasados"""
+        self._expirar(_minuto(agora or datetime.datetime.now()))
+        resumo = {}
+        for janela in self.janelas:
+            totais = self._totais[janela]
+            entregues = totais[self.ENTREGUES]
+            resumo[janela] = {
+                "criados_por_hora": totais[self.CRIADOS] * 60 / janela,
+                "entregues_por_hora": entregues * 60 / janela,
+                "espera_media": totais[self.ESPERA] / entregues / 60 if entregues else 0.0,
+                "espera_p90": self._p90(totais) if entregues else 0,
+                "atrasados": totais[self.ATRASADOS],
+                "percentual_atrasados": totais[self.ATRASADOS] / entregues * 100 if entregues else 0.0,
+            }
+        return resumo
+
+
+class TopKDecaimento:
+    """Top-K aproximado com decaimento exponencial, em memória limitada (space-saving).
+
+    Cada ocorrência pesa 2^(-idade / meia_vida): com meia-vida de 30 minutos,
+    uma venda de uma hora atrás vale 1/4 de uma venda agora. Os pesos são
+    guardados em escala crescente a partir de um instante de referência
+    (forward decay), então registrar não precisa envelhecer os contadores e
+    a ordem de chegada não importa; a escala é desfeita na consulta.
+
+    São mantidos no máximo `capacidade` (m) contadores. Um item novo sem
+    contador livre assume o menor contador, cujo valor vira o seu erro.
+    Sendo N a soma dos pesos decaídos de todas as ocorrências:
+    - estimado - erro <= real <= estimado, com erro <= N / m;
+    - todo item com contagem real acima de N / m está no resumo.
+    Registro e consulta custam O(m), independente do volume de pedidos.
+    """
+
+    def __init__(self, capacidade: int = CAPACIDADE_TENDENCIAS,
+                 meia_vida_minutos: float = MEIA_VIDA_TENDENCIAS_MINUTOS):
+        self.capacidade = capacidade
+        self.meia_vida = meia_vida_minutos * 60
+        self._referencia: Optional[datetime.datetime] = None
+        self._contadores: Dict[str, List[float]] = {}  # item -> [contagem, erro]
+        self._total = 0.0
+
+    def _peso(self, momento: datetime.datetime) -> float:
+        return 2.0 ** ((momento - self._referencia).total_seconds() / self.meia_vida)
+
+    def _reescalar(self, momento: datetime.datetime) -> None:
+        """Muda a referência para `momento` antes que os pesos estourem o float"""
+        fator = 1 / self._peso(momento)
+        for contador in self._contadores.values():
+            contador[0] *= fator
+            contador[1] *= fator
+        self._total *= fator
+        self._referencia = momento
+
+    def registrar(self, item: str, momento: Optional[datetime.datetime] = None) -> None:
+        momento = momento or datetime.datetime.now()
+        if self._referencia is None:
+            self._referencia = momento
+        peso = self._peso(momento)
+        if peso > 2.0 ** 64:
+            self._reescalar(momento)
+            peso = 1.0
+        self._total += peso
+        contador = self._contadores.get(item)
+        if contador is not None:
+            contador[0] += peso
+        elif len(self._contadores) < self.capacidade:
+            self._contadores[item] = [peso, 0.0]
+        else:
+            menor = min(self._contadores, key=lambda nome: self._contadores[nome][0])
+            minimo = self._contadores.pop(menor)[0]
+            self._contadores[item] = [minimo + peso, minimo]
+
+    def top(self, k: int = 5, agora: Optional[datetime.datetime] = None) -> List[Tuple[str, float, float]]:
+        """(item, contagem estimada, erro máximo) dos k maiores, decaídos até agora"""
+        if self._referencia is None:
+            return []
+        escala = 1 / self._peso(agora or datetime.datetime.now())
+        maiores = heapq.nlargest(k, self._contadores.items(), key=lambda item: item[1][0])
+        return [(nome, contagem * escala, erro * escala) for nome, (contagem, erro) in maiores]
+
+    def erro_maximo(self, agora: Optional[datetime.datetime] = None) -> float:
+        """Limite N / m do erro de qualquer contagem"""
+        if self._referencia is None:
+            return 0.0
+        return self._total / self._peso(agora or datetime.datetime.now()) / self.capacidade
+
+
+class TendenciasPedidos:
+    """Sabores e adicionais em alta, alimentados a cada pedido criado"""
+
+    def __init__(self):
+        self.sabores = TopKDecaimento()
+        self.adicionais = TopKDecaimento()
+
+    def construir(self, pedidos: Iterable[Pedido]) -> None:
+        for pedido in pedidos:
+            self.pedido_criado(pedido)
+
+    def pedido_criado(self, pedido: Pedido) -> None:
+        for item in pedido.itens:
+            self.sabores.registrar(item.sabor, pedido.data_hora)
+            for adicional in item.adicional:
+                self.adicionais.registrar(adicional, pedido.data_hora)
+
+
+class FragmentosFila:
+    """Texto já formatado de cada pedido da fila, usado pelo visualizar_fila.
+
+    O texto de um pedido fica guardado pelo número e pela versão dele, então
+    só o pedido que mudou é formatado de novo. A lista inteira fica guardada
+    pela versão da fila, incrementada a cada pedido criado, alterado ou
+    entregue: exibir a fila sem mudanças não formata nada. O tempo de
+    espera depende do relógio e é calculado a cada exibição.
+    """
+
+    def __init__(self):
+        self._textos: Dict[int, Tuple[int, str, str]] = {}
+        self._versao_fila: Optional[int] = None
+        self._linhas: List[Tuple[datetime.datetime, str, str]] = []
+
+    def linhas(self, fila: List[Pedido], versao_fila: int) -> List[Tuple[datetime.datetime, str, str]]:
+        """(data_hora, cabeçalho, detalhes) de cada pedido, na ordem da fila"""
+        if versao_fila != self._versao_fila:
+            textos = {}
+            for pedido in fila:
+                guardado = self._textos.get(pedido.numero)
+                if guardado is None or guardado[0] != pedido.versao:
+                    guardado = (pedido.versao, *self._formatar(pedido))
+                textos[pedido.numero] = guardado
+            # Só os pedidos ainda na fila continuam guardados
+            self._textos = textos
+            self._linhas = [(p.data_hora, *textos[p.numero][1:]) for p in fila]
+            self._versao_fila = versao_fila
+        return self._linhas
+
+    @staticmethod
+    def _formatar(pedido: Pedido) -> Tuple[str, str]:
+        detalhes = f" | Preparo: {pedido.tempo_preparo} min | Previsão: {pedido.previsao_pronto:%H:%M}"
+        if pedido.observacoes:
+            detalhes += f"\n   📝 Obs: {pedido.observacoes}"
+        return str(pedido), detalhes
+
+
+class ConsultasPedidos:
+    """Consultas somente leitura sobre o arquivo frio, o histórico e a fila.
+
+    Usadas pelo SistemaPizzaria e pelos instantâneos; quem herda fornece
+    arquivo_frio, fila_pedidos, motor_precos, instrumentacao e
+    _segmentos_historico().
+    """
+
+    @instrumentado
+    def gerar_relatorio(self, data_inicio: datetime.datetime,
+                        data_fim: datetime.datetime) -> Optional[Dict]:
+        """Calcula as estatísticas de vendas do período (None se não houver pedidos)"""
+        # Filtra os pedidos pelo período (os arquivados só se o período os alcança)
+        arquivados = itertools.chain.from_iterable(self.arquivo_frio.segmentos_no_periodo(data_inicio, data_fim))
+        historico = itertools.chain.from_iterable(self._segmentos_historico())
+        pedidos_periodo = [p for p in itertools.chain(arquivados, historico)
+                         if data_inicio <= p.data_hora <= data_fim]
 
+        if not pedidos_periodo:
+            return None
 
-class SistemaPizzaria:
+        # Estatísticas básicas
+        total_pedidos = len(pedidos_periodo)
+        valores = []
+
+        # Contadores para análise
+        sabores_populares = {}
+        adicionais_populares = {}
+        tamanhos_populares = {}
+        vendas_por_dia = {}
+
+        for pedido in pedidos_periodo:
+            # Calcula faturamento
+            valor_pedido = self.motor_precos.valor_pedido(pedido)
+            if valor_pedido is not None:
+                valores.append(valor_pedido)
+
+            # Contabiliza estatísticas de cada pizza do pedido
+            for item in pedido.itens:
+                # Sabores
+                if item.sabor in sabores_populares:
+                    sabores_populares[item.sabor] += 1
+                else:
+                    sabores_populares[item.sabor] = 1
+
+                # Tamanhos
+                if item.tamanho in tamanhos_populares:
+                    tamanhos_populares[item.tamanho] += 1
+                else:
+                    tamanhos_populares[item.tamanho] = 1
+
+                # Adicionais
+                for adicional in item.adicional:
+                    if adicional in adicionais_populares:
+                        adicionais_populares[adicional] += 1
+                    else:
+                        adicionais_populares[adicional] = 1
+
+            # Vendas por dia
+            dia = pedido.data_hora.strftime("%d/%m/%Y")
+            if dia in vendas_por_dia:
+                vendas_por_dia[dia] += 1
+            else:
+                vendas_por_dia[dia] = 1
+
+        return {
+            "total_pedidos": total_pedidos,
+            # fsum é exato (independe da ordem), como a soma do relatório paralelo
+            "faturamento": math.fsum(valores),
+            "sabores": sabores_populares,
+            "adicionais": adicionais_populares,
+            "tamanhos": tamanhos_populares,
+            "vendas_por_dia": vendas_por_dia,
+        }
+
+    def iterar_pedidos(self, data_inicio: Optional[datetime.datetime] = None,
+                       data_fim: Optional[datetime.datetime] = None,
+                       status: Optional[str] = None,
+                       incluir_fila: bool = True) -> Iterator[Pedido]:
+        """Gera os pedidos do histórico (e da fila) que atendem aos filtros"""
+        def segmentos():
+            yield from self.arquivo_frio.segmentos_no_periodo(data_inicio, data_fim)
+            yield from self._segmentos_historico()
+            if incluir_fila:
+                yield list(self.fila_pedidos)
+
+        for segmento in segmentos():
+            for pedido in segmento:
+                if data_inicio is not None and pedido.data_hora < data_inicio:
+                    continue
+                if data_fim is not None and pedido.data_hora > data_fim:
+                    continue
+                if status is not None and pedido.status != status:
+                    continue
+                yield pedido
+
+    def pedido_para_registro(self, pedido: Pedido) -> Dict:
+        """Converte um pedido em um registro plano para exportação"""
+        return {
+            "numero": pedido.numero,
+            "cliente": pedido.cliente,
+            "sabor": pedido.sabor,
+            "tamanho": pedido.tamanho,
+            "adicionais": list(pedido.adicional),
+            "itens": [f"{item.sabor} ({item.tamanho})" + "".join(f" + {a}" for a in item.adicional)
+                      for item in pedido.itens],
+            "observacoes": pedido.observacoes,
+            "data_hora": pedido.data_hora.isoformat(timespec="seconds"),
+            "status": pedido.status,
+            "tempo_preparo": pedido.tempo_preparo,
+            "valor_total": self.motor_precos.valor_pedido(pedido),
+        }
+
+    @instrumentado
+    def exportar_historico(self, caminho: str, formato: str = "csv",
+                           data_inicio: Optional[datetime.datetime] = None,
+                           data_fim: Optional[datetime.datetime] = None,
+                           status: Optional[str] = None) -> int:
+        """Exporta os pedidos filtrados em streaming e retorna quantos foram gravados"""
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato não suportado: {formato}")
+        registros = (self.pedido_para_registro(p)
+                     for p in self.iterar_pedidos(data_inicio, data_fim, status))
+        escritor = {"csv": escrever_csv, "jsonl": escrever_jsonl, "parquet": escrever_parquet}[formato]
+        return escritor(registros, caminho)
+
+
+class Instantaneo(ConsultasPedidos):
+    """Cópia de leitura dos pedidos num instante.
+
+    Relatórios e exportações rodam sobre ela, inclusive em outra thread,
+    sem travar a entrada de pedidos e sem ver alterações feitas depois: as
+    listas e o índice do arquivo frio são copiados, os pedidos da fila (que
+    ainda podem ser editados) também, junto com suas pizzas, e o cardápio
+    ganha um motor de preços próprio. Os pedidos do histórico não mudam
+    mais e são compartilhados.
+
+    Se o histórico ainda não foi carregado, guarda só o índice dos segmentos
+    e o arquivo da geração atual, já aberto: os segmentos são lidos por quem
+    consulta o instantâneo, e o arquivo aberto continua legível mesmo que um
+    salvamento passe para uma nova geração. Use-o num bloco with para fechar
+    o arquivo ao final.
+    """
+
+    def __init__(self, sistema: "SistemaPizzaria"):
+        self.momento = datetime.datetime.now()
+        self.instrumentacao = None
+        self._historico = None if sistema._historico is None else list(sistema._historico)
+        self._segmentos_salvos = [] if self._historico is not None else list(sistema._segmentos_salvos)
+        self._historico_novos = list(sistema._historico_novos)
+        self._arquivo_historico = None
+        if self._segmentos_salvos:
+            self._arquivo_historico = open(sistema._caminho_historico(sistema._geracao_historico), "rb")
+        self.fila_pedidos = [self._copiar(p) for p in sistema.fila_pedidos]
+        self.arquivo_frio = sistema.arquivo_frio.copia()
+        self.motor_precos = MotorPrecos(copy.deepcopy(sistema.cardapio))
+
+    @staticmethod
+    def _copiar(pedido: Pedido) -> Pedido:
+        copia = copy.copy(pedido)
+        copia.itens = [copy.copy(item) for item in pedido.itens]
+        return copia
+
+    def __enter__(self) -> "Instantaneo":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._arquivo_historico is not None:
+            self._arquivo_historico.close()
+
+    def _segmentos_historico(self) -> Iterator[List[Pedido]]:
+        if self._historico is not None:
+            for inicio in range(0, len(self._historico), TAMANHO_SEGMENTO):
+                yield self._historico[inicio:inicio + TAMANHO_SEGMENTO]
+            return
+        for segmento in self._segmentos_salvos:
+            self._arquivo_historico.seek(segmento["posicao"])
+            yield _CarregadorPickle(self._arquivo_historico).load()
+        yield self._historico_novos
+
+
+class SistemaPizzaria(ConsultasPedidos):
     def __init__(self, arquivo_pedidos: str = "pedidos.pickle",
-                 arquivo_cardapio: str = "cardapio.pickle"):
+                 arquivo_cardapio: str = "cardapio.pickle",
+                 instrumentacao: Optional[Instrumentacao] = None):
         self.arquivo_pedidos = arquivo_pedidos
         self.arquivo_cardapio = arquivo_cardapio
+        self.instrumentacao = instrumentacao
+        self.bytes_escritos = 0
         self.fila_pedidos: List[Pedido] = []
         self.contador_pedidos: int = 1
+        # Incrementada a cada pedido criado, alterado ou entregue
+        self.versao_fila = 0
+        self.fragmentos_fila = FragmentosFila()
         self.cardapio: Dict[str, Dict] = self._inicializar_cardapio()
-        self.historico_pedidos: List[Pedido] = []
+        # O histórico fica em outro arquivo, em segmentos, e só é lido quando usado
+        self.arquivo_historico = os.path.splitext(arquivo_pedidos)[0] + "_historico"
+        self._historico: Optional[List[Pedido]] = []
+        self._segmentos_salvos: List[Dict] = []
+        self._geracao_historico = 0
+        self._historico_novos: List[Pedido] = []
+        self._historico_reescrever = False
+        # Arquivos de gerações substituídas que ainda não puderam ser apagados
+        self._geracoes_antigas: List[str] = []
         self.carregar_dados()
+        self.arquivo_frio = ArquivoFrio(os.path.splitext(arquivo_pedidos)[0] + "_arquivo")
+        self._descartar_arquivados()
+        self.motor_precos = MotorPrecos(self.cardapio)
+        # Ouvintes notificados em pedido_criado(pedido), pedido_alterado(pedido, anterior),
+        # pedido_entregue(pedido, anterior) e cardapio_alterado()
+        self.ouvintes: List[object] = []
+        self._indice_clientes: Optional[IndiceClientes] = None
+        self._indice_ingredientes: Optional[IndiceIngredientes] = None
+        self._projecao_demanda: Optional[ProjecaoDemanda] = None
+        self._previsao_demanda: Optional[PrevisaoDemanda] = None
+        self._lotes_forno: Optional[LotesForno] = None
+        self._metricas_cozinha: Optional[MetricasCozinha] = None
+        self._tendencias: Optional[TendenciasPedidos] = None
+        # Consultas longas rodam em threads sobre instantâneos; o menu exibe os resultados
+        self._tarefas: List[threading.Thread] = []
+        self._tarefas_concluidas: deque = deque()
 
     def _inicializar_cardapio(self) -> Dict:
         """Inicializa o cardápio base se não existir"""
@@ -74,29 +1432,47 @@ class SistemaPizzaria:
         }
         return cardapio_padrao
 
+    @instrumentado
     def salvar_dados(self) -> None:
         """Salva pedidos e cardápio em arquivos"""
-        with open(self.arquivo_pedidos, "wb") as f:
+        # O histórico é gravado antes: o arquivo de pedidos só aponta para segmentos já gravados
+        arquivo_antigo = self._salvar_historico()
+        with gravacao_atomica(self.arquivo_pedidos) as f:
             dados = {
                 "fila_pedidos": self.fila_pedidos,
                 "contador_pedidos": self.contador_pedidos,
-                "historico_pedidos": self.historico_pedidos
+                "historico": {"geracao": self._geracao_historico, "segmentos": self._segmentos_salvos},
             }
             pickle.dump(dados, f)
+            self.bytes_escritos += f.tell()
+        if arquivo_antigo is not None:
+            self._geracoes_antigas.append(arquivo_antigo)
+        self._remover_geracoes_antigas()
 
-        with open(self.arquivo_cardapio, "wb") as f:
+        with gravacao_atomica(self.arquivo_cardapio) as f:
             pickle.dump(self.cardapio, f)
+            self.bytes_escritos += f.tell()
 
+    @instrumentado
     def carregar_dados(self) -> None:
         """Carrega pedidos e cardápio de arquivos"""
         # Carrega pedidos
         if os.path.exists(self.arquivo_pedidos):
             try:
                 with open(self.arquivo_pedidos, "rb") as f:
-                    dados = pickle.load(f)
+                    dados = _CarregadorPickle(f).load()
                     self.fila_pedidos = dados.get("fila_pedidos", [])
                     self.contador_pedidos = dados.get("contador_pedidos", 1)
-                    self.historico_pedidos = dados.get("historico_pedidos", [])
+                    if "historico_pedidos" in dados:
+                        # Formato antigo (histórico junto da fila): separa no próximo salvamento
+                        self.historico_pedidos = dados["historico_pedidos"]
+                    else:
+                        historico = dados.get("historico", {})
+                        self._geracao_historico = historico.get("geracao", 0)
+                        self._segmentos_salvos = historico.get("segmentos", [])
+                        self._historico = None
+                        self._geracoes_antigas = self._arquivos_de_outras_geracoes()
+                        self._remover_geracoes_antigas()
             except (pickle.PickleError, EOFError):
                 print("⚠️ Erro ao carregar pedidos. Iniciando sistema com dados vazios.")
 
@@ -104,10 +1480,475 @@ class SistemaPizzaria:
         if os.path.exists(self.arquivo_cardapio):
             try:
                 with open(self.arquivo_cardapio, "rb") as f:
-                    self.cardapio = pickle.load(f)
+                    self.cardapio = _CarregadorPickle(f).load()
             except (pickle.PickleError, EOFError):
                 print("⚠️ Erro ao carregar cardápio. Usando cardápio padrão.")
 
+    # ----- Histórico em segmentos -----
+
+    def _caminho_historico(self, geracao: int) -> str:
+        return f"{self.arquivo_historico}_{geracao}.pickle"
+
+    def _arquivos_de_outras_geracoes(self) -> List[str]:
+        """Arquivos do histórico que não são da geração atual (sobras de execuções anteriores)"""
+        diretorio = os.path.dirname(self.arquivo_historico) or "."
+        prefixo = os.path.basename(self.arquivo_historico) + "_"
+        atual = os.path.basename(self._caminho_historico(self._geracao_historico))
+        return [os.path.join(diretorio, nome) for nome in os.listdir(diretorio)
+                if nome.startswith(prefixo) and nome.endswith(".pickle") and nome != atual
+                and nome[len(prefixo):-len(".pickle")].isdigit()]
+
+    def _remover_geracoes_antigas(self) -> None:
+        """Apaga os arquivos das gerações substituídas.
+
+        No Windows, um arquivo ainda aberto por um instantâneo não pode ser
+        apagado: ele fica para a próxima gravação (ou para a próxima carga).
+        """
+        pendentes = []
+        for caminho in self._geracoes_antigas:
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                pendentes.append(caminho)
+        self._geracoes_antigas = pendentes
+
+    @property
+    def historico_pedidos(self) -> List[Pedido]:
+        """Pedidos entregues, lidos do arquivo do histórico no primeiro acesso"""
+        if self._historico is None:
+            historico = []
+            for segmento in self._ler_segmentos(self._segmentos_salvos):
+                historico.extend(segmento)
+            historico.extend(self._historico_novos)
+            self._historico = historico
+        return self._historico
+
+    @historico_pedidos.setter
+    def historico_pedidos(self, pedidos: List[Pedido]) -> None:
+        self._historico = pedidos
+        self._historico_novos = []
+        self._historico_reescrever = True
+
+    @property
+    def quantidade_historico(self) -> int:
+        """Tamanho do histórico sem precisar carregá-lo"""
+        if self._historico is not None:
+            return len(self._historico)
+        return sum(s["quantidade"] for s in self._segmentos_salvos) + len(self._historico_novos)
+
+    def _ler_segmentos(self, segmentos: List[Dict]) -> Iterator[List[Pedido]]:
+        if not segmentos:
+            return
+        with open(self._caminho_historico(self._geracao_historico), "rb") as f:
+            for segmento in segmentos:
+                f.seek(segmento["posicao"])
+                yield _CarregadorPickle(f).load()
+
+    def _gravar_segmento(self, f, pedidos: List[Pedido]) -> None:
+        posicao = f.tell()
+        pickle.dump(pedidos, f)
+        self._segmentos_salvos.append({
+            "posicao": posicao,
+            "fim": f.tell(),
+            "quantidade": len(pedidos),
+            "numero_inicial": min(p.numero for p in pedidos),
+            "numero_final": max(p.numero for p in pedidos),
+        })
+        self.bytes_escritos += f.tell() - posicao
+
+    def _salvar_historico(self) -> Optional[str]:
+        """Grava o histórico; retorna o arquivo da geração anterior, se foi substituído.
+
+        Pedidos entregues desde o último salvamento são anexados como um novo
+        segmento. O arquivo só é regravado inteiro (numa nova geração) quando o
+        histórico foi substituído ou acumulou segmentos pequenos demais.
+        """
+        limite = self.quantidade_historico // TAMANHO_SEGMENTO + SEGMENTOS_EXTRAS_HISTORICO
+        if len(self._segmentos_salvos) + bool(self._historico_novos) > limite:
+            self._historico_reescrever = True
+
+        if self._historico_reescrever:
+            historico = self.historico_pedidos
+            anterior = self._caminho_historico(self._geracao_historico)
+            self._geracao_historico += 1
+            self._segmentos_salvos = []
+            with open(self._caminho_historico(self._geracao_historico), "wb") as f:
+                for inicio in range(0, len(historico), TAMANHO_SEGMENTO):
+                    self._gravar_segmento(f, historico[inicio:inicio + TAMANHO_SEGMENTO])
+            self._historico_novos = []
+            self._historico_reescrever = False
+            return anterior
+
+        if self._historico_novos:
+            caminho = self._caminho_historico(self._geracao_historico)
+            fim = self._segmentos_salvos[-1]["fim"] if self._segmentos_salvos else 0
+            with open(caminho, "r+b" if os.path.exists(caminho) else "wb") as f:
+                # Descarta o que uma gravação interrompida possa ter deixado após o último segmento
+                f.seek(fim)
+                f.truncate()
+                self._gravar_segmento(f, self._historico_novos)
+            self._historico_novos = []
+        return None
+
+    def _descartar_arquivados(self) -> None:
+        """Tira do histórico os pedidos que já estão no arquivo frio.
+
+        arquivar_historico grava o arquivo antes do histórico: se o processo
+        cai entre as duas gravações (ou o histórico não é salvo), os mesmos
+        pedidos ficam nos dois lugares e os relatórios os contariam duas
+        vezes. Pelos intervalos de números dos índices, o histórico só é lido
+        se algum segmento dele cruza um segmento arquivado.
+        """
+        faixas = [(s["numero_inicial"], s["numero_final"]) for s in self.arquivo_frio.segmentos]
+
+        def cruza(inicial: int, final: int) -> bool:
+            return any(a <= final and inicial <= b for a, b in faixas)
+
+        if not faixas:
+            return
+        if self._historico is None and not (
+                any(cruza(s["numero_inicial"], s["numero_final"]) for s in self._segmentos_salvos)
+                or any(cruza(p.numero, p.numero) for p in self._historico_novos)):
+            return
+        historico = self.historico_pedidos
+        suspeitos = sorted(p.numero for p in historico if cruza(p.numero, p.numero))
+        if not suspeitos:
+            return
+        arquivados = set()
+        for segmento in self.arquivo_frio.segmentos:
+            posicao = bisect.bisect_left(suspeitos, segmento["numero_inicial"])
+            if posicao < len(suspeitos) and suspeitos[posicao] <= segmento["numero_final"]:
+                arquivados.update(p.numero for p in self.arquivo_frio.ler_segmento(segmento))
+        restantes = [p for p in historico if p.numero not in arquivados]
+        if len(restantes) < len(historico):
+            # Regravado no próximo salvamento
+            self.historico_pedidos = restantes
+
+    def _buscar_no_historico(self, numero: int) -> Optional[Pedido]:
+        """Procura no histórico; sem carregá-lo, lê só os segmentos que podem conter o número"""
+        if self._historico is not None:
+            for pedido in self._historico:
+                if pedido.numero == numero:
+                    return pedido
+            return None
+        candidatos = [s for s in self._segmentos_salvos
+                      if s["numero_inicial"] <= numero <= s["numero_final"]]
+        for segmento in itertools.chain(self._ler_segmentos(candidatos), [self._historico_novos]):
+            for pedido in segmento:
+                if pedido.numero == numero:
+                    return pedido
+        return None
+
+    # ----- Instantâneos e tarefas em segundo plano -----
+
+    def instantaneo(self) -> Instantaneo:
+        """Cópia de leitura do estado atual, para consultas longas"""
+        return Instantaneo(self)
+
+    def em_segundo_plano(self, descricao: str, tarefa: Callable[[], Callable[[], None]]) -> None:
+        """Roda `tarefa` numa thread; a função de exibição que ela retorna é chamada pelo menu"""
+        def executar():
+            try:
+                exibir = tarefa()
+            except Exception as erro:
+                exibir = functools.partial(print, f"⚠️ Falha: {erro}")
+            self._tarefas_concluidas.append((descricao, exibir))
+
+        thread = threading.Thread(target=executar, name=descricao, daemon=True)
+        self._tarefas.append(thread)
+        thread.start()
+
+    def exibir_tarefas_concluidas(self, aguardar: bool = False) -> None:
+        """Mostra os resultados prontos (ou espera todas as tarefas, se aguardar=True)"""
+        if aguardar:
+            for thread in self._tarefas:
+                thread.join()
+        self._tarefas = [thread for thread in self._tarefas if thread.is_alive()]
+        while self._tarefas_concluidas:
+            descricao, exibir = self._tarefas_concluidas.popleft()
+            print(f"\n📬 {descricao}:")
+            exibir()
+
+    # ----- Índices e ouvintes -----
+
+    def registrar_ouvinte(self, ouvinte: object) -> None:
+        """Registra um objeto notificado a cada criação, alteração ou entrega de pedido"""
+        self.ouvintes.append(ouvinte)
+
+    def _notificar(self, evento: str, *args) -> None:
+        for ouvinte in self.ouvintes:
+            metodo = getattr(ouvinte, evento, None)
+            if metodo is not None:
+                metodo(*args)
+
+    @property
+    def indice_clientes(self) -> IndiceClientes:
+        """Índice de clientes, montado na primeira consulta"""
+        if self._indice_clientes is None:
+            self._indice_clientes = IndiceClientes(self.motor_precos)
+            self._indice_clientes.construir(self.iterar_pedidos())
+            self.registrar_ouvinte(self._indice_clientes)
+        return self._indice_clientes
+
+    @property
+    def indice_ingredientes(self) -> IndiceIngredientes:
+        """Índice invertido de ingredientes, montado na primeira consulta"""
+        if self._indice_ingredientes is None:
+            self._indice_ingredientes = IndiceIngredientes(self.cardapio)
+            self._indice_ingredientes.construir(self.iterar_pedidos())
+            self.registrar_ouvinte(self._indice_ingredientes)
+        return self._indice_ingredientes
+
+    @property
+    def projecao_demanda(self) -> ProjecaoDemanda:
+        """Demanda de ingredientes da fila, montada na primeira consulta"""
+        if self._projecao_demanda is None:
+            self._projecao_demanda = ProjecaoDemanda(self.cardapio, self.fila_pedidos)
+            self.registrar_ouvinte(self._projecao_demanda)
+        return self._projecao_demanda
+
+    @property
+    def previsao_demanda(self) -> PrevisaoDemanda:
+        """Previsão por hora da semana, montada na primeira consulta"""
+        if self._previsao_demanda is None:
+            self._previsao_demanda = PrevisaoDemanda()
+            self._previsao_demanda.construir(list(self.iterar_pedidos(incluir_fila=False)))
+            self.registrar_ouvinte(self._previsao_demanda)
+        return self._previsao_demanda
+
+    @property
+    def lotes_forno(self) -> LotesForno:
+        """Fornadas dos pedidos pendentes, montadas na primeira consulta"""
+        if self._lotes_forno is None:
+            self._lotes_forno = LotesForno(self.fila_pedidos)
+            self.registrar_ouvinte(self._lotes_forno)
+        return self._lotes_forno
+
+    def _entregues_desde(self, limite: datetime.datetime) -> List[Pedido]:
+        """Pedidos entregues a partir de `limite` (o histórico está em ordem de entrega)"""
+        entregues = []
+        for pedido in reversed(self.historico_pedidos):
+            data_entrega = getattr(pedido, "data_entrega", None)
+            if data_entrega is None or data_entrega < limite:
+                break
+            entregues.append(pedido)
+        return entregues
+
+    @property
+    def metricas_cozinha(self) -> MetricasCozinha:
+        """Métricas das últimas horas, montadas na primeira consulta"""
+        if self._metricas_cozinha is None:
+            limite = datetime.datetime.now() - datetime.timedelta(minutes=max(JANELAS_METRICAS))
+            entregues = self._entregues_desde(limite)
+            criados = [p for p in itertools.chain(entregues, self.fila_pedidos) if p.data_hora >= limite]
+            self._metricas_cozinha = MetricasCozinha()
+            self._metricas_cozinha.construir(criados, entregues)
+            self.registrar_ouvinte(self._metricas_cozinha)
+        return self._metricas_cozinha
+
+    @property
+    def tendencias(self) -> TendenciasPedidos:
+        """Sabores e adicionais em alta, montados na primeira consulta"""
+        if self._tendencias is None:
+            # Pedidos com mais de oito meias-vidas pesam menos de 0,4% e ficam de fora
+            limite = datetime.datetime.now() - datetime.timedelta(minutes=8 * MEIA_VIDA_TENDENCIAS_MINUTOS)
+            recentes = itertools.chain(self._entregues_desde(limite), self.fila_pedidos)
+            self._tendencias = TendenciasPedidos()
+            self._tendencias.construir(p for p in recentes if p.data_hora >= limite)
+            self.registrar_ouvinte(self._tendencias)
+        return self._tendencias
+
+    def _cardapio_alterado(self) -> None:
+        """Invalida o motor de preços e avisa os ouvintes após editar o cardápio"""
+        self.motor_precos.invalidar()
+        self._notificar("cardapio_alterado")
+
+    # ----- API programática (sem input) -----
+
+    def _validar_itens(self, sabor: Optional[str] = None, tamanho: Optional[str] = None,
+                       adicionais: Optional[List[str]] = None) -> None:
+        """Garante que sabor, tamanho e adicionais existem no cardápio"""
+        if sabor is not None and sabor not in self.cardapio["sabores"]:
+            raise ValueError(f"Sabor inexistente no cardápio: {sabor}")
+        if tamanho is not None and tamanho not in self.cardapio["tamanhos"]:
+            raise ValueError(f"Tamanho inválido: {tamanho}")
+        for adicional in adicionais or []:
+            if adicional not in self.cardapio["adicionais"]:
+                raise ValueError(f"Adicional inexistente no cardápio: {adicional}")
+
+    @instrumentado
+    def criar_pedido(self, nome_cliente: str, telefone: str, sabor: str,
+                     tamanho: str = "Média", adicionais: Optional[List[str]] = None,
+                     observacoes: str = "", data_hora: datetime.datetime = None,
+                     outras_pizzas: Optional[List[Tuple[str, str, List[str]]]] = None,
+                     salvar: bool = True) -> Pedido:
+        """Cria um pedido e o coloca na fila, sem interação com o usuário.
+
+        sabor/tamanho/adicionais descrevem a primeira pizza; `outras_pizzas`
+        traz (sabor, tamanho, adicionais) de cada pizza a mais do pedido.
+        """
+        adicionais = list(adicionais or [])
+        self._validar_itens(sabor, tamanho, adicionais)
+        outras = []
+        for outro_sabor, outro_tamanho, outros_adicionais in outras_pizzas or []:
+            self._validar_itens(outro_sabor, outro_tamanho, outros_adicionais)
+            outras.append(ItemPedido(outro_sabor, outro_tamanho, list(outros_adicionais)))
+
+        novo_pedido = Pedido(
+            numero=self.contador_pedidos,
+            cliente=f"{nome_cliente} ({telefone})",
+            sabor=sabor,
+            tamanho=tamanho,
+            adicional=adicionais,
+            observacoes=observacoes,
+            data_hora=data_hora,
+            outras_pizzas=outras
+        )
+
+        # Incrementa o contador e adiciona à fila
+        self.contador_pedidos += 1
+        self.fila_pedidos.append(novo_pedido)
+        self.versao_fila += 1
+        self._notificar("pedido_criado", novo_pedido)
+        if salvar:
+            self.salvar_dados()
+        return novo_pedido
+
+    def buscar_pedido(self, numero: int) -> Optional[Pedido]:
+        """Procura um pedido pelo número na fila e depois no histórico"""
+        return self.localizar_pedido(numero)[0]
+
+    def localizar_pedido(self, numero: int) -> Tuple[Optional[Pedido], Optional[str]]:
+        """Retorna o pedido e onde ele está ("fila", "historico" ou "arquivo")"""
+        for pedido in self.fila_pedidos:
+            if pedido.numero == numero:
+                return pedido, "fila"
+        pedido = self._buscar_no_historico(numero)
+        if pedido is not None:
+            return pedido, "historico"
+        pedido = self.arquivo_frio.buscar(numero)
+        if pedido is not None:
+            return pedido, "arquivo"
+        return None, None
+
+    def _pedido_na_fila(self, numero: int) -> Pedido:
+        for pedido in self.fila_pedidos:
+            if pedido.numero == numero:
+                return pedido
+        raise ValueError(f"Pedido #{numero} não está na fila")
+
+    @instrumentado
+    def editar_pedido(self, numero: int, sabor: Optional[str] = None,
+                      tamanho: Optional[str] = None, adicionais: Optional[List[str]] = None,
+                      observacoes: Optional[str] = None, status: Optional[str] = None,
+                      salvar: bool = True) -> Pedido:
+        """Altera um pedido da fila; campos None permanecem como estão"""
+        pedido = self._pedido_na_fila(numero)
+        # Adicionais que já estavam no pedido continuam válidos mesmo se saíram do cardápio
+        novos_adicionais = [a for a in adicionais or [] if a not in pedido.adicional]
+        self._validar_itens(sabor, tamanho, novos_adicionais)
+        if status is not None and status not in STATUS_FILA:
+            raise ValueError(f"Status inválido: {status}")
+        anterior = estado_pedido(pedido)
+
+        if sabor is not None:
+            pedido.sabor = sabor
+        if tamanho is not None:
+            pedido.tamanho = tamanho
+        if adicionais is not None:
+            pedido.adicional = list(adicionais)
+        if observacoes is not None:
+            pedido.observacoes = observacoes
+        if status is not None:
+            pedido.status = status
+            # Status definido à mão vale para as pizzas (só "Pendente" faz alguma voltar)
+            if status in STATUS_ITEM:
+                etapa = STATUS_ITEM.index(status)
+                for item in pedido.itens:
+                    if status == "Pendente" or STATUS_ITEM.index(item.status) < etapa:
+                        item.status = status
+        pedido.tempo_preparo = pedido._calcular_tempo_preparo()
+        pedido.versao += 1
+        self.versao_fila += 1
+        self._notificar("pedido_alterado", pedido, anterior)
+
+        if salvar:
+            self.salvar_dados()
+        return pedido
+
+    @instrumentado
+    def avancar_item(self, numero: int, indice: Optional[int] = None,
+                     salvar: bool = True) -> ItemPedido:
+        """Leva uma pizza do pedido para a próxima etapa da cozinha
+        (Pendente -> Em preparo -> Pronto). Sem índice, avança a primeira
+        pizza que ainda não está pronta. O status do pedido acompanha as
+        etapas das pizzas enquanto ele estiver na cozinha."""
+        pedido = self._pedido_na_fila(numero)
+        if indice is None:
+            indice = next((i for i, item in enumerate(pedido.itens) if item.status != "Pronto"), None)
+            if indice is None:
+                raise ValueError(f"Todas as pizzas do pedido #{numero} já estão prontas")
+        if not 0 <= indice < len(pedido.itens):
+            raise ValueError(f"Pedido #{numero} não tem a pizza {indice + 1}")
+        item = pedido.itens[indice]
+        if item.status == "Pronto":
+            raise ValueError(f"A pizza {indice + 1} do pedido #{numero} já está pronta")
+        anterior = estado_pedido(pedido)
+
+        item.status = STATUS_ITEM[STATUS_ITEM.index(item.status) + 1]
+        if pedido.status in STATUS_ITEM:
+            pedido.status = pedido.status_cozinha()
+        pedido.versao += 1
+        self.versao_fila += 1
+        self._notificar("pedido_alterado", pedido, anterior)
+
+        if salvar:
+            self.salvar_dados()
+        return item
+
+    @instrumentado
+    def entregar(self, numero: Optional[int] = None, salvar: bool = True) -> Pedido:
+        """Entrega um pedido da fila (o primeiro, se o número não for informado)"""
+        if not self.fila_pedidos:
+            raise ValueError("Nenhum pedido na fila")
+        pedido = self.fila_pedidos[0] if numero is None else self._pedido_na_fila(numero)
+
+        # Remove o pedido da fila e adiciona ao histórico
+        anterior = estado_pedido(pedido)
+        self.fila_pedidos.remove(pedido)
+        pedido.status = "Entregue"
+        for item in pedido.itens:
+            item.status = "Pronto"
+        pedido.data_entrega = datetime.datetime.now()
+        if self._historico is not None:
+            self._historico.append(pedido)
+        self._historico_novos.append(pedido)
+        self.versao_fila += 1
+        self._notificar("pedido_entregue", pedido, anterior)
+
+        if salvar:
+            self.salvar_dados()
+        return pedido
+
+    @instrumentado
+    def arquivar_historico(self, dias: int = DIAS_ARQUIVAMENTO, salvar: bool = True) -> int:
+        """Move para o arquivo frio os pedidos do histórico com mais de `dias` dias"""
+        limite = datetime.datetime.now() - datetime.timedelta(days=dias)
+        antigos = [p for p in self.historico_pedidos if p.data_hora < limite]
+        if not antigos:
+            return 0
+        # Grava o arquivo antes de tirar os pedidos do histórico para não perder nada
+        self.arquivo_frio.arquivar(antigos)
+        self.historico_pedidos = [p for p in self.historico_pedidos if p.data_hora >= limite]
+        if salvar:
+            self.salvar_dados()
+        return len(antigos)
+
+    # ----- Menus interativos -----
+
+    @instrumentado
     def adicionar_pedido(self) -> None:
         """Adiciona um novo pedido à fila"""
         print("\n=== Novo Pedido ===")
@@ -116,6 +1957,75 @@ class SistemaPizzaria:
         nome_cliente = input("Nome do cliente: ")
         telefone = input("Telefone para contato: ")
 
+        # Cliente recorrente: oferece repetir o último pedido com uma tecla
+        pizzas = self._oferecer_repeticao(telefone)
+        if pizzas is None:
+            pizzas = [self._escolher_pizza()]
+        while input("\nAdicionar outra pizza ao pedido? (S/N): ").strip().upper() == "S":
+            pizzas.append(self._escolher_pizza())
+        sabor_pizza, tamanho, adicionais = pizzas[0]
+        if not nome_cliente.strip():
+            ultimos = self.indice_clientes.ultimos_pedidos(telefone, 1)
+            if ultimos:
+                nome_cliente = separar_cliente(ultimos[0].cliente)[0]
+
+        # Observações
+        observacoes = input("\nObservações adicionais: ")
+
+        # Calcula valor total
+        valor_total = sum(self.motor_precos.valor(*pizza) for pizza in pizzas)
+
+        # Confirmação do pedido
+        print("\n=== Resumo do Pedido ===")
+        print(f"Cliente: {nome_cliente}")
+        print(f"Telefone: {telefone}")
+        for i, (sabor, tamanho_pizza, adicionais_pizza) in enumerate(pizzas, 1):
+            rotulo = "Pizza" if len(pizzas) == 1 else f"Pizza {i}"
+            print(f"{rotulo}: {sabor} ({tamanho_pizza})")
+            print(f"Adicionais: {', '.join(adicionais_pizza) if adicionais_pizza else 'Nenhum'}")
+        if observacoes:
+            print(f"Observações: {observacoes}")
+        print(f"Valor total: R$ {valor_total:.2f}")
+
+        confirma = input("\nConfirmar pedido? (S/N): ").strip().upper()
+        if confirma != "S":
+            print("❌ Pedido cancelado!")
+            return
+
+        # Cria o novo pedido
+        novo_pedido = self.criar_pedido(nome_cliente, telefone, sabor_pizza, tamanho,
+                                        adicionais, observacoes, outras_pizzas=pizzas[1:])
+
+        print(f"\n✅ Pedido #{novo_pedido.numero} registrado com sucesso!")
+        print(f"⏱️ Tempo estimado de preparo: {novo_pedido.tempo_preparo} minutos")
+
+    def _oferecer_repeticao(self, telefone: str) -> Optional[List[Tuple[str, str, List[str]]]]:
+        """Mostra o último pedido do cliente e permite repeti-lo com a tecla R"""
+        ultimos = self.indice_clientes.ultimos_pedidos(telefone, 1)
+        if not ultimos:
+            return None
+
+        ultimo = ultimos[0]
+        print("\n🔁 Cliente conhecido! Último pedido:")
+        for item in ultimo.itens:
+            print(f"   {item.sabor} ({item.tamanho})"
+                  f" | Adicionais: {', '.join(item.adicional) if item.adicional else 'Nenhum'}")
+        if input("Digite R para repetir ou ENTER para montar outro: ").strip().upper() != "R":
+            return None
+
+        pizzas = []
+        for item in ultimo.itens:
+            if item.sabor not in self.cardapio["sabores"] or item.tamanho not in self.cardapio["tamanhos"]:
+                print(f"⚠️ {item.sabor} ({item.tamanho}) não está mais no cardápio.")
+                continue
+            adicionais = [a for a in item.adicional if a in self.cardapio["adicionais"]]
+            if len(adicionais) < len(item.adicional):
+                print("⚠️ Alguns adicionais saíram do cardápio e foram removidos.")
+            pizzas.append((item.sabor, item.tamanho, adicionais))
+        return pizzas or None
+
+    def _escolher_pizza(self) -> Tuple[str, str, List[str]]:
+        """Pergunta sabor, tamanho e adicionais da pizza"""
         # Mostra opções de sabores
         print("\n--- Sabores disponíveis ---")
         for i, sabor in enumerate(self.cardapio["sabores"].keys(), 1):
@@ -164,47 +2074,117 @@ class SistemaPizzaria:
                 adicionais.append(adicional)
                 print(f"✅ {adicional} adicionado!")
 
-        # Observações
-        observacoes = input("\nObservações adicionais: ")
+        return sabor_pizza, tamanho, adicionais
 
-        # Calcula valor total
-        valor_base = self.cardapio["sabores"][sabor_pizza]["preco"][tamanho]
-        valor_adicionais = sum(self.cardapio["adicionais"][a] for a in adicionais)
-        valor_total = valor_base + valor_adicionais
-
-        # Confirmação do pedido
-        print("\n=== Resumo do Pedido ===")
-        print(f"Cliente: {nome_cliente}")
-        print(f"Telefone: {telefone}")
-        print(f"Pizza: {sabor_pizza} ({tamanho})")
-        print(f"Adicionais: {', '.join(adicionais) if adicionais else 'Nenhum'}")
-        if observacoes:
-            print(f"Observações: {observacoes}")
-        print(f"Valor total: R$ {valor_total:.2f}")
-
-        confirma = input("\nConfirmar pedido? (S/N): ").strip().upper()
-        if confirma != "S":
-            print("❌ Pedido cancelado!")
+    @instrumentado
+    def consultar_cliente(self) -> None:
+        """Mostra o histórico e as estatísticas de um cliente pelo telefone"""
+        telefone = input("Telefone do cliente: ")
+        estatisticas = self.indice_clientes.estatisticas(telefone)
+        if estatisticas is None:
+            print("⚠️ Nenhum pedido encontrado para esse telefone.")
             return
 
-        # Cria o novo pedido
-        novo_pedido = Pedido(
-            numero=self.contador_pedidos,
-            cliente=f"{nome_cliente} ({telefone})",
-            sabor=sabor_pizza,
-            tamanho=tamanho,
-            adicional=adicionais,
-            observacoes=observacoes
-        )
-
-        # Incrementa o contador e adiciona à fila
-        self.contador_pedidos += 1
-        self.fila_pedidos.append(novo_pedido)
-        self.salvar_dados()
+        print(f"\n=== CLIENTE: {estatisticas['nome']} ===")
+        print(f"Total de pedidos: {estatisticas['total_pedidos']}")
+        print(f"Total gasto: R$ {estatisticas['total_gasto']:.2f}")
+        print(f"Ticket médio: R$ {estatisticas['ticket_medio']:.2f}")
+        print(f"Cliente desde: {estatisticas['primeiro_pedido'].strftime('%d/%m/%Y')}")
+        print(f"Último pedido: {estatisticas['ultimo_pedido'].strftime('%d/%m/%Y %H:%M')}")
+        print(f"Sabor favorito: {estatisticas['sabor_favorito']}")
+
+        print("\nÚltimos pedidos:")
+        for pedido in self.indice_clientes.ultimos_pedidos(telefone):
+            print(f"- {pedido.data_hora.strftime('%d/%m/%Y')} | {pedido}")
+
+    @instrumentado
+    def buscar_por_ingrediente(self) -> None:
+        """Lista os pedidos recentes que usaram um ingrediente"""
+        termo = input("Ingrediente: ").strip()
+        if not termo:
+            return
+        try:
+            horas = int(input("Últimas quantas horas? [48]: ") or 48)
+        except ValueError:
+            print("⚠️ Número inválido! Usando 48 horas.")
+            horas = 48
+
+        indice = self.indice_ingredientes
+        ingredientes = indice.ingredientes_correspondentes(termo)
+        if not ingredientes:
+            print("⚠️ Nenhum ingrediente conhecido corresponde à busca.")
+            return
 
-        print(f"\n✅ Pedido #{novo_pedido.numero} registrado com sucesso!")
-        print(f"⏱️ Tempo estimado de preparo: {novo_pedido.tempo_preparo} minutos")
+        desde = datetime.datetime.now() - datetime.timedelta(hours=horas)
+        pedidos = indice.pedidos_com_ingrediente(termo, desde)
+        print(f"\n🔎 Ingredientes: {', '.join(ingredientes)}")
+        print(f"{len(pedidos)} pedidos nas últimas {horas} horas:")
+        for pedido in pedidos:
+            print(f"- {pedido.data_hora.strftime('%d/%m/%Y %H:%M')} | {pedido}")
+
+    @instrumentado
+    def painel_cozinha(self) -> None:
+        """Mostra o que a cozinha precisa para atender a fila atual"""
+        print("\n👨‍🍳 == PAINEL DA COZINHA ==")
+        print("Janela    Pedidos/h  Entregas/h  Espera média  Espera p90  Atrasados")
+        for janela, metricas in self.metricas_cozinha.resumo().items():
+            p90 = metricas["espera_p90"]
+            p90 = f"{p90} min" if p90 is not None else f">{LIMITES_ESPERA_MINUTOS[-1]} min"
+            print(f"{janela:>4} min {metricas['criados_por_hora']:10.1f} {metricas['entregues_por_hora']:11.1f} "
+                  f"{metricas['espera_media']:9.1f} min {p90:>11} "
+                  f"{metricas['atrasados']:6d} ({metricas['percentual_atrasados']:.0f}%)")
+
+        demanda = self.projecao_demanda.demanda
+        if not demanda:
+            print("Nenhum pedido aguardando preparo.")
+            return
 
+        print("\nIngredientes necessários para a fila:")
+        for ingrediente, gramas in sorted(demanda.items(), key=lambda x: x[1], reverse=True):
+            quantidade = f"{gramas / 1000:.2f} kg" if gramas >= 1000 else f"{gramas} g"
+            print(f"- {ingrediente.capitalize()}: {quantidade}")
+
+        lotes = self.lotes_forno.lotes()
+        if lotes:
+            print("\n🔥 Próximas fornadas:")
+            for i, lote in enumerate(lotes, 1):
+                economia = lote.tempo_individual - lote.tempo_preparo
+                detalhe = f" (economia de {economia} min)" if economia > 0 else ""
+                print(f"{i}. {lote} | {lote.tempo_preparo} min{detalhe}")
+
+    def exibir_em_alta(self, k: int = 5) -> None:
+        """Mostra os sabores e adicionais mais pedidos recentemente"""
+        print(f"\n🔥 == EM ALTA AGORA (meia-vida de {MEIA_VIDA_TENDENCIAS_MINUTOS} min) ==")
+        for titulo, resumo in (("Sabores", self.tendencias.sabores),
+                               ("Adicionais", self.tendencias.adicionais)):
+            top = resumo.top(k)
+            print(f"\n{titulo}:")
+            if not top:
+                print("Nenhum pedido recente.")
+                continue
+            for i, (nome, contagem, erro) in enumerate(top, 1):
+                detalhe = f" (±{erro:.1f})" if erro >= 0.05 else ""
+                print(f"{i}. {nome}: {contagem:.1f}{detalhe}")
+
+    @instrumentado
+    def exibir_previsao(self) -> None:
+        """Mostra a previsão de pedidos e de uso do forno para as próximas horas"""
+        if not self.quantidade_historico and not self.arquivo_frio.segmentos:
+            print("📊 Nenhum pedido no histórico para calcular a previsão!")
+            return
+        try:
+            horas = int(input("Prever quantas horas? [12]: ") or 12)
+        except ValueError:
+            print("⚠️ Número inválido! Usando 12 horas.")
+            horas = 12
+
+        print("\n📈 == PREVISÃO DE DEMANDA ==")
+        print("Hora              Pedidos   Forno (min)")
+        for hora, pedidos, minutos in self.previsao_demanda.prever(horas):
+            rotulo = f"{DIAS_SEMANA[hora.weekday()]} {hora.strftime('%d/%m %Hh')}"
+            print(f"{rotulo:<16} {pedidos:8.1f} {minutos:12.0f}")
+
+    @instrumentado
     def visualizar_fila(self) -> None:
         """Exibe a fila de pedidos atual"""
         if not self.fila_pedidos:
@@ -212,14 +2192,15 @@ class SistemaPizzaria:
             return
 
         print("\n📋 == FILA DE PEDIDOS ==")
-        for i, pedido in enumerate(self.fila_pedidos, 1):
-            tempo_espera = (datetime.datetime.now() - pedido.data_hora).total_seconds() // 60
-            print(f"{i}. {pedido}")
-            print(f"   ⏱️ Aguardando há {int(tempo_espera)} minutos | Preparo: {pedido.tempo_preparo} min")
-            if pedido.observacoes:
-                print(f"   📝 Obs: {pedido.observacoes}")
+        agora = datetime.datetime.now()
+        linhas = self.fragmentos_fila.linhas(self.fila_pedidos, self.versao_fila)
+        for i, (data_hora, cabecalho, detalhes) in enumerate(linhas, 1):
+            tempo_espera = (agora - data_hora).total_seconds() // 60
+            print(f"{i}. {cabecalho}")
+            print(f"   ⏱️ Aguardando há {int(tempo_espera)} minutos{detalhes}")
             print()
 
+    @instrumentado
     def entregar_pedido(self) -> None:
         """Remove o primeiro pedido da fila (FIFO)"""
         if not self.fila_pedidos:
@@ -242,18 +2223,37 @@ class SistemaPizzaria:
             print("⚠️ Posição inválida!")
             return
 
-        # Remove o pedido da fila
-        pedido_entregue = self.fila_pedidos.pop(posicao)
-        pedido_entregue.status = "Entregue"
+        # Move o pedido para o histórico e salva os dados
+        pedido_entregue = self.entregar(self.fila_pedidos[posicao].numero)
 
-        # Adiciona ao histórico
-        self.historico_pedidos.append(pedido_entregue)
+        print(f"🍕 Pedido #{pedido_entregue.numero} de {pedido_entregue.cliente} foi entregue!")
 
-        # Salva os dados
-        self.salvar_dados()
+    @instrumentado
+    def avancar_pizza(self) -> None:
+        """Marca a próxima etapa de uma pizza na cozinha"""
+        if not self.fila_pedidos:
+            print("🚫 Nenhum pedido na fila!")
+            return
 
-        print(f"🍕 Pedido #{pedido_entregue.numero} de {pedido_entregue.cliente} foi entregue!")
+        numero_pedido = int(input("Digite o número do pedido: "))
+        try:
+            pedido = self._pedido_na_fila(numero_pedido)
+        except ValueError as erro:
+            print(f"⚠️ {erro}")
+            return
 
+        for i, item in enumerate(pedido.itens, 1):
+            print(f"{i}. {item}")
+        escolha = input("Número da pizza (ENTER para a próxima não pronta): ")
+        try:
+            item = self.avancar_item(pedido.numero, int(escolha) - 1 if escolha else None)
+        except ValueError as erro:
+            print(f"⚠️ {erro}")
+            return
+        print(f"✅ {item.sabor} ({item.tamanho}) agora está: {item.status}")
+        print(f"📋 Pedido #{pedido.numero}: {pedido.status}")
+
+    @instrumentado
     def alterar_pedido(self) -> None:
         """Altera informações de um pedido"""
         if not self.fila_pedidos:
@@ -273,6 +2273,8 @@ class SistemaPizzaria:
             return
 
         print(f"\nEditando pedido #{pedido.numero}")
+        if len(pedido.itens) > 1:
+            print(f"(sabor, tamanho e adicionais da pizza 1: {pedido.itens[0]})")
         print("O que deseja alterar?")
         print("1. Sabor da pizza")
         print("2. Tamanho da pizza")
@@ -295,7 +2297,7 @@ class SistemaPizzaria:
                 print("⚠️ Opção inválida!")
                 return
 
-            pedido.sabor = sabores[escolha]
+            self.editar_pedido(pedido.numero, sabor=sabores[escolha], salvar=False)
             print(f"✅ Sabor alterado para {pedido.sabor}")
 
         elif opcao == "2":  # Alterar tamanho
@@ -309,8 +2311,7 @@ class SistemaPizzaria:
                 print("⚠️ Opção inválida!")
                 return
 
-            pedido.tamanho = self.cardapio["tamanhos"][escolha]
-            pedido.tempo_preparo = pedido._calcular_tempo_preparo()
+            self.editar_pedido(pedido.numero, tamanho=self.cardapio["tamanhos"][escolha], salvar=False)
             print(f"✅ Tamanho alterado para {pedido.tamanho}")
 
         elif opcao == "3":  # Alterar adicionais
@@ -324,6 +2325,7 @@ class SistemaPizzaria:
             print("3. Substituir todos")
 
             escolha = input("Escolha uma opção: ")
+            novos_adicionais = list(pedido.adicional)
 
             if escolha == "1":  # Adicionar mais
                 while True:
@@ -336,8 +2338,8 @@ class SistemaPizzaria:
                         continue
 
                     adicional = list(self.cardapio["adicionais"].keys())[opcao_add-1]
-                    if adicional not in pedido.adicional:
-                        pedido.adicional.append(adicional)
+                    if adicional not in novos_adicionais:
+                        novos_adicionais.append(adicional)
                         print(f"✅ {adicional} adicionado!")
                     else:
                         print(f"⚠️ {adicional} já estava na lista!")
@@ -355,7 +2357,7 @@ class SistemaPizzaria:
                     print("⚠️ Opção inválida!")
                     return
 
-                removido = pedido.adicional.pop(opcao_rem-1)
+                removido = novos_adicionais.pop(opcao_rem-1)
                 print(f"✅ {removido} removido!")
 
             elif escolha == "3":  # Substituir todos
@@ -374,20 +2376,19 @@ class SistemaPizzaria:
                         novos_adicionais.append(adicional)
                         print(f"✅ {adicional} adicionado!")
 
-                pedido.adicional = novos_adicionais
                 print("✅ Adicionais substituídos!")
 
-            pedido.tempo_preparo = pedido._calcular_tempo_preparo()
+            self.editar_pedido(pedido.numero, adicionais=novos_adicionais, salvar=False)
 
         elif opcao == "4":  # Alterar observações
             print(f"Observações atuais: {pedido.observacoes}")
             novas_obs = input("Digite as novas observações: ")
-            pedido.observacoes = novas_obs
+            self.editar_pedido(pedido.numero, observacoes=novas_obs, salvar=False)
             print("✅ Observações atualizadas!")
 
         elif opcao == "5":  # Alterar status
             print("\n--- Status disponíveis ---")
-            status_disponiveis = ["Pendente", "Em preparo", "Saiu para entrega"]
+            status_disponiveis = STATUS_FILA
             for i, status in enumerate(status_disponiveis, 1):
                 print(f"{i}. {status}")
 
@@ -396,7 +2397,7 @@ class SistemaPizzaria:
                 print("⚠️ Opção inválida!")
                 return
 
-            pedido.status = status_disponiveis[escolha]
+            self.editar_pedido(pedido.numero, status=status_disponiveis[escolha], salvar=False)
             print(f"✅ Status alterado para {pedido.status}")
 
         else:
@@ -407,24 +2408,25 @@ class SistemaPizzaria:
         self.salvar_dados()
         print("✅ Pedido atualizado com sucesso!")
 
+    @instrumentado
     def consultar_pedido(self) -> None:
         """Consulta detalhes de um pedido específico"""
         numero_pedido = int(input("Informe o número do pedido que deseja consultar: "))
-
-        # Procura na fila atual
-        for pedido in self.fila_pedidos:
-            if pedido.numero == numero_pedido:
-                self._exibir_detalhes_pedido(pedido)
-                return
-
-        # Procura no histórico
-        for pedido in self.historico_pedidos:
-            if pedido.numero == numero_pedido:
-                self._exibir_detalhes_pedido(pedido)
-                print("📝 Nota: Este pedido já foi entregue e está no histórico.")
-                return
-
-        print("⚠️ Pedido não encontrado.")
+        self.mostrar_pedido(numero_pedido)
+
+    def mostrar_pedido(self, numero: int) -> bool:
+        """Exibe um pedido da fila, do histórico ou do arquivo; False se não existir"""
+        pedido, local = self.localizar_pedido(numero)
+        if pedido is None:
+            print("⚠️ Pedido não encontrado.")
+            return False
+
+        self._exibir_detalhes_pedido(pedido)
+        if local == "historico":
+            print("📝 Nota: Este pedido já foi entregue e está no histórico.")
+        elif local == "arquivo":
+            print("📦 Nota: Este pedido é antigo e está no arquivo.")
+        return True
 
     def _exibir_detalhes_pedido(self, pedido: Pedido) -> None:
         """Exibe detalhes formatados de um pedido"""
@@ -433,16 +2435,18 @@ class SistemaPizzaria:
         print(f"Cliente: {pedido.cliente}")
         print(f"Data/Hora: {pedido.data_hora.strftime('%d/%m/%Y %H:%M')}")
         print(f"Status: {pedido.status}")
-        print(f"Pizza: {pedido.sabor} ({pedido.tamanho})")
+        for i, item in enumerate(pedido.itens, 1):
+            rotulo = "Pizza" if len(pedido.itens) == 1 else f"Pizza {i}"
+            print(f"{rotulo}: {item.sabor} ({item.tamanho}) [{item.status}]")
 
-        # Mostra ingredientes
-        if pedido.sabor in self.cardapio["sabores"]:
-            ingredientes = self.cardapio["sabores"][pedido.sabor]["ingredientes"]
-            print(f"Ingredientes: {', '.join(ingredientes)}")
+            # Mostra ingredientes
+            if item.sabor in self.cardapio["sabores"]:
+                ingredientes = self.cardapio["sabores"][item.sabor]["ingredientes"]
+                print(f"Ingredientes: {', '.join(ingredientes)}")
 
-        # Adicionais
-        if pedido.adicional:
-            print(f"Adicionais: {', '.join(pedido.adicional)}")
+            # Adicionais
+            if item.adicional:
+                print(f"Adicionais: {', '.join(item.adicional)}")
 
         # Observações
         if pedido.observacoes:
@@ -454,12 +2458,11 @@ class SistemaPizzaria:
         print(f"Tempo estimado de preparo: {pedido.tempo_preparo} minutos")
 
         # Valor (se disponível)
-        if pedido.sabor in self.cardapio["sabores"] and pedido.tamanho in self.cardapio["sabores"][pedido.sabor]["preco"]:
-            valor_base = self.cardapio["sabores"][pedido.sabor]["preco"][pedido.tamanho]
-            valor_adicionais = sum(self.cardapio["adicionais"].get(a, 0) for a in pedido.adicional)
-            valor_total = valor_base + valor_adicionais
+        valor_total = self.motor_precos.valor_pedido(pedido)
+        if valor_total is not None:
             print(f"Valor total: R$ {valor_total:.2f}")
 
+    @instrumentado
     def gerenciar_cardapio(self) -> None:
         """Permite gerenciar o cardápio"""
         print("\n=== GERENCIAMENTO DO CARDÁPIO ===")
@@ -498,6 +2501,7 @@ class SistemaPizzaria:
                 "preco": precos
             }
 
+            self._cardapio_alterado()
             self.salvar_dados()
             print(f"✅ Sabor {nome_sabor} adicionado ao cardápio!")
 
@@ -510,6 +2514,7 @@ class SistemaPizzaria:
             try:
                 preco = float(input(f"Preço do adicional: R$ "))
                 self.cardapio["adicionais"][nome_adicional] = preco
+                self._cardapio_alterado()
                 self.salvar_dados()
                 print(f"✅ Adicional {nome_adicional} adicionado ao cardápio!")
             except ValueError:
@@ -545,6 +2550,7 @@ class SistemaPizzaria:
                     except ValueError:
                         print(f"⚠️ Preço inválido para {tamanho}! Mantendo o valor atual.")
 
+                self._cardapio_alterado()
                 self.salvar_dados()
                 print(f"✅ Preços de {sabor} atualizados!")
 
@@ -566,6 +2572,7 @@ class SistemaPizzaria:
                 try:
                     novo_preco = float(input(f"Novo preço para {adicional} (atual: R$ {preco_atual:.2f}): R$ "))
                     self.cardapio["adicionais"][adicional] = novo_preco
+                    self._cardapio_alterado()
                     self.salvar_dados()
                     print(f"✅ Preço de {adicional} atualizado!")
                 except ValueError:
@@ -598,6 +2605,7 @@ class SistemaPizzaria:
 
                 if confirma == "S":
                     del self.cardapio["sabores"][sabor]
+                    self._cardapio_alterado()
                     self.salvar_dados()
                     print(f"✅ Sabor {sabor} removido do cardápio!")
 
@@ -620,6 +2628,7 @@ class SistemaPizzaria:
 
                 if confirma == "S":
                     del self.cardapio["adicionais"][adicional]
+                    self._cardapio_alterado()
                     self.salvar_dados()
                     print(f"✅ Adicional {adicional} removido do cardápio!")
 
@@ -652,16 +2661,33 @@ class SistemaPizzaria:
         for adicional, preco in self.cardapio["adicionais"].items():
             print(f"▶ {adicional}: R$ {preco:.2f}")
 
+    @instrumentado
     def relatorio_vendas(self) -> None:
         """Gera um relatório de vendas"""
-        if not self.historico_pedidos:
+        if not self.quantidade_historico and not self.arquivo_frio.segmentos:
             print("📊 Nenhum pedido no histórico para gerar relatório!")
             return
 
         print("\n===== RELATÓRIO DE VENDAS =====")
 
-        # Define período do relatório
-        print("\nSelecione o período do relatório:")
+        data_inicio, data_fim, periodo = self._escolher_periodo("do relatório")
+
+        # Calculado sobre um instantâneo, numa thread: o menu continua livre para novos pedidos
+        instantaneo = self.instantaneo()
+
+        def tarefa():
+            with instantaneo:
+                relatorio = instantaneo.gerar_relatorio(data_inicio, data_fim)
+            if relatorio is None:
+                return functools.partial(print, f"Nenhum pedido encontrado para o período {periodo}!")
+            return functools.partial(exibir_relatorio, periodo, relatorio)
+
+        self.em_segundo_plano(f"Relatório de vendas {periodo}", tarefa)
+        print("⏳ Relatório em andamento; o resultado aparece no menu quando ficar pronto.")
+
+    def _escolher_periodo(self, descricao: str) -> Tuple[datetime.datetime, datetime.datetime, str]:
+        """Pergunta o período desejado e retorna (início, fim, descrição)"""
+        print(f"\nSelecione o período {descricao}:")
         print("1. Último dia")
         print("2. Última semana")
         print("3. Último mês")
@@ -698,102 +2724,170 @@ class SistemaPizzaria:
             except ValueError:
                 print("⚠️ Dados inválidos! Usando todo o histórico.")
                 data_inicio = datetime.datetime(1900, 1, 1)
+                data_fim = hoje
                 periodo = "de todo o histórico"
         else:  # Todo o histórico
             data_inicio = datetime.datetime(1900, 1, 1)
             periodo = "de todo o histórico"
 
         data_fim = hoje if opcao != "4" else data_fim
+        return data_inicio, data_fim, periodo
 
-        # Filtra os pedidos pelo período
-        pedidos_periodo = [p for p in self.historico_pedidos
-                         if data_inicio <= p.data_hora <= data_fim]
+    # ----- Exportação -----
 
-        if not pedidos_periodo:
-            print(f"Nenhum pedido encontrado para o período {periodo}!")
+    def _segmentos_historico(self) -> Iterator[List[Pedido]]:
+        """Percorre o histórico em segmentos de tamanho fixo (direto do arquivo, se não foi carregado)"""
+        if self._historico is None:
+            yield from self._ler_segmentos(self._segmentos_salvos)
+            yield self._historico_novos
+            return
+        for inicio in range(0, len(self._historico), TAMANHO_SEGMENTO):
+            yield self._historico[inicio:inicio + TAMANHO_SEGMENTO]
+
+    @instrumentado
+    def arquivar_pedidos(self) -> None:
+        """Move pedidos antigos do histórico para o arquivo compactado"""
+        print("\n===== ARQUIVAR PEDIDOS ANTIGOS =====")
+        print(f"Pedidos no histórico: {self.quantidade_historico} | "
+              f"Arquivados: {self.arquivo_frio.quantidade} em {len(self.arquivo_frio.segmentos)} segmentos")
+        try:
+            dias = int(input(f"Arquivar pedidos com mais de quantos dias? [{DIAS_ARQUIVAMENTO}]: ")
+                       or DIAS_ARQUIVAMENTO)
+        except ValueError:
+            print("⚠️ Número inválido!")
             return
 
-        # Estatísticas básicas
-        total_pedidos = len(pedidos_periodo)
-        faturamento = 0
-
-        # Contadores para análise
-        sabores_populares = {}
-        adicionais_populares = {}
-        tamanhos_populares = {}
-        vendas_por_dia = {}
-
-        for pedido in pedidos_periodo:
-            # Calcula faturamento
-            if pedido.sabor in self.cardapio["sabores"] and pedido.tamanho in self.cardapio["sabores"][pedido.sabor]["preco"]:
-                valor_base = self.cardapio["sabores"][pedido.sabor]["preco"][pedido.tamanho]
-                valor_adicionais = sum(self.cardapio["adicionais"].get(a, 0) for a in pedido.adicional)
-                valor_pedido = valor_base + valor_adicionais
-                faturamento += valor_pedido
-
-            # Contabiliza estatísticas
-            # Sabores
-            if pedido.sabor in sabores_populares:
-                sabores_populares[pedido.sabor] += 1
-            else:
-                sabores_populares[pedido.sabor] = 1
-
-            # Tamanhos
-            if pedido.tamanho in tamanhos_populares:
-                tamanhos_populares[pedido.tamanho] += 1
-            else:
-                tamanhos_populares[pedido.tamanho] = 1
-
-            # Adicionais
-            for adicional in pedido.adicional:
-                if adicional in adicionais_populares:
-                    adicionais_populares[adicional] += 1
-                else:
-                    adicionais_populares[adicional] = 1
-
-            # Vendas por dia
-            dia = pedido.data_hora.strftime("%d/%m/%Y")
-            if dia in vendas_por_dia:
-                vendas_por_dia[dia] += 1
-            else:
-                vendas_por_dia[dia] = 1
-
-        # Exibe o relatório
-        print(f"\n📊 Relatório de vendas {periodo}")
-        print(f"Total de pedidos: {total_pedidos}")
-        print(f"Faturamento total: R$ {faturamento:.2f}")
-
-        # Top 3 sabores mais vendidos
-        print("\nTop 3 sabores mais vendidos:")
-        for i, (sabor, qtd) in enumerate(sorted(sabores_populares.items(),
-                                              key=lambda x: x[1], reverse=True)[:3], 1):
-            print(f"{i}. {sabor}: {qtd} pedidos")
-
-        # Top 3 adicionais mais pedidos
-        if adicionais_populares:
-            print("\nTop 3 adicionais mais pedidos:")
-            for i, (adicional, qtd) in enumerate(sorted(adicionais_populares.items(),
-                                                      key=lambda x: x[1], reverse=True)[:3], 1):
-                print(f"{i}. {adicional}: {qtd} pedidos")
+        total = self.arquivar_historico(dias)
+        if total:
+            print(f"✅ {total} pedidos arquivados.")
         else:
-            print("\nNenhum adicional foi pedido no período.")
+            print(f"Nenhum pedido com mais de {dias} dias no histórico.")
+
+    @instrumentado
+    def exportar_pedidos(self) -> None:
+        """Exporta o histórico de pedidos para arquivo"""
+        print("\n===== EXPORTAR HISTÓRICO =====")
+        formato = input(f"Formato ({'/'.join(FORMATOS_EXPORTACAO)}) [csv]: ").strip().lower() or "csv"
+        if formato not in FORMATOS_EXPORTACAO:
+            print("⚠️ Formato inválido!")
+            return
 
-        # Tamanhos mais pedidos
-        print("\nTamanhos mais pedidos:")
-        for tamanho, qtd in sorted(tamanhos_populares.items(),
-                                 key=lambda x: x[1], reverse=True):
-            porcentagem = (qtd / total_pedidos) * 100
-            print(f"{tamanho}: {qtd} pedidos ({porcentagem:.1f}%)")
+        data_inicio, data_fim, periodo = self._escolher_periodo("da exportação")
+        status = input("Filtrar por status (ENTER para todos): ").strip() or None
+        caminho = input(f"Arquivo de saída [pedidos.{formato}]: ").strip() or f"pedidos.{formato}"
 
-        # Vendas por dia
-        print("\nVendas por dia:")
-        for dia, qtd in sorted(vendas_por_dia.items()):
-            print(f"{dia}: {qtd} pedidos")
+        instantaneo = self.instantaneo()
 
-def menu_principal():
-    sistema = SistemaPizzaria()
+        def tarefa():
+            try:
+                with instantaneo:
+                    total = instantaneo.exportar_historico(caminho, formato, data_inicio, data_fim, status)
+            except ImportError:
+                return functools.partial(print, "⚠️ Exportação em Parquet requer o pacote pyarrow.")
+            return functools.partial(print, f"✅ {total} pedidos {periodo} exportados para {caminho}")
+
+        self.em_segundo_plano(f"Exportação para {caminho}", tarefa)
+        print("⏳ Exportação em andamento; o resultado aparece no menu quando ficar pronta.")
+
+
+def exibir_relatorio(periodo: str, relatorio: Dict) -> None:
+    """Exibe um relatório calculado por gerar_relatorio"""
+    total_pedidos = relatorio["total_pedidos"]
+    print(f"\n📊 Relatório de vendas {periodo}")
+    print(f"Total de pedidos: {total_pedidos}")
+    print(f"Faturamento total: R$ {relatorio['faturamento']:.2f}")
+
+    # Top 3 sabores mais vendidos
+    print("\nTop 3 sabores mais vendidos:")
+    for i, (sabor, qtd) in enumerate(sorted(relatorio["sabores"].items(),
+                                          key=lambda x: x[1], reverse=True)[:3], 1):
+        print(f"{i}. {sabor}: {qtd} pizzas")
+
+    # Top 3 adicionais mais pedidos
+    if relatorio["adicionais"]:
+        print("\nTop 3 adicionais mais pedidos:")
+        for i, (adicional, qtd) in enumerate(sorted(relatorio["adicionais"].items(),
+                                                  key=lambda x: x[1], reverse=True)[:3], 1):
+            print(f"{i}. {adicional}: {qtd} pedidos")
+    else:
+        print("\nNenhum adicional foi pedido no período.")
+
+    # Tamanhos mais pedidos
+    print("\nTamanhos mais pedidos:")
+    total_pizzas = sum(relatorio["tamanhos"].values())
+    for tamanho, qtd in sorted(relatorio["tamanhos"].items(),
+                             key=lambda x: x[1], reverse=True):
+        porcentagem = (qtd / total_pizzas) * 100
+        print(f"{tamanho}: {qtd} pizzas ({porcentagem:.1f}%)")
+
+    # Vendas por dia
+    print("\nVendas por dia:")
+    for dia, qtd in sorted(relatorio["vendas_por_dia"].items()):
+        print(f"{dia}: {qtd} pedidos")
+
+
+def escrever_csv(registros: Iterable[Dict], caminho: str) -> int:
+    """Grava os registros em CSV, um por vez"""
+    total = 0
+    with open(caminho, "w", encoding="utf-8", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUNAS_EXPORTACAO)
+        escritor.writeheader()
+        for registro in registros:
+            registro["adicionais"] = "; ".join(registro["adicionais"])
+            registro["itens"] = " | ".join(registro["itens"])
+            escritor.writerow(registro)
+            total += 1
+    return total
+
+
+def escrever_jsonl(registros: Iterable[Dict], caminho: str) -> int:
+    """Grava os registros em JSON Lines, um por linha"""
+    total = 0
+    with open(caminho, "w", encoding="utf-8") as f:
+        for registro in registros:
+            f.write(json.dumps(registro, ensure_ascii=False))
+            f.write("\n")
+            total += 1
+    return total
+
+
+def escrever_parquet(registros: Iterable[Dict], caminho: str,
+                     tamanho_lote: int = 10000) -> int:
+    """Grava os registros em Parquet, em row groups de tamanho fixo (requer pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([
+        ("numero", pa.int64()), ("cliente", pa.string()), ("sabor", pa.string()),
+        ("tamanho", pa.string()), ("adicionais", pa.list_(pa.string())),
+        ("itens", pa.list_(pa.string())), ("observacoes", pa.string()), ("data_hora", pa.string()), ("status", pa.string()),
+        ("tempo_preparo", pa.int32()), ("valor_total", pa.float64()),
+    ])
+    total = 0
+    lote: List[Dict] = []
+    with pq.ParquetWriter(caminho, esquema) as escritor:
+        for registro in registros:
+            lote.append(registro)
+            if len(lote) >= tamanho_lote:
+                escritor.write_table(pa.Table.from_pylist(lote, schema=esquema))
+                total += len(lote)
+                lote = []
+        if lote:
+            escritor.write_table(pa.Table.from_pylist(lote, schema=esquema))
+            total += len(lote)
+    return total
+
+
+def menu_principal(arquivo_pedidos: str = "pedidos.pickle", arquivo_cardapio: str = "cardapio.pickle"):
+    # Instrumentação opcional: PIZZARIA_INSTRUMENTACAO=1 (ou "memoria" para medir pico de memória)
+    modo_instrumentacao = os.environ.get("PIZZARIA_INSTRUMENTACAO", "")
+    instrumentacao = None
+    if modo_instrumentacao:
+        instrumentacao = Instrumentacao(medir_memoria=modo_instrumentacao == "memoria")
+    sistema = SistemaPizzaria(arquivo_pedidos, arquivo_cardapio, instrumentacao=instrumentacao)
 
     while True:
+        sistema.exibir_tarefas_concluidas()
         print("\n🍕 === SISTEMA DE GESTÃO DE PIZZARIA === 🍕")
         print("1. Adicionar Pedido")
         print("2. Visualizar Fila de Pedidos")
@@ -803,6 +2897,14 @@ def menu_principal():
         print("6. Gerenciar Cardápio")
         print("7. Relatório de Vendas")
         print("8. Sair")
+        print("9. Exportar Histórico")
+        print("10. Consultar Cliente")
+        print("11. Buscar Pedidos por Ingrediente")
+        print("12. Painel da Cozinha")
+        print("13. Previsão de Demanda")
+        print("14. Arquivar Pedidos Antigos")
+        print("15. Em Alta Agora")
+        print("16. Avançar Pizza na Cozinha")
 
         opcao = input("\nEscolha uma opção: ")
 
@@ -821,12 +2923,129 @@ def menu_principal():
         elif opcao == "7":
             sistema.relatorio_vendas()
         elif opcao == "8":
+            sistema.exibir_tarefas_concluidas(aguardar=True)
             print("🍕 Obrigado por usar o Sistema de Gestão de Pizzaria! 👋")
             sistema.salvar_dados()
             break
+        elif opcao == "9":
+            sistema.exportar_pedidos()
+        elif opcao == "10":
+            sistema.consultar_cliente()
+        elif opcao == "11":
+            sistema.buscar_por_ingrediente()
+        elif opcao == "12":
+            sistema.painel_cozinha()
+        elif opcao == "13":
+            sistema.exibir_previsao()
+        elif opcao == "14":
+            sistema.arquivar_pedidos()
+        elif opcao == "15":
+            sistema.exibir_em_alta()
+        elif opcao == "16":
+            sistema.avancar_pizza()
+        elif opcao == "99":  # Opção oculta: métricas de instrumentação
+            if sistema.instrumentacao is None:
+                print("⚠️ Instrumentação desativada (defina PIZZARIA_INSTRUMENTACAO=1).")
+            else:
+                sistema.instrumentacao.exibir()
         else:
             print("⚠️ Opção inválida! Tente novamente.")
 
+
+def _data_argumento(valor: str) -> datetime.datetime:
+    try:
+        return datetime.datetime.strptime(valor, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida (use AAAA-MM-DD): {valor}")
+
+
+def _periodo_argumentos(args: argparse.Namespace) -> Tuple[datetime.datetime, datetime.datetime]:
+    data_inicio = args.de or datetime.datetime(1900, 1, 1)
+    data_fim = args.ate.replace(hour=23, minute=59, second=59) if args.ate else datetime.datetime.now()
+    return data_inicio, data_fim
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Sem subcomando abre o menu interativo; com subcomando executa e sai (para scripts e cron)"""
+    parser = argparse.ArgumentParser(description="Sistema de gestão de pizzaria")
+    parser.add_argument("--pedidos", default="pedidos.pickle", help="arquivo de pedidos")
+    parser.add_argument("--cardapio", default="cardapio.pickle", help="arquivo do cardápio")
+    comandos = parser.add_subparsers(dest="comando")
+
+    comandos.add_parser("queue", aliases=["fila"], help="mostra a fila de pedidos")
+
+    entregar = comandos.add_parser("deliver", aliases=["entregar"], help="entrega um pedido da fila")
+    entregar.add_argument("numero", type=int, nargs="?", help="número do pedido (padrão: o primeiro)")
+
+    mostrar = comandos.add_parser("show", aliases=["mostrar"], help="mostra os detalhes de um pedido")
+    mostrar.add_argument("numero", type=int)
+
+    avancar = comandos.add_parser("advance", aliases=["avancar"],
+                                  help="leva uma pizza do pedido para a próxima etapa da cozinha")
+    avancar.add_argument("numero", type=int)
+    avancar.add_argument("pizza", type=int, nargs="?", help="posição da pizza (padrão: a próxima não pronta)")
+
+    em_alta = comandos.add_parser("trending", aliases=["em-alta"], help="sabores e adicionais em alta")
+    em_alta.add_argument("-k", type=int, default=5, help="quantos itens mostrar")
+
+    relatorio = comandos.add_parser("report", aliases=["relatorio"], help="relatório de vendas")
+    exportar = comandos.add_parser("export", aliases=["exportar"], help="exporta o histórico")
+    for subcomando in (relatorio, exportar):
+        subcomando.add_argument("--from", dest="de", type=_data_argumento, help="data inicial (AAAA-MM-DD)")
+        subcomando.add_argument("--to", dest="ate", type=_data_argumento, help="data final (AAAA-MM-DD)")
+    exportar.add_argument("--format", dest="formato", choices=FORMATOS_EXPORTACAO, default="csv")
+    exportar.add_argument("--output", dest="saida", help="arquivo de saída (padrão: pedidos.<formato>)")
+    exportar.add_argument("--status", help="exporta só pedidos com este status")
+
+    args = parser.parse_args(argv)
+    if args.comando is None:
+        menu_principal(args.pedidos, args.cardapio)
+        return 0
+
+    sistema = SistemaPizzaria(args.pedidos, args.cardapio)
+    if args.comando in ("queue", "fila"):
+        sistema.visualizar_fila()
+    elif args.comando in ("deliver", "entregar"):
+        try:
+            pedido = sistema.entregar(args.numero)
+        except ValueError as erro:
+            print(f"⚠️ {erro}")
+            return 1
+        print(f"🍕 Pedido #{pedido.numero} de {pedido.cliente} foi entregue!")
+    elif args.comando in ("show", "mostrar"):
+        if not sistema.mostrar_pedido(args.numero):
+            return 1
+    elif args.comando in ("advance", "avancar"):
+        try:
+            item = sistema.avancar_item(args.numero, None if args.pizza is None else args.pizza - 1)
+        except ValueError as erro:
+            print(f"⚠️ {erro}")
+            return 1
+        print(f"✅ Pedido #{args.numero}: {item.sabor} ({item.tamanho}) agora está: {item.status}")
+    elif args.comando in ("trending", "em-alta"):
+        sistema.exibir_em_alta(args.k)
+    elif args.comando in ("report", "relatorio"):
+        data_inicio, data_fim = _periodo_argumentos(args)
+        resultado = sistema.gerar_relatorio(data_inicio, data_fim)
+        if resultado is None:
+            print("Nenhum pedido encontrado para o período!")
+            return 1
+        exibir_relatorio(f"de {data_inicio:%d/%m/%Y} até {data_fim:%d/%m/%Y}", resultado)
+    elif args.comando in ("export", "exportar"):
+        data_inicio, data_fim = _periodo_argumentos(args)
+        saida = args.saida or f"pedidos.{args.formato}"
+        try:
+            total = sistema.exportar_historico(saida, args.formato, data_inicio, data_fim, args.status)
+        except ImportError:
+            print("⚠️ Exportação em Parquet requer o pacote pyarrow.")
+            return 1
+        print(f"✅ {total} pedidos exportados para {saida}")
+    return 0
+
+
 if __name__ == "__main__":
-    menu_principal()
+    # Executa pelo módulo importado: assim os pickles gravados referenciam
+    # pizzaria.Pedido (e não __main__.Pedido) e podem ser lidos por outras ferramentas
+    from pizzaria import main
+    sys.exit(main())
 
@@ -1,7 +1,80 @@
 # models.py
-from django.db import models
+from django.conf import settings
+from django.core import checks
+from django.db import models, transaction
+from django.db.models import F, Q, Count, Sum, Min, Max
+from django.core.cache import cache
 from django.utils import timezone
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from operator import itemgetter
+import heapq
+import itertools
 import json
+import re
+import time
+import uuid
+import zlib
+
+# Tempo base de preparo (em minutos) por tamanho de pizza
+TEMPO_BASE_PREPARO = {
+    'Pequena': 15,
+    'Média': 20,
+    'Grande': 25,
+    'Família': 30
+}
+TEMPO_PADRAO_PREPARO = 20
+MINUTOS_POR_ADICIONAL = 2
+
+def calcular_tempo_preparo(tamanho, qtd_adicionais):
+    """Calcula o tempo estimado de preparo em minutos"""
+    tempo = TEMPO_BASE_PREPARO.get(tamanho, TEMPO_PADRAO_PREPARO)
+    return tempo + qtd_adicionais * MINUTOS_POR_ADICIONAL
+
+# Status em que o pedido ainda vai consumir ingredientes na cozinha
+STATUS_COZINHA = ['Pendente', 'Em preparo']
+
+# Etapas de cada pizza (item) do pedido na cozinha
+STATUS_ITEM = ['Pendente', 'Em preparo', 'Pronto']
+
+# Fornadas: pizzas idênticas pedidas dentro da janela vão juntas ao forno
+JANELA_LOTE_MINUTOS = 10
+CAPACIDADE_FORNO = 4
+MINUTOS_POR_PIZZA_EXTRA = 3  # montagem de cada pizza a mais na fornada
+
+# Consumo (em gramas) de cada ingrediente numa pizza Média
+CONSUMO_INGREDIENTES = {
+    'massa': 250,
+    'molho de tomate': 80,
+    'muçarela': 150,
+    'calabresa': 90,
+    'frango': 100,
+    'catupiry': 60,
+    'presunto': 80,
+    'ovos': 50,
+    'bacon': 70,
+    'provolone': 50,
+    'parmesão': 30,
+    'parmesão ralado': 20,
+    'gorgonzola': 40,
+    'borda recheada': 80,
+}
+CONSUMO_PADRAO = 50
+CONSUMO_ADICIONAL_PADRAO = 40
+FATOR_TAMANHO = {'Pequena': 0.6, 'Média': 1.0, 'Grande': 1.4, 'Família': 1.8}
+
+def normalizar_ingrediente(nome):
+    """Normaliza o nome de um ingrediente para busca (espaços e maiúsculas)"""
+    return ' '.join(nome.split()).casefold()
+
+def normalizar_telefone(telefone):
+    """Mantém só os dígitos do telefone, sem o código do país (55)"""
+    digitos = re.sub(r'\D', '', telefone or '')
+    if len(digitos) in (12, 13) and digitos.startswith('55'):
+        digitos = digitos[2:]
+    return digitos
 
 class Sabor(models.Model):
     nome = models.CharField(max_length=100)
@@ -27,6 +100,15 @@ class Sabor(models.Model):
         }
         return precos.get(tamanho, self.preco_media)
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        TabelaPrecos.invalidar()
+    
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        TabelaPrecos.invalidar()
+        return resultado
+    
     def __str__(self):
         return self.nome
     
@@ -38,12 +120,241 @@ class Adicional(models.Model):
     preco = models.DecimalField(max_digits=8, decimal_places=2)
     ativo = models.BooleanField(default=True)
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        TabelaPrecos.invalidar()
+    
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        TabelaPrecos.invalidar()
+        return resultado
+    
     def __str__(self):
         return f"{self.nome} - R$ {self.preco}"
     
     class Meta:
         verbose_name_plural = "Adicionais"
 
+class TabelaPrecos:
+    """Tabelas de preço e tempo memoizadas por versão do cardápio.
+    
+    A versão é um token guardado no cache do Django, trocado a cada
+    alteração de Sabor/Adicional, para que todos os processos descartem
+    suas tabelas locais; por isso o cache precisa ser compartilhado entre
+    os processos (ver verificar_cache_compartilhado). Atualizações em massa
+    (queryset.update) não passam por save() e precisam chamar
+    `TabelaPrecos.invalidar()` explicitamente.
+    
+    O token é consultado no máximo uma vez a cada VALIDADE_LOCAL segundos
+    por processo: uma alteração feita em outro processo leva até esse
+    tempo para chegar aqui, mas cada preço consultado não custa um
+    cache.get.
+    """
+    CHAVE_VERSAO = 'pizzaria:versao_cardapio'
+    VALIDADE_LOCAL = 1.0
+    
+    _versao = object()
+    _verificado_em = float('-inf')
+    _precos_sabor = {}
+    _precos_adicional = {}
+    _combinacoes = {}
+    _sabores_por_ingrediente = {}
+    _ingredientes_sabor = {}
+    _nomes_adicional = {}
+    _vetores = {}
+    
+    @classmethod
+    def invalidar(cls):
+        cache.set(cls.CHAVE_VERSAO, uuid.uuid4().hex, None)
+        cls._versao = object()
+        cls._verificado_em = float('-inf')
+    
+    @classmethod
+    def _atualizar(cls):
+        agora = time.monotonic()
+        if agora - cls._verificado_em < cls.VALIDADE_LOCAL:
+            return
+        versao = cache.get(cls.CHAVE_VERSAO)
+        if versao is None:
+            # Sem token (cache limpo ou expulso), todos os processos teriam a
+            # mesma versão None e nenhum veria as invalidações seguintes
+            cache.add(cls.CHAVE_VERSAO, uuid.uuid4().hex, None)
+            versao = cache.get(cls.CHAVE_VERSAO)
+        if versao == cls._versao:
+            cls._verificado_em = agora
+            return
+        # Inclui itens inativos: pedidos antigos ainda precisam ser precificados
+        sabores = list(Sabor.objects.all())
+        cls._precos_sabor = {
+            sabor.id: {
+                'Pequena': sabor.preco_pequena,
+                'Média': sabor.preco_media,
+                'Grande': sabor.preco_grande,
+                'Família': sabor.preco_familia,
+            }
+            for sabor in sabores
+        }
+        # Índice invertido ingrediente -> sabores (evita parsear o JSON a cada busca)
+        cls._sabores_por_ingrediente = {}
+        cls._ingredientes_sabor = {}
+        for sabor in sabores:
+            ingredientes = [normalizar_ingrediente(i) for i in sabor.get_ingredientes()]
+            cls._ingredientes_sabor[sabor.id] = ingredientes
+            for ingrediente in ingredientes:
+                cls._sabores_por_ingrediente.setdefault(ingrediente, set()).add(sabor.id)
+        cls._precos_adicional = {}
+        cls._nomes_adicional = {}
+        for adicional_id, nome, preco in Adicional.objects.values_list('id', 'nome', 'preco'):
+            cls._precos_adicional[adicional_id] = preco
+            cls._nomes_adicional[adicional_id] = normalizar_ingrediente(nome)
+        cls._combinacoes = {}
+        cls._vetores = {}
+        cls._versao = versao
+        cls._verificado_em = agora
+    
+    @classmethod
+    def aquecer(cls):
+        """Carrega as tabelas da versão atual"""
+        cls._atualizar()
+    
+    @classmethod
+    def vetor_sabor(cls, sabor_id, tamanho):
+        """Gramas de cada ingrediente (incluindo a massa) de uma pizza do sabor"""
+        cls._atualizar()
+        chave = ('sabor', sabor_id, tamanho)
+        vetor = cls._vetores.get(chave)
+        if vetor is None:
+            fator = FATOR_TAMANHO.get(tamanho, 1.0)
+            quantidades = {'massa': CONSUMO_INGREDIENTES['massa'] * fator}
+            for nome in cls._ingredientes_sabor.get(sabor_id, []):
+                quantidades[nome] = quantidades.get(nome, 0) + CONSUMO_INGREDIENTES.get(nome, CONSUMO_PADRAO) * fator
+            vetor = cls._vetores[chave] = tuple((nome, round(qtd)) for nome, qtd in quantidades.items())
+        return vetor
+    
+    @classmethod
+    def vetor_adicional(cls, adicional_id, tamanho):
+        """Gramas do ingrediente de um adicional ("Catupiry extra" -> catupiry)"""
+        cls._atualizar()
+        chave = ('adicional', adicional_id, tamanho)
+        vetor = cls._vetores.get(chave)
+        if vetor is None:
+            nome = cls._nomes_adicional.get(adicional_id, '')
+            if nome.endswith(' extra'):
+                nome = nome[:-len(' extra')]
+            gramas = CONSUMO_INGREDIENTES.get(nome, CONSUMO_ADICIONAL_PADRAO) * FATOR_TAMANHO.get(tamanho, 1.0)
+            vetor = cls._vetores[chave] = ((nome, round(gramas)),)
+        return vetor
+    
+    @classmethod
+    def sabores_com_ingrediente(cls, termo):
+        """IDs dos sabores com algum ingrediente que contém o termo"""
+        cls._atualizar()
+        termo = normalizar_ingrediente(termo)
+        ids = set()
+        for ingrediente, sabores in cls._sabores_por_ingrediente.items():
+            if termo in ingrediente:
+                ids |= sabores
+        return ids
+    
+    @classmethod
+    def consultar(cls, sabor_id, tamanho, adicionais_ids):
+        """Retorna (valor_total, tempo_preparo) da combinação"""
+        cls._atualizar()
+        chave = (sabor_id, tamanho, tuple(sorted(adicionais_ids)))
+        resultado = cls._combinacoes.get(chave)
+        if resultado is None:
+            precos = cls._precos_sabor[sabor_id]
+            valor_base = precos.get(tamanho, precos['Média'])
+            valor = valor_base + sum(cls._precos_adicional[a] for a in chave[2])
+            resultado = (valor, calcular_tempo_preparo(tamanho, len(chave[2])))
+            cls._combinacoes[chave] = resultado
+        return resultado
+
+# Backends em que cada processo tem o próprio cache (ou nenhum)
+CACHES_LOCAIS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+@checks.register(checks.Tags.caches)
+def verificar_cache_compartilhado(app_configs, **kwargs):
+    """Recusa um cache que não é compartilhado entre os processos.
+    
+    As versões da TabelaPrecos (e dos demais caches da pizzaria) são trocadas
+    no cache do Django; num cache local, a troca feita por um worker não
+    chega aos outros, que continuam precificando com o cardápio antigo.
+    Com DEBUG (runserver, um processo só) é apenas um aviso.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in CACHES_LOCAIS:
+        return []
+    mensagem = f"O cache padrão ({backend}) não é compartilhado entre os processos."
+    dica = (
+        "Configure CACHES['default'] com Redis, Memcached, banco de dados ou arquivo. "
+        "Com um único processo, silencie com SILENCED_SYSTEM_CHECKS = ['pizzaria.E001']."
+    )
+    if settings.DEBUG:
+        return [checks.Warning(mensagem, hint=dica, id='pizzaria.W001')]
+    return [checks.Error(mensagem, hint=dica, id='pizzaria.E001')]
+
+class PedidoQuerySet(models.QuerySet):
+    def do_cliente(self, telefone):
+        """Pedidos do cliente, do mais recente para o mais antigo (usa o índice por telefone)"""
+        return self.filter(
+            cliente_telefone_normalizado=normalizar_telefone(telefone)
+        ).order_by('-data_hora')
+    
+    def estatisticas_cliente(self, telefone):
+        """Totais do cliente ao longo de todos os pedidos, arquivados inclusive (None se não houver pedidos)"""
+        pedidos = self.do_cliente(telefone).exclude(status='Cancelado')
+        totais = pedidos.aggregate(
+            total_pedidos=Count('numero'),
+            total_gasto=Sum('valor_total'),
+            primeiro_pedido=Min('data_hora'),
+            ultimo_pedido=Max('data_hora'),
+        )
+        # Conta pizzas: um pedido com duas do mesmo sabor pesa dois
+        sabores = dict(ItemPedido.objects.filter(pedido__in=pedidos.order_by()).values_list(
+            'sabor__nome'
+        ).annotate(quantidade=Count('id')).order_by())
+        
+        # Pedidos já arquivados entram pelos resumos gravados com cada segmento
+        totais['total_gasto'] = totais['total_gasto'] or Decimal('0')
+        for resumo in ClienteArquivado.objects.filter(telefone_normalizado=normalizar_telefone(telefone)):
+            totais['total_pedidos'] += resumo.total_pedidos
+            totais['total_gasto'] += resumo.total_gasto
+            totais['primeiro_pedido'] = min(filter(None, [totais['primeiro_pedido'], resumo.primeiro_pedido]))
+            totais['ultimo_pedido'] = max(filter(None, [totais['ultimo_pedido'], resumo.ultimo_pedido]))
+            for nome, quantidade in resumo.get_sabores().items():
+                sabores[nome] = sabores.get(nome, 0) + quantidade
+        if not totais['total_pedidos']:
+            return None
+        
+        totais['ticket_medio'] = totais['total_gasto'] / totais['total_pedidos']
+        totais['sabor_favorito'] = max(sabores, key=sabores.get) if sabores else None
+        return totais
+    
+    def com_ingrediente(self, termo, desde=None, ate=None):
+        """Pedidos cujo sabor ou adicionais contêm o ingrediente.
+        
+        Os sabores vêm do índice em memória da TabelaPrecos e os adicionais
+        pelo nome, então o banco filtra por FK/M2M + data_hora indexados.
+        """
+        filtro = Q(sabor_id__in=TabelaPrecos.sabores_com_ingrediente(termo))
+        filtro |= Q(adicionais__nome__icontains=normalizar_ingrediente(termo))
+        pedidos = self.filter(filtro)
+        if desde is not None:
+            pedidos = pedidos.filter(data_hora__gte=desde)
+        if ate is not None:
+            pedidos = pedidos.filter(data_hora__lte=ate)
+        return pedidos.distinct()
+    
+    def alterar(self, **campos):
+        """update() que também troca a versão dos pedidos e da fila (ver FragmentosFila)"""
+        alterados = self.update(versao=F('versao') + 1, **campos)
+        transaction.on_commit(FragmentosFila.invalidar)
+        return alterados
+
 class Pedido(models.Model):
     TAMANHOS = [
         ('Pequena', 'Pequena'),
@@ -55,6 +366,7 @@ class Pedido(models.Model):
     STATUS_CHOICES = [
         ('Pendente', 'Pendente'),
         ('Em preparo', 'Em preparo'),
+        ('Pronto', 'Pronto'),
         ('Saiu para entrega', 'Saiu para entrega'),
         ('Entregue', 'Entregue'),
         ('Cancelado', 'Cancelado'),
@@ -63,113 +375,1061 @@ class Pedido(models.Model):
     numero = models.AutoField(primary_key=True)
     cliente_nome = models.CharField(max_length=200)
     cliente_telefone = models.CharField(max_length=20)
+    cliente_telefone_normalizado = models.CharField(max_length=20, blank=True, editable=False)
+    # sabor/tamanho/adicionais repetem a primeira pizza (buscas e telas antigas);
+    # todas as pizzas, com suas etapas na cozinha, ficam em `itens`
     sabor = models.ForeignKey(Sabor, on_delete=models.CASCADE)
     tamanho = models.CharField(max_length=20, choices=TAMANHOS, default='Média')
     adicionais = models.ManyToManyField(Adicional, blank=True)
     observacoes = models.TextField(blank=True)
-    data_hora = models.DateTimeField(default=timezone.now)
+    data_hora = models.DateTimeField(default=timezone.now, db_index=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pendente')
+    data_entrega = models.DateTimeField(null=True, blank=True, db_index=True)
     valor_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Incrementada a cada gravação; identifica a linha já renderizada na fila
+    versao = models.PositiveIntegerField(default=0, editable=False)
+    
+    objects = PedidoQuerySet.as_manager()
+    
+    def _adicionais_ids(self):
+        # Usa o cache de prefetch_related quando disponível
+        return [adicional.pk for adicional in self.adicionais.all()]
     
     def calcular_tempo_preparo(self):
-        """Calcula o tempo estimado de preparo em minutos"""
-        tempo_base = {
-            'Pequena': 15,
-            'Média': 20,
-            'Grande': 25,
-            'Família': 30
-        }
-        tempo = tempo_base.get(self.tamanho, 20)
-        tempo += self.adicionais.count() * 2
-        return tempo
+        """Calcula o tempo estimado de preparo em minutos.
+        
+        As pizzas vão ao forno em paralelo: o pedido fica pronto junto com a
+        mais demorada (usa o cache de prefetch_related('itens__adicionais')).
+        """
+        itens = self.itens.all()
+        if not itens:
+            return calcular_tempo_preparo(self.tamanho, len(self._adicionais_ids()))
+        return max(item.calcular_tempo_preparo() for item in itens)
     
     def calcular_valor_total(self):
-        """Calcula o valor total do pedido"""
-        valor_base = self.sabor.get_preco(self.tamanho)
-        valor_adicionais = sum(adicional.preco for adicional in self.adicionais.all())
-        self.valor_total = valor_base + valor_adicionais
+        """Calcula o valor total do pedido (soma das pizzas)"""
+        total = self.itens.aggregate(total=Sum('valor'))['total']
+        if total is None:
+            # Pedido sem itens (anterior às várias pizzas): o valor sai do próprio pedido
+            total, _ = TabelaPrecos.consultar(self.sabor_id, self.tamanho, self._adicionais_ids())
+        self.valor_total = total
         return self.valor_total
     
+    def criar_itens(self, pizzas):
+        """Cria as pizzas do pedido a partir de (sabor, tamanho, adicionais).
+        
+        A primeira também fica nos campos do próprio pedido; o valor total
+        passa a ser a soma das pizzas.
+        """
+        itens = []
+        for ordem, (sabor, tamanho, adicionais) in enumerate(pizzas, 1):
+            valor, _ = TabelaPrecos.consultar(sabor.pk, tamanho, [adicional.pk for adicional in adicionais])
+            itens.append(ItemPedido(pedido=self, ordem=ordem, sabor=sabor, tamanho=tamanho, valor=valor))
+        ItemPedido.objects.bulk_create(itens)
+        ItemPedido.adicionais.through.objects.bulk_create([
+            ItemPedido.adicionais.through(itempedido_id=item.pk, adicional_id=adicional_id)
+            for item, (_, _, adicionais) in zip(itens, pizzas)
+            for adicional_id in dict.fromkeys(adicional.pk for adicional in adicionais)
+        ])
+        
+        sabor, tamanho, adicionais = pizzas[0]
+        self.sabor, self.tamanho = sabor, tamanho
+        self.adicionais.set(adicionais)
+        self.valor_total = sum(item.valor for item in itens)
+        self.save()
+        return itens
+    
+    def sincronizar_primeira_pizza(self):
+        """Leva sabor/tamanho/adicionais editados no pedido para a primeira pizza"""
+        item = self.itens.filter(ordem=1).first()
+        if item is None:
+            return
+        item.sabor_id, item.tamanho = self.sabor_id, self.tamanho
+        item.adicionais.set(self._adicionais_ids())
+        item.calcular_valor()
+        item.save()
+    
+    def atualizar_status_cozinha(self):
+        """Deriva o status do pedido das etapas das pizzas enquanto ele está na cozinha"""
+        if self.status not in STATUS_ITEM:
+            return
+        etapas = set(self.itens.values_list('status', flat=True))
+        if not etapas:
+            return
+        self.status = etapas.pop() if len(etapas) == 1 else 'Em preparo'
+        # Grava mesmo sem mudar o status: a nova versão leva a etapa da pizza para a fila
+        self.save(update_fields=['status'])
+    
+    def itens_para_status(self, status):
+        """Pizzas que acompanham um status definido à mão (só 'Pendente' faz alguma voltar)"""
+        if status not in STATUS_ITEM:
+            return self.itens.none()
+        if status == 'Pendente':
+            return self.itens.exclude(status='Pendente')
+        return self.itens.filter(status__in=STATUS_ITEM[:STATUS_ITEM.index(status)])
+    
     def save(self, *args, **kwargs):
+        self.cliente_telefone_normalizado = normalizar_telefone(self.cliente_telefone)
+        entregando = self.status == 'Entregue' and self.data_entrega is None
+        if entregando:
+            self.data_entrega = timezone.now()
         if not self.valor_total:
-            super().save(*args, **kwargs)  # Salva primeiro para ter o ID
-            self.calcular_valor_total()
+            # Pedido novo ainda não tem adicionais: o valor sai do sabor e do tamanho
+            adicionais = [] if self._state.adding else self._adicionais_ids()
+            self.valor_total, _ = TabelaPrecos.consultar(self.sabor_id, self.tamanho, adicionais)
+        # Incremento no próprio UPDATE: gravações simultâneas não repetem a versão
+        adicionando = self._state.adding
+        if adicionando:
+            self.versao = 1
+        else:
+            self.versao = F('versao') + 1
+            if kwargs.get('update_fields') is not None:
+                extras = ['versao', 'data_entrega'] if entregando else ['versao']
+                kwargs['update_fields'] = [*kwargs['update_fields'], *extras]
         super().save(*args, **kwargs)
+        if not adicionando:
+            # O valor novo só existe no banco: o campo fica adiado e é lido se for usado
+            del self.__dict__['versao']
+        RespostasPedido.invalidar(self.numero)
+        transaction.on_commit(FragmentosFila.invalidar)
+        # Só conta nas métricas o que foi de fato gravado
+        if adicionando:
+            transaction.on_commit(lambda: MetricasCozinha.registrar_criacao(self))
+        if entregando:
+            transaction.on_commit(lambda: MetricasCozinha.registrar_entrega(self))
     
     def __str__(self):
         return f"Pedido #{self.numero} - {self.cliente_nome} - {self.sabor.nome}"
     
     class Meta:
         ordering = ['-data_hora']
+        indexes = [
+            models.Index(fields=['cliente_telefone_normalizado', '-data_hora'], name='pedido_cliente_idx'),
+        ]
+
+class ItemPedido(models.Model):
+    """Uma pizza do pedido.
+    
+    Cada item passa pela cozinha (Pendente -> Em preparo -> Pronto)
+    independente das outras pizzas; o status, o valor e o tempo do pedido
+    são derivados dos itens.
+    """
+    STATUS_CHOICES = [(status, status) for status in STATUS_ITEM]
+    
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='itens')
+    ordem = models.PositiveSmallIntegerField(default=1)
+    sabor = models.ForeignKey(Sabor, on_delete=models.CASCADE)
+    tamanho = models.CharField(max_length=20, choices=Pedido.TAMANHOS, default='Média')
+    adicionais = models.ManyToManyField(Adicional, blank=True, related_name='itens_pedido')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pendente', db_index=True)
+    valor = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
+    def _adicionais_ids(self):
+        # Usa o cache de prefetch_related quando disponível
+        return [adicional.pk for adicional in self.adicionais.all()]
+    
+    def calcular_tempo_preparo(self):
+        """Calcula o tempo estimado de preparo em minutos"""
+        return calcular_tempo_preparo(self.tamanho, len(self._adicionais_ids()))
+    
+    def calcular_valor(self):
+        """Calcula o valor da pizza"""
+        self.valor, _ = TabelaPrecos.consultar(self.sabor_id, self.tamanho, self._adicionais_ids())
+        return self.valor
+    
+    def avancar(self):
+        """Leva a pizza para a próxima etapa e atualiza o status do pedido"""
+        if self.status == 'Pronto':
+            raise ValueError(f'A pizza {self.ordem} do pedido #{self.pedido_id} já está pronta')
+        with transaction.atomic():
+            self.status = STATUS_ITEM[STATUS_ITEM.index(self.status) + 1]
+            self.save(update_fields=['status'])
+            self.pedido.atualizar_status_cozinha()
+    
+    @classmethod
+    def completar_pedidos_antigos(cls, tamanho_lote=5000):
+        """Cria a pizza única dos pedidos gravados antes dos itens; retorna quantos.
+        
+        Rode uma vez, numa migração de dados, depois de criar a tabela.
+        """
+        total = 0
+        while True:
+            with transaction.atomic():
+                lote = list(Pedido.objects.filter(itens__isnull=True).prefetch_related(
+                    'adicionais'
+                ).order_by('numero')[:tamanho_lote])
+                if not lote:
+                    return total
+                itens = cls.objects.bulk_create([
+                    cls(pedido=pedido, ordem=1, sabor_id=pedido.sabor_id, tamanho=pedido.tamanho,
+                        status=pedido.status if pedido.status in STATUS_COZINHA else 'Pronto',
+                        valor=pedido.valor_total)
+                    for pedido in lote
+                ])
+                cls.adicionais.through.objects.bulk_create([
+                    cls.adicionais.through(itempedido_id=item.pk, adicional_id=adicional_id)
+                    for item, pedido in zip(itens, lote)
+                    for adicional_id in pedido._adicionais_ids()
+                ])
+                Pedido.objects.filter(numero__in=[pedido.numero for pedido in lote]).alterar()
+                total += len(lote)
+    
+    def __str__(self):
+        return f"{self.sabor.nome} ({self.tamanho}) - {self.status}"
+    
+    class Meta:
+        ordering = ['pedido', 'ordem']
+        constraints = [
+            models.UniqueConstraint(fields=['pedido', 'ordem'], name='item_pedido_ordem_unica'),
+        ]
+
+class RespostasPedido:
+    """Cache das respostas prontas (dados da página e JSON) de pedidos finalizados.
+    
+    Pedido entregue ou cancelado não muda mais, então a resposta renderizada
+    fica no cache sem expiração, com uma ETag forte (hash do conteúdo), e é
+    servida sem consultar o banco. Só entra conteúdo igual para todos os
+    usuários: o que depende da requisição é montado fora do cache. A entrada guarda a versão do cardápio em
+    que foi gerada, porque a página mostra os ingredientes do sabor. Pedido.save
+    descarta as entradas do pedido; updates em massa precisam chamar
+    `RespostasPedido.invalidar(numero)`.
+    """
+    FORMATOS = ('html', 'json')
+    
+    @staticmethod
+    def chave(numero, formato):
+        return f'pizzaria:pedido:{numero}:{formato}'
+    
+    @classmethod
+    def consultar(cls, numero, formato):
+        """Retorna (entrada ou None, versão atual do cardápio)"""
+        chave = cls.chave(numero, formato)
+        valores = cache.get_many([chave, TabelaPrecos.CHAVE_VERSAO])
+        versao = valores.get(TabelaPrecos.CHAVE_VERSAO)
+        entrada = valores.get(chave)
+        if entrada is not None and entrada['versao_cardapio'] != versao:
+            entrada = None
+        return entrada, versao
+    
+    @classmethod
+    def guardar(cls, numero, formato, entrada):
+        cache.set(cls.chave(numero, formato), entrada, None)
+    
+    @classmethod
+    def invalidar(cls, numero):
+        cache.delete_many([cls.chave(numero, formato) for formato in cls.FORMATOS])
+
+class FragmentosFila:
+    """Linhas já renderizadas da fila (telas home e fila_pedidos).
+    
+    Cada linha fica no cache pelo número e pela versão do pedido, que
+    Pedido.save incrementa: só a linha do pedido alterado é renderizada de
+    novo. As linhas de cada tela ficam guardadas pela versão da fila, um
+    token trocado a cada pedido criado, alterado ou entregue, então um
+    refresh sem mudanças é uma leitura de cache, sem consultar o banco. As
+    chaves levam também a versão do cardápio (a linha mostra os sabores).
+    O token só vale entre processos com um cache compartilhado (ver
+    verificar_cache_compartilhado). Updates em massa devem usar
+    `Pedido.objects.filter(...).alterar()`.
+    """
+    CHAVE_VERSAO = 'pizzaria:versao_fila'
+    TEMPLATE_LINHA = 'pizzaria/linha_pedido.html'
+    # Linhas de versões antigas expiram sozinhas
+    VALIDADE = 24 * 60 * 60
+    
+    @classmethod
+    def invalidar(cls):
+        versao = uuid.uuid4().hex
+        cache.set(cls.CHAVE_VERSAO, versao, None)
+        return versao
+    
+    @classmethod
+    def versoes(cls):
+        """(versão da fila, versão do cardápio)"""
+        valores = cache.get_many([cls.CHAVE_VERSAO, TabelaPrecos.CHAVE_VERSAO])
+        versao_fila = valores.get(cls.CHAVE_VERSAO)
+        if versao_fila is None:
+            versao_fila = cls.invalidar()
+        return versao_fila, valores.get(TabelaPrecos.CHAVE_VERSAO)
+    
+    @staticmethod
+    def chave_tela(tela, versao_fila, versao_cardapio):
+        return f'pizzaria:fila:{tela}:{versao_fila}:{versao_cardapio}'
+    
+    @staticmethod
+    def chave_linha(numero, versao, versao_cardapio):
+        return f'pizzaria:fila:linha:{numero}:{versao}:{versao_cardapio}'
+
+def agrupar_lotes_forno(itens, janela_minutos=JANELA_LOTE_MINUTOS, capacidade=CAPACIDADE_FORNO):
+    """Agrupa as pizzas pendentes em fornadas de pizzas idênticas.
+    
+    Mesmas regras do CLI: mesmo sabor, tamanho e adicionais, pedidas até
+    `janela_minutos` depois da mais antiga da fornada e até a capacidade do
+    forno. As fornadas saem ordenadas pelo pedido mais antigo. Os itens
+    precisam de select_related('pedido') e prefetch_related('adicionais').
+    """
+    janela = timedelta(minutes=janela_minutos)
+    grupos = {}
+    for item in sorted(itens, key=lambda i: (i.pedido.data_hora, i.pedido_id, i.ordem)):
+        chave = (item.sabor_id, item.tamanho, tuple(sorted(item._adicionais_ids())))
+        grupos.setdefault(chave, []).append(item)
+    
+    lotes = []
+    for (sabor_id, tamanho, adicionais), grupo in grupos.items():
+        atual = []
+        for item in grupo + [None]:
+            if atual and (item is None or len(atual) >= capacidade
+                          or item.pedido.data_hora - atual[0].pedido.data_hora > janela):
+                lotes.append({
+                    'itens': atual,
+                    # Um pedido com duas pizzas iguais aparece uma vez só
+                    'pedidos': list({i.pedido_id: i.pedido for i in atual}.values()),
+                    'tempo_preparo': calcular_tempo_preparo(tamanho, len(adicionais))
+                                     + (len(atual) - 1) * MINUTOS_POR_PIZZA_EXTRA,
+                    'tempo_individual': calcular_tempo_preparo(tamanho, len(adicionais)) * len(atual),
+                })
+                atual = []
+            if item is not None:
+                atual.append(item)
+    return sorted(lotes, key=lambda lote: (lote['pedidos'][0].data_hora, lote['pedidos'][0].numero))
+
+HORAS_SEMANA = 7 * 24
+STATUS_FINAIS = ['Entregue', 'Cancelado']
+
+def hora_da_semana(momento):
+    """Índice 0..167 da hora dentro da semana (segunda 0h = 0)"""
+    return momento.weekday() * 24 + momento.hour
+
+class PrevisaoDemanda:
+    """Previsão de pedidos e minutos de forno por hora da semana.
+    
+    Os pedidos entregues são somados em 168 faixas (dia da semana x hora)
+    e os totais ficam no cache do Django. Os minutos de forno de um pedido
+    são o tempo de preparo dele, o da pizza mais demorada, como no CLI
+    (pedidos anteriores às várias pizzas usam o tamanho e os adicionais do
+    próprio pedido, como em Pedido.calcular_tempo_preparo). Cada consulta
+    lê só os pedidos entregues desde a última atualização: a marca d'água é
+    a data de entrega, então um pedido esquecido na fila não segura a
+    contagem dos que foram entregues depois. Ela fica MARGEM_ENTREGA atrás
+    do relógio para não pular entregas ainda em transações abertas.
+    """
+    # A chave antiga guardava a marca d'água pelo número do pedido
+    CHAVE = 'pizzaria:previsao_demanda:entregas'
+    MARGEM_ENTREGA = timedelta(minutes=1)
+    
+    @classmethod
+    def _estado_vazio(cls):
+        return {
+            'ate_entrega': None,
+            'pedidos': [0] * HORAS_SEMANA,
+            'minutos_forno': [0] * HORAS_SEMANA,
+            'inicio': None,
+            'fim': None,
+        }
+    
+    @classmethod
+    def atualizar(cls):
+        """Agrega os pedidos entregues desde a última atualização e retorna o estado"""
+        estado = cache.get(cls.CHAVE) or cls._estado_vazio()
+        
+        limite = timezone.now() - cls.MARGEM_ENTREGA
+        if estado['ate_entrega'] is None:
+            # Primeira agregação: inclui os pedidos antigos, entregues sem data de entrega
+            entregues = Pedido.objects.filter(Q(data_entrega__lte=limite) | Q(data_entrega__isnull=True),
+                                              status='Entregue')
+        else:
+            entregues = Pedido.objects.filter(status='Entregue', data_entrega__gt=estado['ate_entrega'],
+                                              data_entrega__lte=limite)
+        
+        # Uma linha por pedido e uma por pizza, as duas em ordem de número: o tempo do pedido
+        # é o da pizza mais demorada, ou o do próprio pedido se ele é anterior às várias pizzas
+        pedidos = entregues.order_by('numero').values('numero', 'data_hora', 'tamanho').annotate(
+            qtd_adicionais=Count('adicionais')
+        )
+        itens = ItemPedido.objects.filter(pedido__in=entregues).order_by('pedido_id').values(
+            'pedido_id', 'tamanho'
+        ).annotate(qtd_adicionais=Count('adicionais'))
+        grupos = itertools.groupby(itens.iterator(), key=itemgetter('pedido_id'))
+        grupo = next(grupos, None)
+        for pedido in pedidos.iterator():
+            while grupo is not None and grupo[0] < pedido['numero']:
+                grupo = next(grupos, None)
+            if grupo is not None and grupo[0] == pedido['numero']:
+                minutos = max(calcular_tempo_preparo(pizza['tamanho'], pizza['qtd_adicionais'])
+                              for pizza in grupo[1])
+                grupo = next(grupos, None)
+            else:
+                minutos = calcular_tempo_preparo(pedido['tamanho'], pedido['qtd_adicionais'])
+            data_hora = pedido['data_hora']
+            faixa = hora_da_semana(timezone.localtime(data_hora))
+            estado['pedidos'][faixa] += 1
+            estado['minutos_forno'][faixa] += minutos
+            if estado['inicio'] is None or data_hora < estado['inicio']:
+                estado['inicio'] = data_hora
+            if estado['fim'] is None or data_hora > estado['fim']:
+                estado['fim'] = data_hora
+        
+        estado['ate_entrega'] = limite
+        cache.set(cls.CHAVE, estado, None)
+        return estado
+    
+    @classmethod
+    def _ocorrencias(cls, estado):
+        """Quantas vezes cada hora da semana aparece no período observado"""
+        if estado['inicio'] is None:
+            return [0] * HORAS_SEMANA
+        inicio = timezone.localtime(estado['inicio']).replace(minute=0, second=0, microsecond=0)
+        total_horas = int((estado['fim'] - inicio).total_seconds() // 3600) + 1
+        ocorrencias = [total_horas // HORAS_SEMANA] * HORAS_SEMANA
+        primeira = hora_da_semana(inicio)
+        for deslocamento in range(total_horas % HORAS_SEMANA):
+            ocorrencias[(primeira + deslocamento) % HORAS_SEMANA] += 1
+        return ocorrencias
+    
+    @classmethod
+    def prever(cls, horas=12, a_partir=None):
+        """Retorna [(hora, pedidos esperados, minutos de forno esperados)] das próximas horas"""
+        estado = cls.atualizar()
+        ocorrencias = cls._ocorrencias(estado)
+        a_partir = timezone.localtime(a_partir).replace(minute=0, second=0, microsecond=0)
+        previsao = []
+        for deslocamento in range(horas):
+            hora = a_partir + timedelta(hours=deslocamento)
+            faixa = hora_da_semana(hora)
+            vezes = ocorrencias[faixa] or 1
+            previsao.append((hora, estado['pedidos'][faixa] / vezes, estado['minutos_forno'][faixa] / vezes))
+        return previsao
+
+# Janelas (em minutos) das métricas da cozinha
+JANELAS_METRICAS = (15, 60, 180)
+
+# Limites superiores (em minutos) dos buckets do histograma de espera
+LIMITES_ESPERA_MINUTOS = [5, 10, 15, 20, 25, 30, 40, 50, 60, 75, 90, 120, 180]
+
+class MetricasCozinha:
+    """Vazão, espera e atrasos da cozinha nas janelas deslizantes.
+    
+    Os eventos caem em baldes de um minuto no cache, com um contador por
+    campo (criados, entregues, segundos de espera, atrasados e o histograma
+    da espera). Pedido.save registra a criação e a entrega com cache.incr,
+    então o custo por mudança de status é constante. A soma dos minutos já
+    fechados de cada janela é calculada uma vez por minuto; o resumo soma a
+    ela o balde do minuto atual, sem consultar o banco. O p90 é o limite
+    superior do bucket do histograma, como no CLI. Atrasado é o pedido
+    entregue depois do tempo de preparo.
+    """
+    CAMPOS = ['criados', 'entregues', 'espera', 'atrasados'] + [
+        f'histograma_{indice}' for indice in range(len(LIMITES_ESPERA_MINUTOS) + 1)
+    ]
+    # Baldes vivem um pouco mais que a maior janela
+    VALIDADE = (max(JANELAS_METRICAS) + 10) * 60
+    
+    @staticmethod
+    def _minuto(momento):
+        return int(momento.timestamp() // 60)
+    
+    @staticmethod
+    def _chave(minuto, campo):
+        return f'pizzaria:metricas:{minuto}:{campo}'
+    
+    @classmethod
+    def _registrar(cls, momento, campos):
+        minuto = cls._minuto(momento)
+        for campo, valor in campos:
+            if not valor:
+                continue
+            chave = cls._chave(minuto, campo)
+            # add cria o contador; incr é atômico nos caches compartilhados
+            cache.add(chave, 0, cls.VALIDADE)
+            try:
+                cache.incr(chave, valor)
+            except ValueError:
+                cache.set(chave, valor, cls.VALIDADE)
+    
+    @classmethod
+    def registrar_criacao(cls, pedido):
+        cls._registrar(pedido.data_hora, [('criados', 1)])
+    
+    @classmethod
+    def registrar_entrega(cls, pedido):
+        espera = int((pedido.data_entrega - pedido.data_hora).total_seconds())
+        bucket = bisect_left(LIMITES_ESPERA_MINUTOS, espera / 60)
+        cls._registrar(pedido.data_entrega, [
+            ('entregues', 1),
+            ('espera', espera),
+            ('atrasados', int(espera > pedido.calcular_tempo_preparo() * 60)),
+            (f'histograma_{bucket}', 1),
+        ])
+    
+    @classmethod
+    def _somas_fechadas(cls, minuto):
+        """Totais de cada janela nos minutos anteriores a `minuto` (um cálculo por minuto)"""
+        chave = f'pizzaria:metricas:fechados:{minuto}'
+        somas = cache.get(chave)
+        if somas is None:
+            minutos = range(minuto - max(JANELAS_METRICAS) + 1, minuto)
+            valores = cache.get_many([cls._chave(m, campo) for m in minutos for campo in cls.CAMPOS])
+            somas = {
+                janela: [
+                    sum(valores.get(cls._chave(m, campo), 0) for m in range(minuto - janela + 1, minuto))
+                    for campo in cls.CAMPOS
+                ]
+                for janela in JANELAS_METRICAS
+            }
+            cache.set(chave, somas, 120)
+        return somas
+    
+    @staticmethod
+    def _p90(entregues, histograma):
+        acumulado = 0
+        for indice, contagem in enumerate(histograma):
+            acumulado += contagem
+            if acumulado >= entregues * 0.9:
+                return LIMITES_ESPERA_MINUTOS[indice] if indice < len(LIMITES_ESPERA_MINUTOS) else None
+        return None
+    
+    @classmethod
+    def resumo(cls, agora=None):
+        minuto = cls._minuto(agora or timezone.now())
+        somas = cls._somas_fechadas(minuto)
+        atual = cache.get_many([cls._chave(minuto, campo) for campo in cls.CAMPOS])
+        
+        resumo = {}
+        for janela in JANELAS_METRICAS:
+            totais = dict(zip(cls.CAMPOS, (
+                soma + atual.get(cls._chave(minuto, campo), 0)
+                for campo, soma in zip(cls.CAMPOS, somas[janela])
+            )))
+            entregues = totais['entregues']
+            histograma = [totais[campo] for campo in cls.CAMPOS[4:]]
+            resumo[janela] = {
+                'criados_por_hora': totais['criados'] * 60 / janela,
+                'entregues_por_hora': entregues * 60 / janela,
+                'espera_media': totais['espera'] / entregues / 60 if entregues else 0,
+                'espera_p90': cls._p90(entregues, histograma) if entregues else 0,
+                'atrasados': totais['atrasados'],
+                'percentual_atrasados': totais['atrasados'] / entregues * 100 if entregues else 0,
+            }
+        return resumo
+
+# "Em alta": meia-vida do decaimento e número de contadores de cada resumo
+MEIA_VIDA_TENDENCIAS_MINUTOS = 30
+CAPACIDADE_TENDENCIAS = 32
+
+class TendenciasPedidos:
+    """Sabores e adicionais em alta: top-K com decaimento exponencial (space-saving).
+    
+    Mesmo algoritmo do CLI: cada pedido pesa 2^(-idade / meia-vida), com os
+    pesos guardados em escala crescente a partir de uma referência, e cada
+    resumo mantém no máximo m = CAPACIDADE_TENDENCIAS contadores. Sendo N a
+    soma dos pesos decaídos, estimado - erro <= real <= estimado, com
+    erro <= N / m, e todo item acima de N / m aparece no resumo.
+    
+    O estado fica no cache do Django (compartilhado entre os processos, ver
+    verificar_cache_compartilhado), atualizado uma vez por pedido criado sob
+    um lock curto (cache.add) para que pedidos simultâneos não se
+    sobrescrevam. Sem o lock não há atualização: quem não o consegue em
+    ESPERA_LOCK segundos descarta o pedido, que só deixa de contar no painel.
+    """
+    CHAVE = 'pizzaria:tendencias'
+    CHAVE_LOCK = 'pizzaria:tendencias:lock'
+    # Segundos até o lock expirar sozinho (se o dono cair no meio da atualização)
+    VALIDADE_LOCK = 5
+    # Espera máxima pelo lock (a criação do pedido não fica presa ao painel)
+    ESPERA_LOCK = 0.1
+    RESUMOS = ('sabores', 'adicionais')
+    
+    @classmethod
+    def _estado_vazio(cls, referencia):
+        estado = {'referencia': referencia}
+        for resumo in cls.RESUMOS:
+            estado[resumo] = {'contadores': {}, 'total': 0.0}
+        return estado
+    
+    @staticmethod
+    def _peso(estado, momento):
+        segundos = (momento - estado['referencia']).total_seconds()
+        return 2.0 ** (segundos / (MEIA_VIDA_TENDENCIAS_MINUTOS * 60))
+    
+    @classmethod
+    def _reescalar(cls, estado, momento):
+        fator = 1 / cls._peso(estado, momento)
+        for resumo in cls.RESUMOS:
+            for contador in estado[resumo]['contadores'].values():
+                contador[0] *= fator
+                contador[1] *= fator
+            estado[resumo]['total'] *= fator
+        estado['referencia'] = momento
+    
+    @staticmethod
+    def _contar(resumo, item, peso):
+        resumo['total'] += peso
+        contadores = resumo['contadores']
+        if item in contadores:
+            contadores[item][0] += peso
+        elif len(contadores) < CAPACIDADE_TENDENCIAS:
+            contadores[item] = [peso, 0.0]
+        else:
+            menor = min(contadores, key=lambda nome: contadores[nome][0])
+            minimo = contadores.pop(menor)[0]
+            contadores[item] = [minimo + peso, minimo]
+    
+    @classmethod
+    @contextmanager
+    def _lock(cls):
+        prazo = time.monotonic() + cls.ESPERA_LOCK
+        espera = 0.005
+        while not cache.add(cls.CHAVE_LOCK, 1, cls.VALIDADE_LOCK):
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                raise TimeoutError('Lock das tendências ocupado')
+            time.sleep(min(espera, restante))
+            espera = min(espera * 2, 0.02)
+        adquirido = time.monotonic()
+        try:
+            yield
+        finally:
+            # Antes de expirar o lock só pode ser deste processo, então apagá-lo é seguro;
+            # depois, pode já ser de outro e fica para expirar sozinho
+            if time.monotonic() - adquirido < cls.VALIDADE_LOCK - 1:
+                cache.delete(cls.CHAVE_LOCK)
+    
+    @classmethod
+    def registrar(cls, pizzas, momento=None):
+        """Conta um pedido criado: (nome do sabor, nomes dos adicionais) de cada pizza.
+        
+        Retorna False se o lock não veio a tempo e o pedido ficou de fora.
+        """
+        momento = momento or timezone.now()
+        try:
+            with cls._lock():
+                estado = cache.get(cls.CHAVE) or cls._estado_vazio(momento)
+                peso = cls._peso(estado, momento)
+                if peso > 2.0 ** 64:
+                    cls._reescalar(estado, momento)
+                    peso = 1.0
+                for sabor, adicionais in pizzas:
+                    cls._contar(estado['sabores'], sabor, peso)
+                    for adicional in adicionais:
+                        cls._contar(estado['adicionais'], adicional, peso)
+                cache.set(cls.CHAVE, estado, None)
+        except TimeoutError:
+            return False
+        return True
+    
+    @classmethod
+    def top(cls, k=5, agora=None):
+        """Para cada resumo: itens (nome, estimado, erro) e o limite N / m do erro"""
+        estado = cache.get(cls.CHAVE)
+        if estado is None:
+            return {resumo: {'itens': [], 'erro_maximo': 0.0} for resumo in cls.RESUMOS}
+        escala = 1 / cls._peso(estado, agora or timezone.now())
+        resultado = {}
+        for resumo in cls.RESUMOS:
+            contadores = estado[resumo]['contadores']
+            maiores = heapq.nlargest(k, contadores.items(), key=lambda item: item[1][0])
+            resultado[resumo] = {
+                'itens': [
+                    {'nome': nome, 'estimado': contagem * escala, 'erro': erro * escala}
+                    for nome, (contagem, erro) in maiores
+                ],
+                'erro_maximo': estado[resumo]['total'] * escala / CAPACIDADE_TENDENCIAS,
+            }
+        return resultado
+
+# Pedidos finalizados há mais dias que isso podem ir para o arquivo
+DIAS_ARQUIVAMENTO = 90
+PEDIDOS_POR_SEGMENTO = 5000
+
+class _ListaArquivada(list):
+    """Lista com .all(), para os templates tratarem como um related manager"""
+    def all(self):
+        return self
+
+class _SaborArquivado:
+    def __init__(self, nome, ingredientes):
+        self.nome = nome
+        self._ingredientes = ingredientes
+    
+    def get_ingredientes(self):
+        return self._ingredientes
+    
+    def __str__(self):
+        return self.nome
+
+class _AdicionalArquivado:
+    def __init__(self, nome):
+        self.nome = nome
+    
+    def __str__(self):
+        return self.nome
+
+class _ItemArquivado:
+    def __init__(self, registro):
+        self.ordem = registro['ordem']
+        self.sabor = _SaborArquivado(registro['sabor'], registro['ingredientes'])
+        self.tamanho = registro['tamanho']
+        self.adicionais = _ListaArquivada(_AdicionalArquivado(nome) for nome in registro['adicionais'])
+        self.status = registro['status']
+        self.valor = Decimal(registro['valor'])
+    
+    def __str__(self):
+        return f"{self.sabor.nome} ({self.tamanho}) - {self.status}"
+
+class PedidoArquivado:
+    """Pedido lido de um segmento do arquivo (somente leitura).
+    
+    Expõe os mesmos atributos de Pedido usados nas views e templates.
+    """
+    def __init__(self, registro):
+        self.numero = registro['numero']
+        self.cliente_nome = registro['cliente_nome']
+        self.cliente_telefone = registro['cliente_telefone']
+        self.sabor = _SaborArquivado(registro['sabor'], registro['ingredientes'])
+        self.tamanho = registro['tamanho']
+        self.adicionais = _ListaArquivada(_AdicionalArquivado(nome) for nome in registro['adicionais'])
+        self.observacoes = registro['observacoes']
+        self.data_hora = datetime.fromisoformat(registro['data_hora'])
+        self.status = registro['status']
+        self.valor_total = Decimal(registro['valor_total'])
+        self.tempo_preparo = registro['tempo_preparo']
+        # Segmentos anteriores às várias pizzas: a única pizza é a do próprio pedido
+        itens = registro.get('itens') or [{
+            'ordem': 1, 'sabor': registro['sabor'], 'ingredientes': registro['ingredientes'],
+            'tamanho': registro['tamanho'], 'adicionais': registro['adicionais'],
+            'status': 'Pronto', 'valor': registro['valor_total'],
+        }]
+        self.itens = _ListaArquivada(_ItemArquivado(item) for item in itens)
+    
+    def calcular_tempo_preparo(self):
+        return self.tempo_preparo
+    
+    def __str__(self):
+        return f"Pedido #{self.numero} - {self.cliente_nome} - {self.sabor.nome}"
+
+class SegmentoArquivo(models.Model):
+    """Lote imutável de pedidos antigos, compactado (JSON + zlib).
+    
+    Os intervalos de número e de data são o índice do segmento: buscas e
+    relatórios só descompactam os segmentos que alcançam a consulta, e a
+    tabela Pedido fica apenas com os pedidos recentes.
+    """
+    numero_inicial = models.IntegerField(db_index=True)
+    numero_final = models.IntegerField(db_index=True)
+    data_inicial = models.DateTimeField(db_index=True)
+    data_final = models.DateTimeField(db_index=True)
+    quantidade = models.IntegerField()
+    dados = models.BinaryField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+    
+    def registros(self):
+        return json.loads(zlib.decompress(self.dados))
+    
+    def pedidos(self):
+        return [PedidoArquivado(registro) for registro in self.registros()]
+    
+    @classmethod
+    def no_periodo(cls, inicio, fim):
+        """Segmentos com algum pedido entre inicio e fim"""
+        return cls.objects.filter(data_inicial__lte=fim, data_final__gte=inicio)
+    
+    @classmethod
+    def buscar(cls, numero):
+        """Procura um pedido só nos segmentos cujo intervalo contém o número"""
+        segmentos = cls.objects.filter(numero_inicial__lte=numero, numero_final__gte=numero)
+        for segmento in segmentos:
+            for registro in segmento.registros():
+                if registro['numero'] == numero:
+                    return PedidoArquivado(registro)
+        return None
+    
+    @staticmethod
+    def _registro(pedido):
+        adicionais = list(pedido.adicionais.all())
+        return {
+            'numero': pedido.numero,
+            'cliente_nome': pedido.cliente_nome,
+            'cliente_telefone': pedido.cliente_telefone,
+            'sabor': pedido.sabor.nome,
+            'ingredientes': pedido.sabor.get_ingredientes(),
+            'tamanho': pedido.tamanho,
+            'adicionais': [adicional.nome for adicional in adicionais],
+            'observacoes': pedido.observacoes,
+            'data_hora': pedido.data_hora.isoformat(),
+            'status': pedido.status,
+            'valor_total': str(pedido.valor_total),
+            'tempo_preparo': pedido.calcular_tempo_preparo(),
+            'itens': [
+                {
+                    'ordem': item.ordem,
+                    'sabor': item.sabor.nome,
+                    'ingredientes': item.sabor.get_ingredientes(),
+                    'tamanho': item.tamanho,
+                    'adicionais': [adicional.nome for adicional in item.adicionais.all()],
+                    'status': item.status,
+                    'valor': str(item.valor),
+                }
+                for item in pedido.itens.all()
+            ],
+        }
+    
+    @classmethod
+    def arquivar(cls, antes_de, tamanho=PEDIDOS_POR_SEGMENTO):
+        """Move os pedidos finalizados anteriores a `antes_de` para segmentos; retorna quantos"""
+        total = 0
+        while True:
+            # Cada segmento é criado e seus pedidos removidos na mesma transação
+            with transaction.atomic():
+                lote = list(Pedido.objects.filter(
+                    data_hora__lt=antes_de, status__in=STATUS_FINAIS
+                ).select_related('sabor').prefetch_related(
+                    'adicionais', 'itens__sabor', 'itens__adicionais'
+                ).order_by('numero')[:tamanho])
+                if not lote:
+                    return total
+                registros = [cls._registro(pedido) for pedido in lote]
+                segmento = cls.objects.create(
+                    numero_inicial=lote[0].numero,
+                    numero_final=lote[-1].numero,
+                    data_inicial=min(pedido.data_hora for pedido in lote),
+                    data_final=max(pedido.data_hora for pedido in lote),
+                    quantidade=len(lote),
+                    dados=zlib.compress(json.dumps(registros, ensure_ascii=False).encode('utf-8'), 9),
+                )
+                ClienteArquivado.resumir(segmento, lote)
+                Pedido.objects.filter(numero__in=[pedido.numero for pedido in lote]).delete()
+                total += len(lote)
+    
+    class Meta:
+        ordering = ['numero_inicial']
+
+class ClienteArquivado(models.Model):
+    """Totais de um cliente dentro de um segmento do arquivo.
+    
+    O segmento só tem índice por número e data; o resumo, gravado junto com
+    ele, deixa as estatísticas do cliente sem descompactar o arquivo.
+    """
+    segmento = models.ForeignKey(SegmentoArquivo, on_delete=models.CASCADE, related_name='clientes')
+    telefone_normalizado = models.CharField(max_length=20, db_index=True)
+    total_pedidos = models.IntegerField()
+    total_gasto = models.DecimalField(max_digits=10, decimal_places=2)
+    primeiro_pedido = models.DateTimeField()
+    ultimo_pedido = models.DateTimeField()
+    sabores = models.TextField()  # JSON: pizzas por sabor
+    
+    def get_sabores(self):
+        return json.loads(self.sabores)
+    
+    @classmethod
+    def resumir(cls, segmento, pedidos):
+        """Cria os resumos por cliente dos pedidos não cancelados do segmento"""
+        resumos = {}
+        sabores = {}
+        for pedido in pedidos:
+            if pedido.status == 'Cancelado':
+                continue
+            telefone = pedido.cliente_telefone_normalizado
+            resumo = resumos.get(telefone)
+            if resumo is None:
+                resumo = resumos[telefone] = cls(
+                    segmento=segmento, telefone_normalizado=telefone, total_pedidos=0, total_gasto=0,
+                    primeiro_pedido=pedido.data_hora, ultimo_pedido=pedido.data_hora,
+                )
+                sabores[telefone] = {}
+            resumo.total_pedidos += 1
+            resumo.total_gasto += pedido.valor_total
+            resumo.primeiro_pedido = min(resumo.primeiro_pedido, pedido.data_hora)
+            resumo.ultimo_pedido = max(resumo.ultimo_pedido, pedido.data_hora)
+            # Pedidos anteriores às várias pizzas: a única pizza é a do próprio pedido
+            nomes = [item.sabor.nome for item in pedido.itens.all()] or [pedido.sabor.nome]
+            for nome in nomes:
+                sabores[telefone][nome] = sabores[telefone].get(nome, 0) + 1
+        for telefone, resumo in resumos.items():
+            resumo.sabores = json.dumps(sabores[telefone], ensure_ascii=False)
+        cls.objects.bulk_create(resumos.values())
 
 # views.py
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.shortcuts import render, redirect
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse, Http404
 from django.contrib import messages
-from django.db.models import Q, Sum, Count
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum, Count, Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.safestring import mark_safe
 from datetime import timedelta
-from .models import Pedido, Sabor, Adicional
+from .models import (
+    Pedido, ItemPedido, Sabor, Adicional, SegmentoArquivo, TabelaPrecos, PrevisaoDemanda, RespostasPedido,
+    FragmentosFila, MetricasCozinha, TendenciasPedidos, STATUS_COZINHA, STATUS_FINAIS, STATUS_ITEM,
+    CAPACIDADE_TENDENCIAS, agrupar_lotes_forno,
+)
+from .middleware import coletor_metricas
+from .routers import banco_relatorios, leitura_relatorios, atualizacao_copia_relatorios
+from decimal import Decimal
+import csv
+import hashlib
 import json
 
+# Endereços que podem consultar o endpoint de métricas
+IPS_METRICAS = {'127.0.0.1', '::1'}
+
+def itens_na_cozinha():
+    """Pizzas que ainda vão consumir ingredientes: não prontas, de pedidos ainda na cozinha"""
+    return ItemPedido.objects.filter(status__in=STATUS_COZINHA, pedido__status__in=STATUS_COZINHA)
+
+def demanda_ingredientes():
+    """Gramas de cada ingrediente necessários para as pizzas ainda na cozinha.
+    
+    Agrupa as pizzas ativas por (sabor, tamanho) e (adicional, tamanho) no
+    banco e multiplica pelos vetores pré-compilados da TabelaPrecos: são
+    duas queries, independentemente do tamanho da fila. Uma pizza pronta
+    deixa de contar mesmo que o resto do pedido não esteja.
+    """
+    demanda = {}
+    combinacoes = itens_na_cozinha().order_by().values(
+        'sabor_id', 'tamanho'
+    ).annotate(quantidade=Count('id'))
+    for linha in combinacoes:
+        for ingrediente, gramas in TabelaPrecos.vetor_sabor(linha['sabor_id'], linha['tamanho']):
+            demanda[ingrediente] = demanda.get(ingrediente, 0) + gramas * linha['quantidade']
+    
+    adicionais = ItemPedido.adicionais.through.objects.filter(
+        itempedido__in=itens_na_cozinha()
+    ).values('adicional_id', 'itempedido__tamanho').annotate(quantidade=Count('id'))
+    for linha in adicionais:
+        for ingrediente, gramas in TabelaPrecos.vetor_adicional(linha['adicional_id'], linha['itempedido__tamanho']):
+            demanda[ingrediente] = demanda.get(ingrediente, 0) + gramas * linha['quantidade']
+    
+    return sorted(demanda.items(), key=lambda x: x[1], reverse=True)
+
+def _prefetch_itens():
+    """Pizzas do pedido com sabor e adicionais, em duas queries para a lista inteira"""
+    return Prefetch('itens', queryset=ItemPedido.objects.select_related('sabor').prefetch_related('adicionais'))
+
+def _itens_json(pedido):
+    """Pizzas do pedido para as APIs (requer _prefetch_itens())"""
+    return [
+        {
+            'id': getattr(item, 'id', None),
+            'ordem': item.ordem,
+            'sabor': item.sabor.nome,
+            'tamanho': item.tamanho,
+            'adicionais': [adicional.nome for adicional in item.adicionais.all()],
+            'status': item.status,
+            'valor': str(item.valor),
+        }
+        for item in pedido.itens.all()
+    ]
+
+def _linhas_fila(tela, status):
+    """HTML de cada pedido da fila com esses status, por ordem de chegada.
+    
+    Sem mudanças desde o último refresh a lista sai inteira do cache (ver
+    FragmentosFila); senão os pedidos vêm numa query e só os com versão nova
+    têm pizzas e adicionais carregados e a linha renderizada. A linha é
+    compartilhada entre usuários, então o template é renderizado sem
+    request (sem csrf_token).
+    """
+    versao_fila, versao_cardapio = FragmentosFila.versoes()
+    chave_tela = FragmentosFila.chave_tela(tela, versao_fila, versao_cardapio)
+    linhas = cache.get(chave_tela)
+    if linhas is None:
+        pedidos = list(Pedido.objects.filter(status__in=status).select_related('sabor').order_by('data_hora'))
+        chaves = [FragmentosFila.chave_linha(p.numero, p.versao, versao_cardapio) for p in pedidos]
+        guardadas = cache.get_many(chaves)
+        faltando = [(pedido, chave) for pedido, chave in zip(pedidos, chaves) if chave not in guardadas]
+        if faltando:
+            prefetch_related_objects([pedido for pedido, _ in faltando], 'adicionais', _prefetch_itens())
+            novas = {
+                chave: render_to_string(FragmentosFila.TEMPLATE_LINHA, {'pedido': pedido})
+                for pedido, chave in faltando
+            }
+            cache.set_many(novas, FragmentosFila.VALIDADE)
+            guardadas.update(novas)
+        linhas = [guardadas[chave] for chave in chaves]
+        cache.set(chave_tela, linhas, FragmentosFila.VALIDADE)
+    return [mark_safe(linha) for linha in linhas]
+
 def home(request):
     """Página inicial com dashboard"""
-    pedidos_pendentes = Pedido.objects.filter(status__in=['Pendente', 'Em preparo']).order_by('data_hora')
+    linhas_fila = _linhas_fila('home', ['Pendente', 'Em preparo', 'Pronto'])
     pedidos_hoje = Pedido.objects.filter(data_hora__date=timezone.now().date())
     
     # Estatísticas
     total_pedidos_hoje = pedidos_hoje.count()
     faturamento_hoje = pedidos_hoje.aggregate(Sum('valor_total'))['valor_total__sum'] or 0
-    pedidos_fila = pedidos_pendentes.count()
+    pedidos_fila = len(linhas_fila)
     
     context = {
-        'pedidos_pendentes': pedidos_pendentes,
+        'linhas_fila': linhas_fila,
         'total_pedidos_hoje': total_pedidos_hoje,
         'faturamento_hoje': faturamento_hoje,
         'pedidos_fila': pedidos_fila,
+        'demanda_ingredientes': demanda_ingredientes(),
+        'metricas_cozinha': MetricasCozinha.resumo(),
+        'em_alta': TendenciasPedidos.top(),
     }
     
     return render(request, 'pizzaria/home.html', context)
 
 def novo_pedido(request):
-    """Página para criar novo pedido"""
+    """Página para criar novo pedido.
+    
+    Cada pizza envia um `sabor` e um `tamanho` (os campos se repetem, na
+    ordem das pizzas); os adicionais da primeira vêm em `adicionais` e os
+    da n-ésima em `adicionais_<n>`.
+    """
     if request.method == 'POST':
         try:
             # Dados do cliente
             cliente_nome = request.POST.get('cliente_nome')
             cliente_telefone = request.POST.get('cliente_telefone')
             
-            # Dados da pizza
-            sabor_id = request.POST.get('sabor')
-            tamanho = request.POST.get('tamanho')
+            # Dados das pizzas
+            sabores_ids = request.POST.getlist('sabor')
+            tamanhos = request.POST.getlist('tamanho')
             observacoes = request.POST.get('observacoes', '')
             
-            # Adicionais (podem ser múltiplos)
-            adicionais_ids = request.POST.getlist('adicionais')
+            # Adicionais (podem ser múltiplos em cada pizza)
+            adicionais_ids = [
+                request.POST.getlist('adicionais' if n == 1 else f'adicionais_{n}')
+                for n in range(1, len(sabores_ids) + 1)
+            ]
             
             # Validações
-            if not all([cliente_nome, cliente_telefone, sabor_id, tamanho]):
+            if (not sabores_ids or len(tamanhos) != len(sabores_ids)
+                    or not all([cliente_nome, cliente_telefone, *sabores_ids, *tamanhos])):
                 messages.error(request, 'Todos os campos obrigatórios devem ser preenchidos!')
                 return redirect('novo_pedido')
             
-            # Cria o pedido
-            sabor = get_object_or_404(Sabor, id=sabor_id, ativo=True)
-            pedido = Pedido.objects.create(
-                cliente_nome=cliente_nome,
-                cliente_telefone=cliente_telefone,
-                sabor=sabor,
-                tamanho=tamanho,
-                observacoes=observacoes
-            )
+            sabores = {str(sabor.id): sabor for sabor in Sabor.objects.filter(id__in=sabores_ids, ativo=True)}
+            if len(sabores) < len(set(sabores_ids)):
+                raise Http404('Sabor não encontrado')
+            adicionais = {
+                str(adicional.id): adicional
+                for adicional in Adicional.objects.filter(id__in=[i for ids in adicionais_ids for i in ids], ativo=True)
+            }
+            pizzas = [
+                (sabores[sabor_id], tamanho, [adicionais[i] for i in ids if i in adicionais])
+                for sabor_id, tamanho, ids in zip(sabores_ids, tamanhos, adicionais_ids)
+            ]
             
-            # Adiciona os adicionais
-            if adicionais_ids:
-                adicionais = Adicional.objects.filter(id__in=adicionais_ids, ativo=True)
-                pedido.adicionais.set(adicionais)
-            
-            # Calcula o valor total
-            pedido.calcular_valor_total()
-            pedido.save()
+            # Cria o pedido com as pizzas (o valor total é a soma delas)
+            with transaction.atomic():
+                pedido = Pedido.objects.create(
+                    cliente_nome=cliente_nome,
+                    cliente_telefone=cliente_telefone,
+                    sabor=pizzas[0][0],
+                    tamanho=pizzas[0][1],
+                    observacoes=observacoes
+                )
+                pedido.criar_itens(pizzas)
+                # Depois do commit e de uma vez por pedido; com o lock ocupado, só o painel fica sem ele
+                tendencias = [(sabor.nome, [adicional.nome for adicional in adicionais_pizza])
+                              for sabor, _, adicionais_pizza in pizzas]
+                transaction.on_commit(lambda: TendenciasPedidos.registrar(tendencias, pedido.data_hora))
             
             messages.success(request, f'Pedido #{pedido.numero} criado com sucesso! Valor: R$ {pedido.valor_total:.2f}')
             return redirect('home')
@@ -187,28 +1447,38 @@ def novo_pedido(request):
         'tamanhos': Pedido.TAMANHOS,
     }
     
+    # Repetição de pedido: ?repetir=<numero> pré-preenche o formulário
+    if request.GET.get('repetir'):
+        context['pedido_base'] = Pedido.objects.select_related('sabor').prefetch_related(
+            'adicionais', _prefetch_itens()
+        ).filter(numero=request.GET.get('repetir')).first()
+    
     return render(request, 'pizzaria/novo_pedido.html', context)
 
 def fila_pedidos(request):
     """Visualiza a fila de pedidos"""
-    pedidos = Pedido.objects.filter(status__in=['Pendente', 'Em preparo', 'Saiu para entrega']).order_by('data_hora')
-    
     context = {
-        'pedidos': pedidos,
+        'linhas_fila': _linhas_fila('fila', ['Pendente', 'Em preparo', 'Pronto', 'Saiu para entrega']),
     }
     
     return render(request, 'pizzaria/fila_pedidos.html', context)
 
-def atualizar_status_pedido(request, pedido_id):
+# As APIs consultadas em polling (tablets da cozinha, caixas) são views
+# assíncronas: sob ASGI, uma requisição esperando o banco não prende um worker.
+
+async def atualizar_status_pedido(request, pedido_id):
     """Atualiza o status de um pedido via AJAX"""
     if request.method == 'POST':
         try:
-            pedido = get_object_or_404(Pedido, numero=pedido_id)
+            pedido = await Pedido.objects.aget(numero=pedido_id)
             novo_status = request.POST.get('status')
             
             if novo_status in dict(Pedido.STATUS_CHOICES):
+                # Status definido à mão vale também para as pizzas (antes de gravar
+                # o pedido, que troca a versão da linha na fila)
+                await pedido.itens_para_status(novo_status).aupdate(status=novo_status)
                 pedido.status = novo_status
-                pedido.save()
+                await pedido.asave()
                 
                 return JsonResponse({
                     'success': True,
@@ -218,27 +1488,49 @@ def atualizar_status_pedido(request, pedido_id):
             else:
                 return JsonResponse({'success': False, 'message': 'Status inválido'})
                 
+        except Pedido.DoesNotExist:
+            return JsonResponse({'success': False, 'message': 'Pedido não encontrado'})
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
     
     return JsonResponse({'success': False, 'message': 'Método não permitido'})
 
-def buscar_pedidos(request):
+def avancar_item(request, item_id):
+    """API: leva uma pizza para a próxima etapa da cozinha (o status do pedido acompanha)"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Método não permitido'})
+    try:
+        item = ItemPedido.objects.select_related('pedido').get(id=item_id)
+        item.avancar()
+    except ItemPedido.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Pizza não encontrada'})
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+    
+    return JsonResponse({
+        'success': True,
+        'message': f'Pizza {item.ordem} do pedido #{item.pedido_id}: {item.status}',
+        'status_item': item.status,
+        'status_pedido': item.pedido.status,
+    })
+
+async def buscar_pedidos(request):
     """API para buscar pedidos"""
     termo = request.GET.get('q', '')
+    base = Pedido.objects.select_related('sabor').prefetch_related('adicionais', _prefetch_itens())
     
     if termo:
-        pedidos = Pedido.objects.filter(
+        pedidos = base.filter(
             Q(numero__icontains=termo) |
             Q(cliente_nome__icontains=termo) |
             Q(cliente_telefone__icontains=termo) |
             Q(sabor__nome__icontains=termo)
         ).order_by('-data_hora')[:20]
     else:
-        pedidos = Pedido.objects.all().order_by('-data_hora')[:20]
+        pedidos = base.order_by('-data_hora')[:20]
     
     pedidos_data = []
-    for pedido in pedidos:
+    async for pedido in pedidos:
         adicionais = [adicional.nome for adicional in pedido.adicionais.all()]
         
         pedidos_data.append({
@@ -248,6 +1540,7 @@ def buscar_pedidos(request):
             'sabor': pedido.sabor.nome,
             'tamanho': pedido.tamanho,
             'adicionais': adicionais,
+            'itens': _itens_json(pedido),
             'valor_total': str(pedido.valor_total),
             'status': pedido.status,
             'data_hora': pedido.data_hora.strftime('%d/%m/%Y %H:%M'),
@@ -259,17 +1552,216 @@ def buscar_pedidos(request):
         'total': len(pedidos_data)
     })
 
+def historico_cliente(request, telefone):
+    """API com estatísticas e últimos pedidos de um cliente (para repetir pedido)"""
+    estatisticas = Pedido.objects.estatisticas_cliente(telefone)
+    if estatisticas is None:
+        return JsonResponse({'success': False, 'message': 'Cliente sem pedidos'})
+    
+    ultimos = Pedido.objects.do_cliente(telefone).select_related('sabor').prefetch_related(
+        'adicionais', _prefetch_itens()
+    )[:5]
+    return JsonResponse({
+        'success': True,
+        'estatisticas': {
+            'total_pedidos': estatisticas['total_pedidos'],
+            'total_gasto': str(estatisticas['total_gasto']),
+            'ticket_medio': str(round(estatisticas['ticket_medio'], 2)),
+            'primeiro_pedido': estatisticas['primeiro_pedido'].strftime('%d/%m/%Y'),
+            'ultimo_pedido': estatisticas['ultimo_pedido'].strftime('%d/%m/%Y %H:%M'),
+            'sabor_favorito': estatisticas['sabor_favorito'],
+        },
+        'ultimos_pedidos': [
+            {
+                'numero': pedido.numero,
+                'cliente': pedido.cliente_nome,
+                'sabor_id': pedido.sabor_id,
+                'sabor': pedido.sabor.nome,
+                'tamanho': pedido.tamanho,
+                'adicionais_ids': pedido._adicionais_ids(),
+                'itens': [
+                    {'sabor_id': item.sabor_id, 'tamanho': item.tamanho, 'adicionais_ids': item._adicionais_ids()}
+                    for item in pedido.itens.all()
+                ],
+                'valor_total': str(pedido.valor_total),
+                'data_hora': pedido.data_hora.strftime('%d/%m/%Y %H:%M'),
+            }
+            for pedido in ultimos
+        ],
+    })
+
+def pedidos_por_ingrediente(request):
+    """API: pedidos das últimas `horas` (padrão 48) que usaram um ingrediente"""
+    termo = request.GET.get('q', '').strip()
+    if not termo:
+        return JsonResponse({'success': False, 'message': 'Informe o ingrediente (q)'})
+    try:
+        horas = int(request.GET.get('horas', 48))
+    except ValueError:
+        horas = 48
+    
+    desde = timezone.now() - timedelta(hours=horas)
+    pedidos = Pedido.objects.com_ingrediente(termo, desde).select_related('sabor').prefetch_related(
+        'adicionais'
+    ).order_by('-data_hora')
+    
+    return JsonResponse({
+        'success': True,
+        'pedidos': [
+            {
+                'numero': pedido.numero,
+                'cliente': pedido.cliente_nome,
+                'telefone': pedido.cliente_telefone,
+                'sabor': pedido.sabor.nome,
+                'tamanho': pedido.tamanho,
+                'adicionais': [adicional.nome for adicional in pedido.adicionais.all()],
+                'status': pedido.status,
+                'data_hora': pedido.data_hora.strftime('%d/%m/%Y %H:%M'),
+            }
+            for pedido in pedidos
+        ],
+    })
+
+def lotes_forno(request):
+    """API: próximas fornadas, agrupando pizzas idênticas ainda não iniciadas"""
+    pendentes = itens_na_cozinha().filter(status='Pendente').select_related(
+        'sabor', 'pedido'
+    ).prefetch_related('adicionais')
+    
+    return JsonResponse({
+        'success': True,
+        'lotes': [
+            {
+                'sabor': lote['itens'][0].sabor.nome,
+                'tamanho': lote['itens'][0].tamanho,
+                'adicionais': [adicional.nome for adicional in lote['itens'][0].adicionais.all()],
+                'pizzas': len(lote['itens']),
+                'pedidos': [pedido.numero for pedido in lote['pedidos']],
+                'tempo_preparo': lote['tempo_preparo'],
+                'economia_minutos': lote['tempo_individual'] - lote['tempo_preparo'],
+            }
+            for lote in agrupar_lotes_forno(pendentes)
+        ],
+    })
+
+def previsao_demanda(request):
+    """API: pedidos e minutos de forno esperados nas próximas `horas` (padrão 12)"""
+    try:
+        horas = min(int(request.GET.get('horas', 12)), 7 * 24)
+    except ValueError:
+        horas = 12
+    
+    return JsonResponse({
+        'success': True,
+        'previsao': [
+            {
+                'hora': hora.strftime('%d/%m/%Y %H:%M'),
+                'pedidos': round(pedidos, 1),
+                'minutos_forno': round(minutos),
+            }
+            for hora, pedidos, minutos in PrevisaoDemanda.prever(horas)
+        ],
+    })
+
+def _carregar_pedido(pedido_id):
+    try:
+        return Pedido.objects.select_related('sabor').prefetch_related(
+            'adicionais', _prefetch_itens()
+        ).get(numero=pedido_id)
+    except Pedido.DoesNotExist:
+        # Pedidos antigos ficam nos segmentos do arquivo
+        pedido = SegmentoArquivo.buscar(pedido_id)
+        if pedido is None:
+            raise Http404('Pedido não encontrado')
+        return pedido
+
+def _responder_pedido(request, pedido_id, formato, gerar, montar=None):
+    """Serve a resposta do pedido com ETag; finalizados saem do cache sem ir ao banco.
+    
+    `gerar(pedido)` monta a HttpResponse quando não há entrada no cache; ela
+    é a mesma para todos os usuários, então não pode usar o request.
+    `montar(request, response)`, se informado, envolve esse conteúdo com as
+    partes de cada requisição (csrf_token, mensagens, usuário). A página
+    final muda a cada requisição, então a ETag dela é fraca, calculada
+    sobre o conteúdo.
+    """
+    entrada, versao = RespostasPedido.consultar(pedido_id, formato)
+    if entrada is None:
+        pedido = _carregar_pedido(pedido_id)
+        response = gerar(pedido)
+        entrada = {
+            'conteudo': response.content,
+            'content_type': response['Content-Type'],
+            'etag': '"%s"' % hashlib.sha256(response.content).hexdigest()[:32],
+            'versao_cardapio': versao,
+        }
+        if pedido.status in STATUS_FINAIS:
+            RespostasPedido.guardar(pedido_id, formato, entrada)
+    else:
+        response = HttpResponse(entrada['conteudo'], content_type=entrada['content_type'])
+    etag = entrada['etag'] if montar is None else 'W/' + entrada['etag']
+    response['ETag'] = etag
+    resultado = get_conditional_response(request, etag=etag, response=response)
+    if resultado is not response or montar is None:
+        return resultado
+    # Só monta a página (e consome as mensagens) quando ela vai de fato ao cliente
+    pagina = montar(request, response)
+    pagina['ETag'] = etag
+    return pagina
+
+def em_alta(request):
+    """API: sabores e adicionais em alta (contagens com decaimento e erro máximo)"""
+    try:
+        k = min(int(request.GET.get('k', 5)), CAPACIDADE_TENDENCIAS)
+    except ValueError:
+        k = 5
+    return JsonResponse(TendenciasPedidos.top(k))
+
 def detalhes_pedido(request, pedido_id):
-    """Exibe detalhes de um pedido específico"""
-    pedido = get_object_or_404(Pedido, numero=pedido_id)
+    """Exibe detalhes de um pedido específico.
     
-    context = {
-        'pedido': pedido,
-        'tempo_preparo': pedido.calcular_tempo_preparo(),
-        'ingredientes': pedido.sabor.get_ingredientes(),
-    }
+    Os dados do pedido são renderizados sem request e podem ir para o cache
+    (ver RespostasPedido); csrf_token, mensagens e usuário entram só na
+    página que os envolve, montada a cada requisição.
+    """
+    def gerar(pedido):
+        context = {
+            'pedido': pedido,
+            'tempo_preparo': pedido.calcular_tempo_preparo(),
+            'ingredientes': pedido.sabor.get_ingredientes(),
+            'arquivado': not isinstance(pedido, Pedido),
+        }
+        return HttpResponse(render_to_string('pizzaria/detalhes_pedido_conteudo.html', context))
     
-    return render(request, 'pizzaria/detalhes_pedido.html', context)
+    def montar(request, conteudo):
+        return render(request, 'pizzaria/detalhes_pedido.html', {
+            'pedido_id': pedido_id,
+            'conteudo': mark_safe(conteudo.content.decode(conteudo.charset)),
+        })
+    
+    return _responder_pedido(request, pedido_id, 'html', gerar, montar)
+
+def detalhes_pedido_json(request, pedido_id):
+    """API: detalhes de um pedido em JSON"""
+    def gerar(pedido):
+        return JsonResponse({
+            'numero': pedido.numero,
+            'cliente': pedido.cliente_nome,
+            'telefone': pedido.cliente_telefone,
+            'sabor': pedido.sabor.nome,
+            'tamanho': pedido.tamanho,
+            'adicionais': [adicional.nome for adicional in pedido.adicionais.all()],
+            'itens': _itens_json(pedido),
+            'observacoes': pedido.observacoes,
+            'status': pedido.status,
+            'data_hora': pedido.data_hora.isoformat(),
+            'valor_total': str(pedido.valor_total),
+            'tempo_preparo': pedido.calcular_tempo_preparo(),
+            'ingredientes': pedido.sabor.get_ingredientes(),
+            'arquivado': not isinstance(pedido, Pedido),
+        })
+    
+    return _responder_pedido(request, pedido_id, 'json', gerar)
 
 def cardapio(request):
     """Gerencia o cardápio"""
@@ -283,8 +1775,8 @@ def cardapio(request):
     
     return render(request, 'pizzaria/cardapio.html', context)
 
-def relatorio_vendas(request):
-    """Gera relatório de vendas"""
+def _periodo_relatorio(request):
+    """Lê data_inicio/data_fim da query string (padrão: últimos 7 dias)"""
     # Período padrão: últimos 7 dias
     data_fim = timezone.now()
     data_inicio = data_fim - timedelta(days=7)
@@ -304,6 +1796,47 @@ def relatorio_vendas(request):
         except:
             pass
     
+    return data_inicio, data_fim
+
+def _agregados_arquivo(data_inicio, data_fim):
+    """Totais dos pedidos entregues arquivados no período (None se nenhum segmento alcança o período)"""
+    segmentos = SegmentoArquivo.no_periodo(data_inicio, data_fim)
+    if not segmentos.exists():
+        return None
+    
+    agregados = {'total': 0, 'faturamento': Decimal('0'), 'sabores': {}, 'tamanhos': {}, 'adicionais': {}}
+    for segmento in segmentos.iterator():
+        for pedido in segmento.pedidos():
+            if pedido.status != 'Entregue' or not data_inicio <= pedido.data_hora <= data_fim:
+                continue
+            agregados['total'] += 1
+            agregados['faturamento'] += pedido.valor_total
+            for item in pedido.itens:
+                agregados['sabores'][item.sabor.nome] = agregados['sabores'].get(item.sabor.nome, 0) + 1
+                agregados['tamanhos'][item.tamanho] = agregados['tamanhos'].get(item.tamanho, 0) + 1
+                for adicional in item.adicionais:
+                    agregados['adicionais'][adicional.nome] = agregados['adicionais'].get(adicional.nome, 0) + 1
+    return agregados
+
+def _somar_contagens(linhas, chave, contagens, limite=None):
+    """Soma contagens do arquivo às linhas agregadas no banco ({chave, quantidade})"""
+    somadas = dict(contagens)
+    for linha in linhas:
+        somadas[linha[chave]] = somadas.get(linha[chave], 0) + linha['quantidade']
+    resultado = [{chave: nome, 'quantidade': quantidade}
+                 for nome, quantidade in sorted(somadas.items(), key=lambda x: x[1], reverse=True)]
+    return resultado[:limite] if limite else resultado
+
+def relatorio_vendas(request):
+    """Gera relatório de vendas (lido da cópia de relatórios, se configurada)"""
+    data_inicio, data_fim = _periodo_relatorio(request)
+    # Só as agregações leem a cópia: o template (usuário, sessão, mensagens) usa o banco principal
+    with leitura_relatorios():
+        context = _agregados_relatorio(data_inicio, data_fim)
+    return render(request, 'pizzaria/relatorio.html', context)
+
+def _agregados_relatorio(data_inicio, data_fim):
+    """Contexto do relatório, com os querysets já avaliados"""
     # Filtra pedidos do período
     pedidos = Pedido.objects.filter(
         data_hora__range=(data_inicio, data_fim),
@@ -314,39 +1847,122 @@ def relatorio_vendas(request):
     total_pedidos = pedidos.count()
     faturamento_total = pedidos.aggregate(Sum('valor_total'))['valor_total__sum'] or 0
     
+    # Sabores, tamanhos e adicionais contam pizzas, não pedidos
+    itens = ItemPedido.objects.filter(pedido__in=pedidos)
+    
     # Sabores mais vendidos
-    sabores_populares = pedidos.values('sabor__nome').annotate(
-        quantidade=Count('sabor')
+    sabores_populares = itens.values('sabor__nome').annotate(
+        quantidade=Count('id')
     ).order_by('-quantidade')[:5]
     
     # Tamanhos mais vendidos
-    tamanhos_populares = pedidos.values('tamanho').annotate(
-        quantidade=Count('tamanho')
+    tamanhos_populares = itens.values('tamanho').annotate(
+        quantidade=Count('id')
     ).order_by('-quantidade')
     
     # Adicionais mais pedidos
     adicionais_populares = Adicional.objects.filter(
-        pedido__in=pedidos
+        itens_pedido__in=itens
     ).annotate(
-        quantidade=Count('pedido')
+        quantidade=Count('itens_pedido')
     ).order_by('-quantidade')[:5]
     
-    context = {
+    # Períodos antigos também somam os pedidos arquivados
+    arquivo = _agregados_arquivo(data_inicio, data_fim)
+    if arquivo is not None:
+        total_pedidos += arquivo['total']
+        faturamento_total += arquivo['faturamento']
+        sabores_populares = _somar_contagens(
+            itens.values('sabor__nome').annotate(quantidade=Count('id')),
+            'sabor__nome', arquivo['sabores'], 5)
+        tamanhos_populares = _somar_contagens(tamanhos_populares, 'tamanho', arquivo['tamanhos'])
+        adicionais_populares = _somar_contagens(
+            Adicional.objects.filter(itens_pedido__in=itens).values('nome').annotate(
+                quantidade=Count('itens_pedido')),
+            'nome', arquivo['adicionais'], 5)
+    
+    return {
         'data_inicio': data_inicio.date(),
         'data_fim': data_fim.date(),
         'total_pedidos': total_pedidos,
         'faturamento_total': faturamento_total,
-        'sabores_populares': sabores_populares,
-        'tamanhos_populares': tamanhos_populares,
-        'adicionais_populares': adicionais_populares,
+        'sabores_populares': list(sabores_populares),
+        'tamanhos_populares': list(tamanhos_populares),
+        'adicionais_populares': list(adicionais_populares),
+        'dados_ate': atualizacao_copia_relatorios(),
     }
+
+# Colunas da exportação (mesmas do CLI; sabor/tamanho/adicionais são da primeira pizza)
+COLUNAS_EXPORTACAO = ['numero', 'cliente', 'telefone', 'sabor', 'tamanho', 'adicionais', 'itens',
+                      'observacoes', 'data_hora', 'status', 'valor_total']
+TAMANHO_LOTE_EXPORTACAO = 2000
+
+class _Eco:
+    """Pseudo-arquivo que devolve o que é escrito (para o csv.writer em streaming)"""
+    def write(self, valor):
+        return valor
+
+def _registros_exportacao(pedidos):
+    # iterator() com chunk_size mantém a memória constante e ainda aplica o prefetch por lote
+    for pedido in pedidos.iterator(chunk_size=TAMANHO_LOTE_EXPORTACAO):
+        yield {
+            'numero': pedido.numero,
+            'cliente': pedido.cliente_nome,
+            'telefone': pedido.cliente_telefone,
+            'sabor': pedido.sabor.nome,
+            'tamanho': pedido.tamanho,
+            'adicionais': [adicional.nome for adicional in pedido.adicionais.all()],
+            'itens': [
+                f'{item.sabor.nome} ({item.tamanho})' + ''.join(f' + {a.nome}' for a in item.adicionais.all())
+                for item in pedido.itens.all()
+            ],
+            'observacoes': pedido.observacoes,
+            'data_hora': pedido.data_hora.isoformat(timespec='seconds'),
+            'status': pedido.status,
+            'valor_total': str(pedido.valor_total),
+        }
+
+def exportar_pedidos(request):
+    """Exporta pedidos em CSV ou JSONL via streaming.
     
-    return render(request, 'pizzaria/relatorio.html', context)
+    Aceita os mesmos filtros de período do relatório de vendas, além de
+    `status` (padrão 'Entregue'; use status=todos para não filtrar).
+    """
+    formato = request.GET.get('formato', 'csv')
+    if formato not in ('csv', 'jsonl'):
+        return JsonResponse({'success': False, 'message': 'Formato inválido'}, status=400)
+    
+    data_inicio, data_fim = _periodo_relatorio(request)
+    # O streaming acontece depois que a view retorna: o banco é fixado no queryset
+    pedidos = Pedido.objects.using(banco_relatorios()).filter(
+        data_hora__range=(data_inicio, data_fim)
+    ).select_related('sabor').prefetch_related('adicionais', _prefetch_itens()).order_by('numero')
+    
+    status = request.GET.get('status', 'Entregue')
+    if status != 'todos':
+        pedidos = pedidos.filter(status=status)
+    
+    registros = _registros_exportacao(pedidos)
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        def linhas():
+            yield escritor.writerow(COLUNAS_EXPORTACAO)
+            for registro in registros:
+                registro['adicionais'] = '; '.join(registro['adicionais'])
+                registro['itens'] = ' | '.join(registro['itens'])
+                yield escritor.writerow([registro[coluna] for coluna in COLUNAS_EXPORTACAO])
+        response = StreamingHttpResponse(linhas(), content_type='text/csv; charset=utf-8')
+    else:
+        linhas = (json.dumps(registro, ensure_ascii=False) + '\n' for registro in registros)
+        response = StreamingHttpResponse(linhas, content_type='application/x-ndjson; charset=utf-8')
+    
+    response['Content-Disposition'] = f'attachment; filename="pedidos.{formato}"'
+    return response
 
-def get_preco_sabor(request, sabor_id):
+async def get_preco_sabor(request, sabor_id):
     """API para obter preços de um sabor"""
     try:
-        sabor = get_object_or_404(Sabor, id=sabor_id, ativo=True)
+        sabor = await Sabor.objects.aget(id=sabor_id, ativo=True)
         precos = {
             'Pequena': str(sabor.preco_pequena),
             'Média': str(sabor.preco_media),
@@ -359,9 +1975,18 @@ def get_preco_sabor(request, sabor_id):
             'precos': precos,
             'ingredientes': sabor.get_ingredientes()
         })
+    except Sabor.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Sabor não encontrado'})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
 
+def metricas(request):
+    """Métricas de queries e latência por view (somente acesso local)"""
+    if request.META.get('REMOTE_ADDR') not in IPS_METRICAS:
+        return HttpResponseForbidden('Métricas disponíveis apenas localmente')
+    
+    return JsonResponse(coletor_metricas.exportar())
+
 # urls.py
 from django.urls import path
 from . import views
@@ -375,9 +2000,885 @@ urlpatterns = [
     path('pedido/<int:pedido_id>/', views.detalhes_pedido, name='detalhes_pedido'),
     path('cardapio/', views.cardapio, name='cardapio'),
     path('relatorio/', views.relatorio_vendas, name='relatorio_vendas'),
+    path('exportar/', views.exportar_pedidos, name='exportar_pedidos'),
     
     # APIs
     path('api/pedidos/', views.buscar_pedidos, name='buscar_pedidos'),
+    path('api/pedido/<int:pedido_id>/', views.detalhes_pedido_json, name='detalhes_pedido_json'),
     path('api/pedido/<int:pedido_id>/status/', views.atualizar_status_pedido, name='atualizar_status'),
+    path('api/item/<int:item_id>/avancar/', views.avancar_item, name='avancar_item'),
     path('api/sabor/<int:sabor_id>/precos/', views.get_preco_sabor, name='get_preco_sabor'),
-]
\ No newline at end of file
+    path('api/cliente/<str:telefone>/', views.historico_cliente, name='historico_cliente'),
+    path('api/ingrediente/', views.pedidos_por_ingrediente, name='pedidos_por_ingrediente'),
+    path('api/previsao/', views.previsao_demanda, name='previsao_demanda'),
+    path('api/lotes-forno/', views.lotes_forno, name='lotes_forno'),
+    path('api/em-alta/', views.em_alta, name='em_alta'),
+    path('metricas/', views.metricas, name='metricas'),
+]
+
+# middleware.py
+# Ative em settings.MIDDLEWARE: 'pizzaria.middleware.MetricasMiddleware'
+import threading
+import time
+from bisect import bisect_left
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+
+# Limites superiores dos buckets dos histogramas
+LIMITES_LATENCIA_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LIMITES_QUERIES = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+class Histograma:
+    """Histograma de buckets fixos: memória constante, qualquer que seja o volume"""
+    
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0
+    
+    def registrar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.total += 1
+        self.soma += valor
+        self.maximo = max(self.maximo, valor)
+    
+    def percentil(self, p):
+        """Limite superior do bucket que contém o percentil p"""
+        if not self.total:
+            return 0
+        alvo = self.total * p / 100
+        acumulado = 0
+        for indice, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return self.limites[indice] if indice < len(self.limites) else self.maximo
+        return self.maximo
+    
+    def exportar(self):
+        return {
+            'total': self.total,
+            'media': self.soma / self.total if self.total else 0,
+            'p50': self.percentil(50),
+            'p90': self.percentil(90),
+            'p99': self.percentil(99),
+            'max': self.maximo,
+        }
+
+class ColetorMetricas:
+    """Agrega queries, tempo de banco e latência por view (por processo)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+    
+    def registrar(self, view, queries, tempo_db_ms, latencia_ms):
+        with self._lock:
+            metricas = self._views.get(view)
+            if metricas is None:
+                metricas = self._views[view] = {
+                    'queries': Histograma(LIMITES_QUERIES),
+                    'tempo_db_ms': Histograma(LIMITES_LATENCIA_MS),
+                    'latencia_ms': Histograma(LIMITES_LATENCIA_MS),
+                }
+            metricas['queries'].registrar(queries)
+            metricas['tempo_db_ms'].registrar(tempo_db_ms)
+            metricas['latencia_ms'].registrar(latencia_ms)
+    
+    def exportar(self):
+        with self._lock:
+            return {
+                view: {nome: histograma.exportar() for nome, histograma in metricas.items()}
+                for view, metricas in self._views.items()
+            }
+    
+    def limpar(self):
+        with self._lock:
+            self._views.clear()
+
+coletor_metricas = ColetorMetricas()
+
+class _ContadorQueries:
+    """execute_wrapper que conta as queries e soma o tempo gasto no banco"""
+    
+    def __init__(self):
+        self.queries = 0
+        self.tempo = 0.0
+    
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.tempo += time.perf_counter() - inicio
+
+class MetricasMiddleware:
+    """Registra queries, tempo de banco e latência total de cada requisição.
+    
+    As métricas são agrupadas pelo nome da rota (ex.: 'pizzaria:home'), então
+    o número de séries é limitado ao número de rotas.
+    
+    Funciona nas duas pilhas: sob ASGI não força as views assíncronas a rodar
+    numa thread. Lá as queries do ORM assíncrono rodam na thread do
+    sync_to_async da requisição, então o contador é instalado nessa thread.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def _registrar(self, request, contador, inicio):
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        rota = getattr(request, 'resolver_match', None)
+        view = rota.view_name if rota else 'sem_rota'
+        coletor_metricas.registrar(view, contador.queries, contador.tempo * 1000, latencia_ms)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        contador = _ContadorQueries()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contador):
+            response = self.get_response(request)
+        self._registrar(request, contador, inicio)
+        return response
+    
+    async def __acall__(self, request):
+        contador = _ContadorQueries()
+        
+        def instalar():
+            connection.execute_wrappers.append(contador)
+        
+        def remover():
+            connection.execute_wrappers.remove(contador)
+        
+        inicio = time.perf_counter()
+        await sync_to_async(instalar)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(remover)()
+        self._registrar(request, contador, inicio)
+        return response
+
+# routers.py
+# Ative em settings:
+#   DATABASES['relatorios'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'relatorios.sqlite3'}
+#   DATABASE_ROUTERS = ['pizzaria.routers.RoteadorRelatorios']
+# e atualize a cópia periodicamente (cron): python manage.py atualizar_copia_relatorios
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from django.conf import settings
+from django.utils import timezone
+
+BANCO_RELATORIOS = 'relatorios'
+
+_lendo_relatorio = ContextVar('lendo_relatorio', default=False)
+
+def banco_relatorios():
+    """Alias do banco lido pelos relatórios ('default' se a cópia não estiver configurada)"""
+    return BANCO_RELATORIOS if BANCO_RELATORIOS in settings.DATABASES else 'default'
+
+@contextmanager
+def leitura_relatorios():
+    """Dentro do bloco, as leituras vão para a cópia de relatórios"""
+    token = _lendo_relatorio.set(True)
+    try:
+        yield
+    finally:
+        _lendo_relatorio.reset(token)
+
+def atualizacao_copia_relatorios():
+    """Momento do instantâneo lido pelos relatórios (None se eles leem o banco principal)"""
+    if banco_relatorios() == 'default':
+        return None
+    try:
+        modificado = os.path.getmtime(settings.DATABASES[BANCO_RELATORIOS]['NAME'])
+    except (OSError, TypeError):
+        return None
+    return datetime.fromtimestamp(modificado, tz=timezone.get_current_timezone())
+
+class RoteadorRelatorios:
+    """Relatórios e exportações leem um instantâneo dos modelos da pizzaria; o resto usa o banco principal.
+    
+    A cópia é consistente (um único instante) e somente leitura, então as
+    agregações longas não disputam locks com novo_pedido e
+    atualizar_status_pedido. Toda escrita vai para o banco principal.
+    """
+    
+    def db_for_read(self, model, **hints):
+        # Autenticação, sessões e demais apps sempre leem o banco principal
+        if _lendo_relatorio.get() and model._meta.app_label == 'pizzaria':
+            return banco_relatorios()
+        return None
+    
+    def db_for_write(self, model, **hints):
+        return 'default'
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A cópia recebe o esquema junto com os dados, no backup
+        return db != BANCO_RELATORIOS
+
+# testing.py
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Máximo de queries aceito por view; aumentos indicam N+1. Medido com os
+# caches vazios: inclui a carga das tabelas do cardápio e das linhas da fila
+LIMITES_QUERIES_VIEWS = {
+    'pizzaria:home': 10,
+    'pizzaria:fila_pedidos': 4,
+    'pizzaria:buscar_pedidos': 4,
+    'pizzaria:relatorio_vendas': 6,
+}
+
+@contextmanager
+def limite_queries(maximo, descricao='bloco'):
+    """Falha o teste se o bloco executar mais de `maximo` queries"""
+    with CaptureQueriesContext(connection) as contexto:
+        yield contexto
+    executadas = len(contexto.captured_queries)
+    if executadas > maximo:
+        sqls = '\n'.join(q['sql'] for q in contexto.captured_queries)
+        raise AssertionError(f'{descricao} executou {executadas} queries (máximo {maximo}):\n{sqls}')
+
+def verificar_queries_view(client, nome_rota, maximo=None, kwargs=None, params=None):
+    """Faz GET na view e garante que ela respeita o limite de queries"""
+    if maximo is None:
+        maximo = LIMITES_QUERIES_VIEWS[nome_rota]
+    url = reverse(nome_rota, kwargs=kwargs)
+    with limite_queries(maximo, nome_rota):
+        response = client.get(url, params or {})
+    return response
+
+# tests.py
+import time
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .models import (
+    Adicional, MetricasCozinha, Pedido, PrevisaoDemanda, RespostasPedido, Sabor, SegmentoArquivo, TabelaPrecos,
+    TendenciasPedidos, calcular_tempo_preparo, hora_da_semana, verificar_cache_compartilhado,
+)
+from .routers import RoteadorRelatorios, banco_relatorios, leitura_relatorios
+from .testing import LIMITES_QUERIES_VIEWS, verificar_queries_view
+from . import views
+
+def criar_pedidos_exemplo():
+    """Doze pedidos de duas pizzas, com adicionais, em todos os status"""
+    sabores = []
+    for nome, ingredientes in [('Calabresa', ['Muçarela', 'Calabresa']), ('Marguerita', ['Muçarela', 'Manjericão'])]:
+        sabor = Sabor(nome=nome, preco_pequena=30, preco_media=40, preco_grande=50, preco_familia=60)
+        sabor.set_ingredientes(ingredientes)
+        sabor.save()
+        sabores.append(sabor)
+    adicionais = [
+        Adicional.objects.create(nome='Bacon', preco=6),
+        Adicional.objects.create(nome='Borda recheada', preco=8),
+    ]
+    agora = timezone.now()
+    status = ['Pendente', 'Em preparo', 'Pronto', 'Saiu para entrega', 'Entregue', 'Entregue']
+    for i in range(12):
+        sabor, outro = sabores[i % 2], sabores[(i + 1) % 2]
+        pedido = Pedido.objects.create(
+            cliente_nome=f'Cliente {i % 4}',
+            cliente_telefone=f'(11) 99999-000{i % 4}',
+            sabor=sabor,
+            data_hora=agora - timedelta(minutes=15 * i),
+            status=status[i % len(status)],
+        )
+        pedido.criar_itens([
+            (sabor, 'Grande', adicionais[:i % 3]),
+            (outro, 'Pequena', adicionais[1:]),
+        ])
+
+class CacheCompartilhadoTests(SimpleTestCase):
+    @override_settings(DEBUG=False, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_recusa_cache_local_ao_processo(self):
+        erros = verificar_cache_compartilhado(None)
+        self.assertEqual([erro.id for erro in erros], ['pizzaria.E001'])
+    
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/pizzaria-cache',
+    }})
+    def test_aceita_cache_compartilhado(self):
+        self.assertEqual(verificar_cache_compartilhado(None), [])
+
+class TabelaPrecosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sabor = Sabor(nome='Calabresa', preco_pequena=30, preco_media=40, preco_grande=50, preco_familia=60)
+        self.sabor.set_ingredientes(['Muçarela', 'Calabresa'])
+        self.sabor.save()
+    
+    def test_versao_consultada_uma_vez_por_janela(self):
+        TabelaPrecos.aquecer()
+        with mock.patch('pizzaria.models.cache', wraps=cache) as cache_modelos:
+            for _ in range(10):
+                TabelaPrecos.consultar(self.sabor.id, 'Grande', [])
+        cache_modelos.get.assert_not_called()
+    
+    def test_versao_ausente_no_cache_ganha_um_token(self):
+        with mock.patch.object(TabelaPrecos, 'VALIDADE_LOCAL', 0):
+            cache.clear()
+            TabelaPrecos.aquecer()
+            self.assertIsNotNone(cache.get(TabelaPrecos.CHAVE_VERSAO))
+            # update() não passa por save(): só a troca do token, como a de outro processo, é vista
+            Sabor.objects.filter(pk=self.sabor.pk).update(preco_grande=55)
+            self.assertEqual(TabelaPrecos.consultar(self.sabor.id, 'Grande', [])[0], 50)
+            cache.set(TabelaPrecos.CHAVE_VERSAO, 'outro processo', None)
+            self.assertEqual(TabelaPrecos.consultar(self.sabor.id, 'Grande', [])[0], 55)
+
+class LimitesQueriesViewsTests(TestCase):
+    """As views de LIMITES_QUERIES_VIEWS respeitam o limite com caches vazios.
+    
+    Os pedidos têm várias pizzas e adicionais, então uma query por pedido
+    ou por pizza (N+1) estoura o limite.
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        criar_pedidos_exemplo()
+    
+    def test_views_respeitam_limite_de_queries(self):
+        for nome_rota in LIMITES_QUERIES_VIEWS:
+            with self.subTest(nome_rota):
+                cache.clear()
+                TabelaPrecos.invalidar()
+                response = verificar_queries_view(self.client, nome_rota)
+                self.assertEqual(response.status_code, 200)
+
+class FragmentosFilaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        criar_pedidos_exemplo()
+    
+    def setUp(self):
+        cache.clear()
+        TabelaPrecos.aquecer()
+    
+    def _renderizar_fila(self):
+        with mock.patch('pizzaria.views.render_to_string', wraps=views.render_to_string) as renderizar:
+            response = self.client.get(reverse('pizzaria:fila_pedidos'))
+        self.assertEqual(response.status_code, 200)
+        return [chamada.args[1]['pedido'].numero for chamada in renderizar.call_args_list]
+    
+    def test_refresh_sem_mudancas_nao_consulta_o_banco(self):
+        self._renderizar_fila()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._renderizar_fila(), [])
+    
+    def test_so_o_pedido_alterado_e_renderizado_de_novo(self):
+        self.assertEqual(len(self._renderizar_fila()), Pedido.objects.exclude(status='Entregue').count())
+        pedido = Pedido.objects.filter(status='Pendente').first()
+        versao = pedido.versao
+        pedido.status = 'Em preparo'
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.save(update_fields=['status'])
+        self.assertEqual(pedido.versao, versao + 1)
+        self.assertEqual(self._renderizar_fila(), [pedido.numero])
+
+class MetricasCozinhaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sabor = Sabor(nome='Calabresa', preco_pequena=30, preco_media=40, preco_grande=50, preco_familia=60)
+        cls.sabor.set_ingredientes(['Muçarela', 'Calabresa'])
+        cls.sabor.save()
+    
+    def setUp(self):
+        cache.clear()
+    
+    def _pedido(self, minutos_atras):
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = Pedido.objects.create(
+                cliente_nome='Cliente', cliente_telefone='11999990000', sabor=self.sabor,
+                data_hora=timezone.now() - timedelta(minutes=minutos_atras),
+            )
+            pedido.criar_itens([(self.sabor, 'Grande', [])])
+        return pedido
+    
+    def test_entrega_entra_nas_janelas_sem_consultar_o_banco(self):
+        rapido, atrasado = self._pedido(5), self._pedido(100)
+        self._pedido(1)
+        for pedido in (rapido, atrasado):
+            pedido.status = 'Entregue'
+            with self.captureOnCommitCallbacks(execute=True):
+                pedido.save(update_fields=['status'])
+        
+        with self.assertNumQueries(0):
+            resumo = MetricasCozinha.resumo()
+        self.assertEqual(resumo[15]['entregues_por_hora'], 2 * 60 / 15)
+        self.assertEqual(resumo[15]['atrasados'], 1)
+        self.assertEqual(resumo[60]['criados_por_hora'], 2)
+        self.assertEqual(resumo[180]['criados_por_hora'], 3 * 60 / 180)
+        self.assertEqual(resumo[15]['espera_p90'], 120)
+        self.assertIsNotNone(Pedido.objects.get(numero=rapido.numero).data_entrega)
+
+class PrevisaoDemandaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+    
+    def test_minutos_de_forno_contam_a_pizza_mais_demorada(self):
+        sabor = Sabor(nome='Calabresa', preco_pequena=30, preco_media=40, preco_grande=50, preco_familia=60)
+        sabor.set_ingredientes(['Muçarela', 'Calabresa'])
+        sabor.save()
+        borda = Adicional.objects.create(nome='Borda recheada', preco=8)
+        momento = timezone.now() - timedelta(days=1)
+        pedido = Pedido.objects.create(
+            cliente_nome='Cliente', cliente_telefone='11999990000', sabor=sabor, data_hora=momento,
+        )
+        pedido.criar_itens([(sabor, 'Pequena', []), (sabor, 'Família', [borda]), (sabor, 'Grande', [])])
+        pedido.status = 'Entregue'
+        pedido.data_entrega = momento + timedelta(minutes=40)
+        pedido.save()
+        
+        estado = PrevisaoDemanda.atualizar()
+        faixa = hora_da_semana(timezone.localtime(momento))
+        self.assertEqual(estado['pedidos'][faixa], 1)
+        self.assertEqual(estado['minutos_forno'][faixa], calcular_tempo_preparo('Família', 1))
+        self.assertEqual(sum(estado['pedidos']), 1)
+    
+    def test_pedido_esquecido_na_fila_nao_segura_a_previsao(self):
+        sabor = Sabor(nome='Calabresa', preco_pequena=30, preco_media=40, preco_grande=50, preco_familia=60)
+        sabor.set_ingredientes(['Muçarela', 'Calabresa'])
+        sabor.save()
+        agora = timezone.now()
+        esquecido = Pedido.objects.create(cliente_nome='Esquecido', cliente_telefone='11999990000', sabor=sabor,
+                                          data_hora=agora - timedelta(days=2))
+        esquecido.criar_itens([(sabor, 'Grande', [])])
+        # Marca d'água 10 minutos atrás; as entregas abaixo vêm depois dela
+        with mock.patch.object(PrevisaoDemanda, 'MARGEM_ENTREGA', timedelta(minutes=10)):
+            PrevisaoDemanda.atualizar()
+        
+        for minutos in (8, 5):
+            pedido = Pedido.objects.create(cliente_nome='Cliente', cliente_telefone='11999990001', sabor=sabor,
+                                           data_hora=agora - timedelta(minutes=40))
+            pedido.criar_itens([(sabor, 'Grande', [])])
+            pedido.status = 'Entregue'
+            pedido.data_entrega = agora - timedelta(minutes=minutos)
+            pedido.save()
+        
+        estado = PrevisaoDemanda.atualizar()
+        self.assertEqual(sum(estado['pedidos']), 2)
+        # Uma nova atualização não conta de novo os mesmos pedidos
+        self.assertEqual(sum(PrevisaoDemanda.atualizar()['pedidos']), 2)
+    
+    def test_pedido_sem_pizzas_usa_o_tamanho_e_os_adicionais_do_pedido(self):
+        sabor = Sabor(nome='Calabresa', preco_pequena=30, preco_media=40, preco_grande=50, preco_familia=60)
+        sabor.set_ingredientes(['Muçarela', 'Calabresa'])
+        sabor.save()
+        borda = Adicional.objects.create(nome='Borda recheada', preco=8)
+        momento = timezone.now() - timedelta(days=1)
+        antigo = Pedido.objects.create(cliente_nome='Cliente', cliente_telefone='11999990000', sabor=sabor,
+                                       tamanho='Família', data_hora=momento, status='Entregue',
+                                       data_entrega=momento + timedelta(minutes=40))
+        antigo.adicionais.set([borda])
+        novo = Pedido.objects.create(cliente_nome='Cliente', cliente_telefone='11999990000', sabor=sabor,
+                                     data_hora=momento + timedelta(hours=1))
+        novo.criar_itens([(sabor, 'Pequena', [])])
+        novo.status = 'Entregue'
+        novo.data_entrega = novo.data_hora + timedelta(minutes=40)
+        novo.save()
+        
+        estado = PrevisaoDemanda.atualizar()
+        faixa = hora_da_semana(timezone.localtime(momento))
+        self.assertEqual(estado['pedidos'][faixa], 1)
+        self.assertEqual(estado['minutos_forno'][faixa], antigo.calcular_tempo_preparo())
+        self.assertEqual(sum(estado['pedidos']), 2)
+
+class TendenciasPedidosTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+    
+    def test_conta_os_pedidos_registrados(self):
+        self.assertTrue(TendenciasPedidos.registrar([('Calabresa', ['Bacon']), ('Marguerita', [])]))
+        TendenciasPedidos.registrar([('Calabresa', [])])
+        top = TendenciasPedidos.top()
+        self.assertEqual(top['sabores']['itens'][0]['nome'], 'Calabresa')
+        self.assertAlmostEqual(top['sabores']['itens'][0]['estimado'], 2, places=3)
+        self.assertFalse(cache.get(TendenciasPedidos.CHAVE_LOCK))
+    
+    def test_sem_o_lock_descarta_o_pedido_sem_esperar(self):
+        cache.add(TendenciasPedidos.CHAVE_LOCK, 'outro processo', 60)
+        inicio = time.monotonic()
+        self.assertFalse(TendenciasPedidos.registrar([('Calabresa', ['Bacon'])]))
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertIsNone(cache.get(TendenciasPedidos.CHAVE))
+        self.assertEqual(cache.get(TendenciasPedidos.CHAVE_LOCK), 'outro processo')
+
+class RespostasPedidoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        criar_pedidos_exemplo()
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_pedido_ativo_responde_304_com_a_mesma_etag(self):
+        pedido = Pedido.objects.filter(status='Pendente').first()
+        url = reverse('pizzaria:detalhes_pedido', kwargs={'pedido_id': pedido.numero})
+        primeira = self.client.get(url)
+        segunda = self.client.get(url, HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(segunda.status_code, 304)
+    
+    def test_cache_guarda_so_o_conteudo_comum_aos_usuarios(self):
+        pedido = Pedido.objects.filter(status='Entregue').first()
+        url = reverse('pizzaria:detalhes_pedido', kwargs={'pedido_id': pedido.numero})
+        primeira = self.client.get(url)
+        entrada, _ = RespostasPedido.consultar(pedido.numero, 'html')
+        self.assertIsNotNone(entrada)
+        self.assertNotIn(b'csrfmiddlewaretoken', entrada['conteudo'])
+        
+        outro_usuario = Client()
+        segunda = outro_usuario.get(url)
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda['ETag'], primeira['ETag'])
+        self.assertIn('csrf_token', segunda.context)
+
+class RoteadorRelatoriosTests(SimpleTestCase):
+    def test_so_os_modelos_da_pizzaria_leem_a_copia(self):
+        roteador = RoteadorRelatorios()
+        with leitura_relatorios():
+            self.assertEqual(roteador.db_for_read(Pedido), banco_relatorios())
+            self.assertIsNone(roteador.db_for_read(User))
+        self.assertIsNone(roteador.db_for_read(Pedido))
+
+class SegmentoArquivoTests(TestCase):
+    def test_estatisticas_do_cliente_incluem_pedidos_arquivados(self):
+        calabresa = Sabor(nome='Calabresa', preco_pequena=30, preco_media=40, preco_grande=50, preco_familia=60)
+        calabresa.set_ingredientes(['Muçarela', 'Calabresa'])
+        calabresa.save()
+        marguerita = Sabor(nome='Marguerita', preco_pequena=30, preco_media=40, preco_grande=50, preco_familia=60)
+        marguerita.set_ingredientes(['Muçarela', 'Manjericão'])
+        marguerita.save()
+        agora = timezone.now()
+        for dias, status, pizzas in [
+            (90, 'Entregue', [calabresa, calabresa]),
+            (60, 'Cancelado', [marguerita, marguerita, marguerita]),
+            (30, 'Entregue', [calabresa]),
+            (0, 'Pendente', [marguerita]),
+        ]:
+            pedido = Pedido.objects.create(cliente_nome='Cliente', cliente_telefone='(11) 99999-0000',
+                                           sabor=pizzas[0], data_hora=agora - timedelta(days=dias), status=status)
+            pedido.criar_itens([(sabor, 'Grande', []) for sabor in pizzas])
+        esperado = Pedido.objects.estatisticas_cliente('11999990000')
+        
+        self.assertEqual(SegmentoArquivo.arquivar(agora - timedelta(days=1), tamanho=2), 3)
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(Pedido.objects.estatisticas_cliente('11999990000'), esperado)
+        self.assertEqual(esperado['total_pedidos'], 3)
+        self.assertEqual(esperado['sabor_favorito'], 'Calabresa')
+
+# management/commands/arquivar_pedidos.py
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pizzaria.models import SegmentoArquivo, DIAS_ARQUIVAMENTO, PEDIDOS_POR_SEGMENTO
+
+class Command(BaseCommand):
+    help = 'Move pedidos finalizados antigos para segmentos compactados do arquivo'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=DIAS_ARQUIVAMENTO,
+                            help='idade mínima (em dias) dos pedidos arquivados')
+        parser.add_argument('--tamanho-segmento', type=int, default=PEDIDOS_POR_SEGMENTO)
+    
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(days=options['dias'])
+        total = SegmentoArquivo.arquivar(antes_de, options['tamanho_segmento'])
+        self.stdout.write(self.style.SUCCESS(f'{total} pedidos arquivados'))
+
+# management/commands/importar_pickle.py
+import gzip
+import itertools
+import json
+import os
+import pickle
+import re
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from pizzaria.models import (
+    Adicional, FragmentosFila, ItemPedido, Pedido, PrevisaoDemanda, Sabor, TabelaPrecos, STATUS_COZINHA,
+    normalizar_telefone,
+)
+
+class _ObjetoCLI:
+    """Recebe o estado de qualquer objeto gravado pelo CLI (só o __dict__ importa)"""
+
+class _CarregadorCLI(pickle.Unpickler):
+    """Lê os pickles do CLI sem importar pizzaria.py (o app Django também se chama pizzaria)"""
+    def find_class(self, module, name):
+        if module in ('__main__', 'pizzaria'):
+            return _ObjetoCLI
+        return super().find_class(module, name)
+
+def _carregar(arquivo):
+    return _CarregadorCLI(arquivo).load()
+
+def separar_cliente(cliente):
+    """Separa "Nome (telefone)" em (nome, telefone), como no CLI"""
+    correspondencia = re.match(r'^(.*?) \((.*)\)$', cliente or '')
+    if correspondencia is None:
+        return cliente or '', ''
+    return correspondencia.group(1), correspondencia.group(2)
+
+class Command(BaseCommand):
+    help = 'Importa pedidos e cardápio do CLI (pedidos.pickle / cardapio.pickle)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('pedidos', nargs='?', default='pedidos.pickle')
+        parser.add_argument('--cardapio', default='cardapio.pickle')
+        parser.add_argument('--lote', type=int, default=5000, help='pedidos por transação')
+    
+    def handle(self, *args, **options):
+        if not os.path.exists(options['pedidos']):
+            raise CommandError(f"Arquivo não encontrado: {options['pedidos']}")
+        with open(options['pedidos'], 'rb') as f:
+            dados = _carregar(f)
+        cardapio = {'sabores': {}, 'adicionais': {}}
+        if os.path.exists(options['cardapio']):
+            with open(options['cardapio'], 'rb') as f:
+                cardapio = _carregar(f)
+        
+        self.sabores = self._importar_sabores(cardapio['sabores'])
+        self.adicionais = self._importar_adicionais(cardapio['adicionais'])
+        
+        # Retomada: pedidos já importados são pulados (o histórico está em ordem
+        # de entrega, não de número, então não basta olhar o maior número)
+        self.existentes = set(Pedido.objects.values_list('numero', flat=True))
+        fontes, total = self._fontes(options['pedidos'], dados)
+        self.stdout.write(f'{total} pedidos no pickle, {len(self.existentes)} já no banco')
+        
+        importados = lidos = 0
+        inicio = time.perf_counter()
+        lote = []
+        for pedidos in fontes:
+            for pedido in pedidos:
+                lidos += 1
+                if pedido.numero in self.existentes:
+                    continue
+                lote.append(pedido)
+                if len(lote) >= options['lote']:
+                    importados += self._gravar_lote(lote)
+                    lote = []
+                    self._progresso(importados, lidos, total, inicio)
+        if lote:
+            importados += self._gravar_lote(lote)
+            self._progresso(importados, lidos, total, inicio)
+        
+        # Números foram gravados explicitamente: a sequência do banco precisa avançar
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Pedido]):
+                cursor.execute(sql)
+        # bulk_create não passa por save(): descarta as agregações em cache
+        TabelaPrecos.invalidar()
+        FragmentosFila.invalidar()
+        cache.delete(PrevisaoDemanda.CHAVE)
+        self.stdout.write(self.style.SUCCESS(f'{importados} pedidos importados'))
+    
+    def _fontes(self, caminho, dados):
+        """Geradores de listas de pedidos (arquivo frio, histórico, fila) e o total"""
+        base = os.path.splitext(caminho)[0]
+        fontes, total = [], 0
+        
+        indice = os.path.join(base + '_arquivo', 'indice.json')
+        if os.path.exists(indice):
+            with open(indice, encoding='utf-8') as f:
+                segmentos = json.load(f)
+            total += sum(segmento['quantidade'] for segmento in segmentos)
+            fontes.append(self._ler_arquivo_frio(base + '_arquivo', segmentos))
+        
+        if 'historico_pedidos' in dados:
+            # Formato antigo: histórico inteiro no próprio pickle
+            total += len(dados['historico_pedidos'])
+            fontes.append([dados['historico_pedidos']])
+        else:
+            historico = dados.get('historico', {})
+            segmentos = historico.get('segmentos', [])
+            total += sum(segmento['quantidade'] for segmento in segmentos)
+            caminho_historico = f"{base}_historico_{historico.get('geracao', 0)}.pickle"
+            fontes.append(self._ler_historico(caminho_historico, segmentos))
+        
+        fila = dados.get('fila_pedidos', [])
+        total += len(fila)
+        fontes.append([fila])
+        return itertools.chain.from_iterable(fontes), total
+    
+    def _ler_arquivo_frio(self, diretorio, segmentos):
+        for segmento in segmentos:
+            with gzip.open(os.path.join(diretorio, segmento['arquivo']), 'rb') as f:
+                yield _carregar(f)
+    
+    def _ler_historico(self, caminho, segmentos):
+        if not segmentos:
+            return
+        with open(caminho, 'rb') as f:
+            for segmento in segmentos:
+                f.seek(segmento['posicao'])
+                yield _carregar(f)
+    
+    def _importar_sabores(self, sabores_cardapio):
+        """Mapa nome -> Sabor, criando os sabores do cardápio que faltam no banco"""
+        sabores = {sabor.nome: sabor for sabor in Sabor.objects.all()}
+        novos = [
+            Sabor(
+                nome=nome,
+                ingredientes=json.dumps(info['ingredientes']),
+                preco_pequena=Decimal(str(info['preco'].get('Pequena', 0))),
+                preco_media=Decimal(str(info['preco'].get('Média', 0))),
+                preco_grande=Decimal(str(info['preco'].get('Grande', 0))),
+                preco_familia=Decimal(str(info['preco'].get('Família', 0))),
+            )
+            for nome, info in sabores_cardapio.items() if nome not in sabores
+        ]
+        for sabor in Sabor.objects.bulk_create(novos):
+            sabores[sabor.nome] = sabor
+        return sabores
+    
+    def _importar_adicionais(self, adicionais_cardapio):
+        """Mapa nome -> Adicional, criando os adicionais do cardápio que faltam no banco"""
+        adicionais = {adicional.nome: adicional for adicional in Adicional.objects.all()}
+        novos = [
+            Adicional(nome=nome, preco=Decimal(str(preco)))
+            for nome, preco in adicionais_cardapio.items() if nome not in adicionais
+        ]
+        for adicional in Adicional.objects.bulk_create(novos):
+            adicionais[adicional.nome] = adicional
+        return adicionais
+    
+    def _sabor(self, nome):
+        # Pedidos antigos podem citar sabores que já saíram do cardápio
+        if nome not in self.sabores:
+            self.sabores[nome] = Sabor.objects.create(
+                nome=nome, ingredientes='[]', ativo=False, preco_pequena=0,
+                preco_media=0, preco_grande=0, preco_familia=0,
+            )
+        return self.sabores[nome]
+    
+    def _adicional(self, nome):
+        if nome not in self.adicionais:
+            self.adicionais[nome] = Adicional.objects.create(nome=nome, preco=0, ativo=False)
+        return self.adicionais[nome]
+    
+    def _data(self, momento):
+        if momento is not None and settings.USE_TZ and timezone.is_naive(momento):
+            return timezone.make_aware(momento)
+        return momento
+    
+    def _pizzas(self, origem):
+        """(sabor, tamanho, adicionais, etapa) de cada pizza de um pedido do CLI"""
+        itens = getattr(origem, 'itens', None)
+        if itens is None:
+            # Gravado antes das várias pizzas: a única pizza está no próprio pedido
+            etapa = origem.status if origem.status in STATUS_COZINHA else 'Pronto'
+            return [(origem.sabor, origem.tamanho, origem.adicional, etapa)]
+        return [(item.sabor, item.tamanho, item.adicional, item.status) for item in itens]
+    
+    def _gravar_lote(self, lote):
+        status_validos = dict(Pedido.STATUS_CHOICES)
+        pedidos, ligacoes, itens = [], [], []
+        for origem in lote:
+            pizzas = []
+            for ordem, (nome_sabor, tamanho, nomes_adicionais, etapa) in enumerate(self._pizzas(origem), 1):
+                sabor = self._sabor(nome_sabor)
+                adicionais = [self._adicional(nome) for nome in nomes_adicionais]
+                item = ItemPedido(
+                    pedido_id=origem.numero, ordem=ordem, sabor=sabor, tamanho=tamanho, status=etapa,
+                    valor=sabor.get_preco(tamanho) + sum(a.preco for a in adicionais),
+                )
+                pizzas.append((item, adicionais))
+            
+            primeira, adicionais = pizzas[0]
+            nome, telefone = separar_cliente(origem.cliente)
+            pedidos.append(Pedido(
+                numero=origem.numero,
+                cliente_nome=nome,
+                cliente_telefone=telefone,
+                cliente_telefone_normalizado=normalizar_telefone(telefone),
+                sabor=primeira.sabor,
+                tamanho=primeira.tamanho,
+                observacoes=origem.observacoes or '',
+                data_hora=self._data(origem.data_hora),
+                status=origem.status if origem.status in status_validos else 'Pendente',
+                data_entrega=self._data(getattr(origem, 'data_entrega', None)),
+                valor_total=sum(item.valor for item, _ in pizzas),
+            ))
+            # O M2M não guarda repetições; os valores acima já contaram cada uma
+            for adicional_id in dict.fromkeys(a.id for a in adicionais):
+                ligacoes.append(Pedido.adicionais.through(pedido_id=origem.numero, adicional_id=adicional_id))
+            itens.extend(pizzas)
+        
+        with transaction.atomic():
+            Pedido.objects.bulk_create(pedidos)
+            Pedido.adicionais.through.objects.bulk_create(ligacoes)
+            ItemPedido.objects.bulk_create([item for item, _ in itens])
+            ItemPedido.adicionais.through.objects.bulk_create([
+                ItemPedido.adicionais.through(itempedido_id=item.pk, adicional_id=adicional_id)
+                for item, adicionais in itens
+                for adicional_id in dict.fromkeys(a.id for a in adicionais)
+            ])
+        self.existentes.update(pedido.numero for pedido in pedidos)
+        return len(pedidos)
+    
+    def _progresso(self, importados, lidos, total, inicio):
+        decorrido = time.perf_counter() - inicio
+        percentual = lidos / total * 100 if total else 100
+        self.stdout.write(f'  {lidos}/{total} lidos ({percentual:.1f}%), {importados} importados, '
+                          f'{importados / decorrido if decorrido else 0:.0f} pedidos/s')
+
+# management/commands/atualizar_copia_relatorios.py
+import os
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from pizzaria.routers import BANCO_RELATORIOS
+
+class Command(BaseCommand):
+    help = 'Atualiza a cópia somente leitura usada pelos relatórios (instantâneo do banco)'
+    
+    def handle(self, *args, **options):
+        if BANCO_RELATORIOS not in settings.DATABASES:
+            raise CommandError(f"Configure o banco '{BANCO_RELATORIOS}' em settings.DATABASES")
+        origem = connections['default']
+        if origem.vendor != 'sqlite':
+            raise CommandError('A cópia automática é só para SQLite; em outros bancos aponte '
+                               f"'{BANCO_RELATORIOS}' para uma réplica de leitura")
+        
+        destino = str(settings.DATABASES[BANCO_RELATORIOS]['NAME'])
+        temporario = destino + '.tmp'
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        origem.ensure_connection()
+        copia = sqlite3.connect(temporario)
+        try:
+            # Um passo só: a cópia reflete um único instante. Em modo WAL não bloqueia gravações.
+            origem.connection.backup(copia)
+        finally:
+            copia.close()
+        # Conexões abertas continuam no arquivo antigo até reconectar
+        connections[BANCO_RELATORIOS].close()
+        os.replace(temporario, destino)
+        self.stdout.write(self.style.SUCCESS(f'Cópia de relatórios atualizada em {destino}'))
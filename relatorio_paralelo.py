@@ -0,0 +1,165 @@
+"""Relatório de vendas em map-reduce sobre partições do histórico.
+
+O histórico é dividido em partições contíguas: cada segmento do arquivo
+frio é uma partição e o histórico ativo é cortado nas viradas de mês. Cada
+processo do pool calcula os agregados parciais de uma partição e o
+processo principal os combina na ordem das partições, que é a mesma ordem
+em que gerar_relatorio percorre os pedidos. Por isso o resultado é idêntico
+ao do relatório sequencial, inclusive a ordem das chaves dos dicionários.
+
+O faturamento parcial é uma soma exata (Fraction); o total convertido para
+float coincide com o math.fsum do relatório sequencial.
+
+    python relatorio_paralelo.py --pedidos pedidos.pickle --de 2024-01-01 --processos 8
+"""
+import argparse
+import datetime
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
+
+from pizzaria import ArquivoFrio, MotorPrecos, Pedido, SistemaPizzaria, exibir_relatorio
+
+# Partições menores que isso não compensam o custo de despachar para o pool
+MINIMO_POR_PARTICAO = 20000
+
+# Estado de cada processo do pool, preenchido por _inicializar
+_CONTEXTO: Dict = {}
+
+
+def _inicializar(motor_precos: MotorPrecos, historico: List[Pedido], diretorio_arquivo: str) -> None:
+    _CONTEXTO["motor_precos"] = motor_precos
+    _CONTEXTO["historico"] = historico
+    _CONTEXTO["arquivo"] = ArquivoFrio(diretorio_arquivo)
+
+
+def particionar(historico: List[Pedido], minimo: int = MINIMO_POR_PARTICAO) -> List[Tuple[int, int]]:
+    """Corta o histórico em intervalos contíguos [início, fim), na virada do mês"""
+    particoes = []
+    inicio = 0
+    for posicao in range(1, len(historico)):
+        if posicao - inicio < minimo:
+            continue
+        anterior, atual = historico[posicao - 1].data_hora, historico[posicao].data_hora
+        if (anterior.year, anterior.month) != (atual.year, atual.month):
+            particoes.append((inicio, posicao))
+            inicio = posicao
+    if inicio < len(historico):
+        particoes.append((inicio, len(historico)))
+    return particoes
+
+
+def agregar(pedidos: List[Pedido], data_inicio: datetime.datetime, data_fim: datetime.datetime,
+            motor_precos: MotorPrecos) -> Dict:
+    """Agregados parciais de uma partição"""
+    total = 0
+    valores: Dict = {}
+    sabores: Dict[str, int] = {}
+    adicionais: Dict[str, int] = {}
+    tamanhos: Dict[str, int] = {}
+    vendas_por_dia: Dict[str, int] = {}
+    for pedido in pedidos:
+        if not data_inicio <= pedido.data_hora <= data_fim:
+            continue
+        total += 1
+        valor = motor_precos.valor_pedido(pedido)
+        if valor is not None:
+            valores[valor] = valores.get(valor, 0) + 1
+        for item in pedido.itens:
+            sabores[item.sabor] = sabores.get(item.sabor, 0) + 1
+            tamanhos[item.tamanho] = tamanhos.get(item.tamanho, 0) + 1
+            for adicional in item.adicional:
+                adicionais[adicional] = adicionais.get(adicional, 0) + 1
+        dia = pedido.data_hora.strftime("%d/%m/%Y")
+        vendas_por_dia[dia] = vendas_por_dia.get(dia, 0) + 1
+    return {
+        "total_pedidos": total,
+        # Poucos preços distintos: soma exata agrupada por valor
+        "faturamento": sum((Fraction(valor) * quantidade for valor, quantidade in valores.items()),
+                           Fraction(0)),
+        "sabores": sabores,
+        "adicionais": adicionais,
+        "tamanhos": tamanhos,
+        "vendas_por_dia": vendas_por_dia,
+    }
+
+
+def _agregar_particao(particao: Tuple, data_inicio: datetime.datetime,
+                      data_fim: datetime.datetime) -> Dict:
+    tipo, valor = particao
+    if tipo == "arquivo":
+        pedidos = _CONTEXTO["arquivo"].ler_segmento(valor)
+    else:
+        inicio, fim = valor
+        pedidos = _CONTEXTO["historico"][inicio:fim]
+    return agregar(pedidos, data_inicio, data_fim, _CONTEXTO["motor_precos"])
+
+
+def combinar(parciais: List[Dict]) -> Optional[Dict]:
+    """Combina os agregados na ordem das partições (None se não houver pedidos)"""
+    relatorio = {"total_pedidos": 0, "faturamento": Fraction(0), "sabores": {}, "adicionais": {},
+                 "tamanhos": {}, "vendas_por_dia": {}}
+    for parcial in parciais:
+        relatorio["total_pedidos"] += parcial["total_pedidos"]
+        relatorio["faturamento"] += parcial["faturamento"]
+        for chave in ("sabores", "adicionais", "tamanhos", "vendas_por_dia"):
+            contagens = relatorio[chave]
+            for nome, quantidade in parcial[chave].items():
+                contagens[nome] = contagens.get(nome, 0) + quantidade
+    if not relatorio["total_pedidos"]:
+        return None
+    relatorio["faturamento"] = float(relatorio["faturamento"])
+    return relatorio
+
+
+def gerar_relatorio_paralelo(sistema: SistemaPizzaria, data_inicio: datetime.datetime,
+                             data_fim: datetime.datetime, processos: Optional[int] = None,
+                             minimo: int = MINIMO_POR_PARTICAO) -> Optional[Dict]:
+    """Mesmo resultado de sistema.gerar_relatorio, calculado em um pool de processos"""
+    particoes = [("arquivo", segmento)
+                 for segmento in sistema.arquivo_frio.indices_no_periodo(data_inicio, data_fim)]
+    particoes += [("historico", intervalo) for intervalo in particionar(sistema.historico_pedidos, minimo)]
+    contexto = (sistema.motor_precos, sistema.historico_pedidos, sistema.arquivo_frio.diretorio)
+
+    processos = min(processos or os.cpu_count() or 1, len(particoes))
+    if processos <= 1:
+        _inicializar(*contexto)
+        return combinar([_agregar_particao(p, data_inicio, data_fim) for p in particoes])
+
+    # Com fork o histórico é herdado pelos processos, sem ser serializado
+    metodos = multiprocessing.get_all_start_methods()
+    mp_context = multiprocessing.get_context("fork" if "fork" in metodos else None)
+    with ProcessPoolExecutor(processos, mp_context=mp_context, initializer=_inicializar,
+                             initargs=contexto) as pool:
+        parciais = list(pool.map(_agregar_particao, particoes,
+                                 [data_inicio] * len(particoes), [data_fim] * len(particoes)))
+    return combinar(parciais)
+
+
+def _data(valor: str) -> datetime.datetime:
+    return datetime.datetime.strptime(valor, "%Y-%m-%d")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Relatório de vendas paralelo")
+    parser.add_argument("--pedidos", default="pedidos.pickle")
+    parser.add_argument("--cardapio", default="cardapio.pickle")
+    parser.add_argument("--de", type=_data, default=datetime.datetime(1900, 1, 1),
+                        help="data inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", type=_data, help="data final (AAAA-MM-DD)")
+    parser.add_argument("--processos", type=int, help="tamanho do pool (padrão: núcleos da máquina)")
+    args = parser.parse_args(argv)
+
+    data_fim = args.ate.replace(hour=23, minute=59, second=59) if args.ate else datetime.datetime.now()
+    sistema = SistemaPizzaria(args.pedidos, args.cardapio)
+    relatorio = gerar_relatorio_paralelo(sistema, args.de, data_fim, args.processos)
+    if relatorio is None:
+        print("Nenhum pedido encontrado para o período!")
+        return
+    exibir_relatorio(f"de {args.de:%d/%m/%Y} até {data_fim:%d/%m/%Y}", relatorio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Importação em lote e replay de logs de pedidos para teste de carga.
+
+Lê um log de operações (CSV ou JSONL) e o reproduz contra o núcleo da
+pizzaria, medindo vazão e latência por operação.
+
+Cada linha do log descreve uma operação:
+
+    operacao     criar | editar | entregar
+    timestamp    data/hora ISO 8601 (usada para reproduzir o ritmo original)
+    numero       número do pedido no log (referenciado por editar/entregar)
+    cliente, telefone, sabor, tamanho, observacoes, status
+    adicionais   lista JSON (JSONL) ou nomes separados por ";" (CSV)
+
+Exemplo:
+
+    python replay_pedidos.py sexta.jsonl --velocidade 10
+
+O backend django roda a partir do diretório do projeto Django, com este
+diretório no PYTHONPATH: o app e o CLI se chamam pizzaria, e o app precisa
+vir antes no sys.path (por isso o CLI só é importado pelo backend pickle).
+
+    cd site && PYTHONPATH=/caminho/do/cli python -m replay_pedidos sexta.csv --backend django \
+        --settings site.settings
+"""
+import argparse
+import csv
+import datetime
+import importlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+
+from medicao import configurar_django, percentil
+
+OPERACOES = ("criar", "editar", "entregar")
+
+
+def ler_log(caminho: str) -> Iterator[Dict]:
+    """Lê o log de pedidos linha a linha (CSV ou JSONL, pela extensão)"""
+    with open(caminho, encoding="utf-8", newline="") as f:
+        if caminho.endswith(".csv"):
+            for linha in csv.DictReader(f):
+                adicionais = linha.get("adicionais") or ""
+                linha["adicionais"] = [a.strip() for a in adicionais.split(";") if a.strip()]
+                yield linha
+        else:
+            for linha in f:
+                if linha.strip():
+                    yield json.loads(linha)
+
+
+def _timestamp(operacao: Dict) -> Optional[datetime.datetime]:
+    valor = operacao.get("timestamp")
+    return datetime.datetime.fromisoformat(valor) if valor else None
+
+
+class BackendPickle:
+    """Reproduz as operações em um SistemaPizzaria com arquivos pickle"""
+    nome = "pickle"
+
+    def __init__(self, diretorio: Optional[str] = None, salvar: bool = True):
+        from pizzaria import SistemaPizzaria
+        diretorio = diretorio or tempfile.mkdtemp(prefix="replay_pizzaria_")
+        self.sistema = SistemaPizzaria(os.path.join(diretorio, "pedidos.pickle"),
+                                       os.path.join(diretorio, "cardapio.pickle"))
+        self.salvar = salvar
+
+    def criar(self, op: Dict) -> int:
+        pedido = self.sistema.criar_pedido(
+            op.get("cliente", ""), op.get("telefone", ""), op["sabor"],
+            op.get("tamanho") or "Média", op.get("adicionais") or [],
+            op.get("observacoes", ""), _timestamp(op), salvar=self.salvar)
+        return pedido.numero
+
+    def editar(self, numero: int, op: Dict) -> None:
+        self.sistema.editar_pedido(
+            numero, sabor=op.get("sabor") or None, tamanho=op.get("tamanho") or None,
+            adicionais=op.get("adicionais") or None, observacoes=op.get("observacoes") or None,
+            status=op.get("status") or None, salvar=self.salvar)
+
+    def entregar(self, numero: int, op: Dict) -> None:
+        self.sistema.entregar(numero, salvar=self.salvar)
+
+
+class BackendDjango:
+    """Reproduz as operações nos models do Django (exige settings configurado)"""
+    nome = "django"
+
+    def __init__(self, app: str = "pizzaria"):
+        configurar_django(app)
+        from django.core.exceptions import ObjectDoesNotExist
+        self.ObjectDoesNotExist = ObjectDoesNotExist
+        models = importlib.import_module(f"{app}.models")
+        self.Pedido = models.Pedido
+        self.sabores = {s.nome: s for s in models.Sabor.objects.filter(ativo=True)}
+        self.adicionais = {a.nome: a for a in models.Adicional.objects.filter(ativo=True)}
+
+    def _adicionais(self, nomes: List[str]):
+        return [self.adicionais[nome] for nome in nomes]
+
+    def criar(self, op: Dict) -> int:
+        # Mesmo fluxo da view novo_pedido
+        sabor, tamanho = self.sabores[op["sabor"]], op.get("tamanho") or "Média"
+        pedido = self.Pedido.objects.create(
+            cliente_nome=op.get("cliente", ""),
+            cliente_telefone=op.get("telefone", ""),
+            sabor=sabor,
+            tamanho=tamanho,
+            observacoes=op.get("observacoes", ""),
+        )
+        pedido.criar_itens([(sabor, tamanho, self._adicionais(op.get("adicionais") or []))])
+        return pedido.numero
+
+    def _pedido(self, numero: int):
+        try:
+            return self.Pedido.objects.get(numero=numero)
+        except self.ObjectDoesNotExist as erro:
+            # Como no backend pickle: pedido inexistente conta como erro do replay
+            raise LookupError(f"Pedido #{numero} não existe") from erro
+
+    def editar(self, numero: int, op: Dict) -> None:
+        pedido = self._pedido(numero)
+        if op.get("sabor"):
+            pedido.sabor = self.sabores[op["sabor"]]
+        if op.get("tamanho"):
+            pedido.tamanho = op["tamanho"]
+        if op.get("observacoes"):
+            pedido.observacoes = op["observacoes"]
+        if op.get("status"):
+            pedido.status = op["status"]
+            pedido.itens_para_status(op["status"]).update(status=op["status"])
+        if op.get("adicionais"):
+            pedido.adicionais.set(self._adicionais(op["adicionais"]))
+        pedido.sincronizar_primeira_pizza()
+        pedido.calcular_valor_total()
+        pedido.save()
+
+    def entregar(self, numero: int, op: Dict) -> None:
+        # Pelo save(), como na view: grava data_entrega e registra a entrega nas métricas
+        pedido = self._pedido(numero)
+        pedido.status = "Entregue"
+        pedido.save()
+
+
+def reproduzir(operacoes: Iterator[Dict], backend, velocidade: float = 0.0) -> Dict:
+    """Reproduz as operações e retorna as métricas de vazão e latência.
+
+    velocidade = 0 executa o mais rápido possível; velocidade = N reproduz
+    o ritmo do log N vezes mais rápido que o original.
+    """
+    latencias: Dict[str, List[float]] = {op: [] for op in OPERACOES}
+    numeros: Dict[str, int] = {}  # número no log -> número criado no backend
+    erros = 0
+    inicio_log = None
+    inicio = time.perf_counter()
+
+    for op in operacoes:
+        tipo = op.get("operacao", "criar")
+        if tipo not in OPERACOES:
+            erros += 1
+            continue
+
+        # Respeita o intervalo original entre as operações
+        momento = _timestamp(op)
+        if velocidade > 0 and momento is not None:
+            if inicio_log is None:
+                inicio_log = momento
+            alvo = (momento - inicio_log).total_seconds() / velocidade
+            espera = alvo - (time.perf_counter() - inicio)
+            if espera > 0:
+                time.sleep(espera)
+
+        t0 = time.perf_counter()
+        try:
+            if tipo == "criar":
+                numero = backend.criar(op)
+                if op.get("numero") not in (None, ""):
+                    numeros[str(op["numero"])] = numero
+            else:
+                numero = numeros.get(str(op.get("numero")))
+                if numero is None:
+                    raise KeyError(f"Pedido {op.get('numero')} não foi criado no replay")
+                getattr(backend, tipo)(numero, op)
+        except (ValueError, LookupError):
+            erros += 1
+            continue
+        latencias[tipo].append((time.perf_counter() - t0) * 1000)
+
+    duracao = time.perf_counter() - inicio
+    total = sum(len(v) for v in latencias.values())
+    resultado = {
+        "backend": backend.nome,
+        "operacoes": total,
+        "erros": erros,
+        "duracao_s": duracao,
+        "vazao_ops_s": total / duracao if duracao else 0.0,
+        "latencia_ms": {},
+    }
+    for tipo, valores in latencias.items():
+        if not valores:
+            continue
+        valores.sort()
+        resultado["latencia_ms"][tipo] = {
+            "n": len(valores),
+            "p50": percentil(valores, 50),
+            "p90": percentil(valores, 90),
+            "p99": percentil(valores, 99),
+            "max": valores[-1],
+        }
+    return resultado
+
+
+def imprimir_resultado(resultado: Dict) -> None:
+    print(f"\n=== Replay ({resultado['backend']}) ===")
+    print(f"Operações: {resultado['operacoes']} | Erros: {resultado['erros']}")
+    print(f"Duração: {resultado['duracao_s']:.2f} s | Vazão: {resultado['vazao_ops_s']:.1f} ops/s")
+    for tipo, lat in resultado["latencia_ms"].items():
+        print(f"{tipo:>8}: n={lat['n']} p50={lat['p50']:.2f}ms p90={lat['p90']:.2f}ms "
+              f"p99={lat['p99']:.2f}ms max={lat['max']:.2f}ms")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay de log de pedidos para teste de carga")
+    parser.add_argument("log", help="arquivo .csv ou .jsonl com as operações")
+    parser.add_argument("--backend", choices=["pickle", "django"], default="pickle")
+    parser.add_argument("--velocidade", type=float, default=0.0,
+                        help="fator de aceleração do ritmo original (0 = máximo)")
+    parser.add_argument("--diretorio", help="diretório dos pickles (padrão: temporário)")
+    parser.add_argument("--sem-salvar", action="store_true",
+                        help="não persiste a cada operação (mede só o núcleo em memória)")
+    parser.add_argument("--settings", help="DJANGO_SETTINGS_MODULE para o backend django")
+    parser.add_argument("--app", default="pizzaria", help="app Django com os models")
+    parser.add_argument("--json", help="grava o resultado em JSON neste arquivo")
+    args = parser.parse_args(argv)
+
+    if args.backend == "django":
+        if args.settings:
+            os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+        try:
+            backend = BackendDjango(args.app)
+        except ImportError as erro:
+            parser.error(str(erro))
+    else:
+        backend = BackendPickle(args.diretorio, salvar=not args.sem_salvar)
+
+    resultado = reproduzir(ler_log(args.log), backend, args.velocidade)
+    imprimir_resultado(resultado)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
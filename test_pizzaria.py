@@ -0,0 +1,347 @@
+"""Testes do sistema de linha de comando.
+
+    python -m pytest test_pizzaria.py
+"""
+import datetime
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+import types
+import unittest
+from unittest import mock
+
+import historico_binario
+import pizzaria
+from historico_binario import HistoricoBinario, gravar_historico
+from pizzaria import HORAS_SEMANA, ArquivoFrio, Instrumentacao, PrevisaoDemanda, SistemaPizzaria, hora_da_semana
+from relatorio_paralelo import gerar_relatorio_paralelo
+
+INICIO = datetime.datetime(1900, 1, 1)
+
+
+def criar_sistema(diretorio):
+    return SistemaPizzaria(os.path.join(diretorio, "pedidos.pickle"),
+                           os.path.join(diretorio, "cardapio.pickle"))
+
+
+def criar_historico(sistema, quantidade, inicio, semente=0):
+    """Cria e entrega `quantidade` pedidos, um a cada três horas a partir de `inicio`"""
+    aleatorio = random.Random(semente)
+    sabores = list(sistema.cardapio["sabores"])
+    tamanhos = list(sistema.cardapio["tamanhos"])
+    adicionais = list(sistema.cardapio["adicionais"])
+    for i in range(quantidade):
+        outras = [(aleatorio.choice(sabores), aleatorio.choice(tamanhos), [])] if i % 3 == 0 else None
+        sistema.criar_pedido(
+            f"Cliente {i % 7}", "(11) 99999-0000", aleatorio.choice(sabores), aleatorio.choice(tamanhos),
+            aleatorio.sample(adicionais, i % 3), data_hora=inicio + datetime.timedelta(hours=3 * i),
+            outras_pizzas=outras, salvar=False,
+        )
+        sistema.entregar(salvar=False)
+
+
+def resumo(pedidos):
+    return [(p.numero, p.data_hora, p.status, [(i.sabor, i.tamanho, i.adicional) for i in p.itens])
+            for p in pedidos]
+
+
+class InstrumentacaoTests(unittest.TestCase):
+    def test_operacoes_aninhadas_viram_amostras_separadas(self):
+        instrumentacao = Instrumentacao()
+        with tempfile.TemporaryDirectory() as diretorio:
+            sistema = SistemaPizzaria(os.path.join(diretorio, "pedidos.pickle"),
+                                      os.path.join(diretorio, "cardapio.pickle"), instrumentacao)
+            sabor = next(iter(sistema.cardapio["sabores"]))
+            sistema.criar_pedido("Cliente", "(11) 99999-0000", sabor, "Média", [])
+        metricas = instrumentacao.resumo()
+        self.assertEqual(metricas["criar_pedido"]["n"], 1)
+        self.assertEqual(metricas["criar_pedido"]["objetos"], 1)
+        # O salvamento dentro de criar_pedido tem a própria amostra
+        self.assertGreater(metricas["salvar_dados"]["bytes_medio"], 0)
+        self.assertEqual(metricas["criar_pedido"]["bytes_medio"], metricas["salvar_dados"]["bytes_medio"])
+
+    def test_pico_de_memoria_de_operacoes_aninhadas(self):
+        self.addCleanup(tracemalloc.stop)
+        instrumentacao = Instrumentacao(medir_memoria=True)
+        sistema = types.SimpleNamespace(bytes_escritos=0, fila_pedidos=[], quantidade_historico=0)
+
+        def interna(sistema):
+            bytearray(1 << 20)
+
+        def externa(sistema):
+            bytearray(8 << 20)
+            instrumentacao.medir("interna", sistema, interna, (), {})
+
+        instrumentacao.medir("externa", sistema, externa, (), {})
+        picos = {amostra[0]: amostra[4] for amostra in instrumentacao.amostras}
+        # A medição interna não apaga o pico que a externa teve antes dela
+        self.assertGreaterEqual(picos["externa"], 8 << 20)
+        self.assertGreaterEqual(picos["interna"], 1 << 20)
+        self.assertLess(picos["interna"], 8 << 20)
+
+
+class HistoricoBinarioTests(unittest.TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.sistema = criar_sistema(diretorio.name)
+        criar_historico(self.sistema, 300, datetime.datetime(2024, 1, 1, 7, 30))
+        self.caminho = os.path.join(diretorio.name, "historico.bin")
+        gravar_historico(self.sistema.iterar_pedidos(incluir_fila=False), self.caminho, self.sistema.motor_precos)
+
+    def test_relatorio_igual_ao_do_sistema(self):
+        periodos = [
+            (INICIO, datetime.datetime.now()),
+            (datetime.datetime(2024, 1, 10), datetime.datetime(2024, 1, 20, 12)),
+        ]
+        for numpy in (False, True):
+            if numpy and historico_binario.np is None:
+                continue
+            for data_inicio, data_fim in periodos:
+                with self.subTest(numpy=numpy, data_inicio=data_inicio):
+                    with mock.patch.object(historico_binario, "np", historico_binario.np if numpy else None), \
+                            HistoricoBinario(self.caminho) as historico:
+                        relatorio = historico.relatorio(data_inicio, data_fim)
+                    self.assertEqual(relatorio, self.sistema.gerar_relatorio(data_inicio, data_fim))
+
+    def test_periodo_sem_pedidos(self):
+        with HistoricoBinario(self.caminho) as historico:
+            self.assertEqual(len(historico), sum(len(p.itens) for p in self.sistema.historico_pedidos))
+            self.assertIsNone(historico.relatorio(INICIO, datetime.datetime(2000, 1, 1)))
+
+
+class RelatorioParaleloTests(unittest.TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.sistema = criar_sistema(diretorio.name)
+        inicio = datetime.datetime.now() - datetime.timedelta(days=200)
+        criar_historico(self.sistema, 1500, inicio)
+        # Parte do histórico vai para o arquivo frio, que também vira partições
+        self.sistema.arquivar_historico(dias=120, salvar=False)
+
+    def test_paralelo_igual_ao_sequencial(self):
+        periodos = [
+            (INICIO, datetime.datetime.now()),
+            (datetime.datetime.now() - datetime.timedelta(days=150),
+             datetime.datetime.now() - datetime.timedelta(days=30)),
+        ]
+        for data_inicio, data_fim in periodos:
+            esperado = self.sistema.gerar_relatorio(data_inicio, data_fim)
+            for processos in (1, 3):
+                with self.subTest(data_inicio=data_inicio, processos=processos):
+                    relatorio = gerar_relatorio_paralelo(self.sistema, data_inicio, data_fim,
+                                                         processos, minimo=100)
+                    self.assertEqual(relatorio, esperado)
+                    # A ordem das chaves também é a do relatório sequencial
+                    for chave in ("sabores", "adicionais", "tamanhos", "vendas_por_dia"):
+                        self.assertEqual(list(relatorio[chave]), list(esperado[chave]))
+
+    def test_periodo_sem_pedidos(self):
+        data_fim = datetime.datetime(2000, 1, 1)
+        self.assertIsNone(gerar_relatorio_paralelo(self.sistema, INICIO, data_fim, 2, minimo=100))
+
+
+class PrevisaoDemandaTests(unittest.TestCase):
+    def construir(self, pedidos, numpy):
+        previsao = PrevisaoDemanda()
+        if numpy:
+            previsao.construir(pedidos)
+        else:
+            # None em sys.modules faz o import falhar
+            with mock.patch.dict(sys.modules, {"numpy": None}):
+                previsao.construir(pedidos)
+        return previsao
+
+    def test_historico_vazio(self):
+        for numpy in (False, True):
+            with self.subTest(numpy=numpy):
+                previsao = self.construir([], numpy)
+                self.assertEqual(previsao.pedidos, [0] * HORAS_SEMANA)
+                self.assertEqual(previsao.minutos_forno, [0] * HORAS_SEMANA)
+                self.assertIsNone(previsao.inicio)
+
+    def test_numpy_igual_ao_python(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("NumPy não instalado")
+        with tempfile.TemporaryDirectory() as diretorio:
+            sistema = criar_sistema(diretorio)
+            criar_historico(sistema, 500, datetime.datetime(2024, 1, 1, 7, 30))
+            pedidos = sistema.historico_pedidos
+        python = self.construir(pedidos, numpy=False)
+        vetorizada = self.construir(pedidos, numpy=True)
+        self.assertEqual(vetorizada.pedidos, python.pedidos)
+        self.assertEqual(vetorizada.minutos_forno, python.minutos_forno)
+        faixa = hora_da_semana(pedidos[0].data_hora)
+        self.assertEqual(python.pedidos[faixa], sum(hora_da_semana(p.data_hora) == faixa for p in pedidos))
+
+
+class ArquivoFrioTests(unittest.TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+        sistema = criar_sistema(self.diretorio)
+        criar_historico(sistema, 120, datetime.datetime(2024, 1, 1))
+        self.pedidos = sistema.historico_pedidos
+
+    def test_ida_e_volta(self):
+        arquivo = ArquivoFrio(os.path.join(self.diretorio, "arquivo"))
+        with mock.patch.object(pizzaria, "PEDIDOS_POR_SEGMENTO_ARQUIVO", 50):
+            self.assertEqual(arquivo.arquivar(self.pedidos), 120)
+        self.assertEqual([s["quantidade"] for s in arquivo.segmentos], [50, 50, 20])
+
+        # Um leitor novo só conhece o que foi gravado no disco
+        relido = ArquivoFrio(arquivo.diretorio)
+        self.assertEqual(relido.segmentos, arquivo.segmentos)
+        pedidos = [p for segmento in relido.segmentos_no_periodo() for p in segmento]
+        self.assertEqual(resumo(pedidos), resumo(self.pedidos))
+        self.assertEqual(relido.buscar(77).numero, 77)
+        self.assertIsNone(relido.buscar(121))
+
+    def test_periodo_le_so_os_segmentos_necessarios(self):
+        arquivo = ArquivoFrio(os.path.join(self.diretorio, "arquivo"))
+        with mock.patch.object(pizzaria, "PEDIDOS_POR_SEGMENTO_ARQUIVO", 50):
+            arquivo.arquivar(self.pedidos)
+        data_inicio = self.pedidos[60].data_hora
+        data_fim = self.pedidos[70].data_hora
+        self.assertEqual([s["arquivo"] for s in arquivo.indices_no_periodo(data_inicio, data_fim)],
+                         [arquivo.segmentos[1]["arquivo"]])
+
+    def test_pedido_arquivado_sem_salvar_o_historico_nao_conta_duas_vezes(self):
+        sistema = criar_sistema(self.diretorio)
+        # Oito pedidos por dia nos últimos 30 dias
+        inicio = datetime.datetime.now() - datetime.timedelta(days=30, hours=-1)
+        criar_historico(sistema, 240, inicio)
+        sistema.salvar_dados()
+        # Como uma queda entre a gravação do arquivo e a do histórico
+        self.assertEqual(sistema.arquivar_historico(dias=15, salvar=False), 120)
+
+        relido = criar_sistema(self.diretorio)
+        self.assertEqual(relido.quantidade_historico, 120)
+        self.assertEqual(relido.gerar_relatorio(INICIO, datetime.datetime.now())["total_pedidos"], 240)
+        relido.salvar_dados()
+        self.assertEqual(criar_sistema(self.diretorio).quantidade_historico, 120)
+
+    def test_indices_incluem_pedidos_arquivados(self):
+        sistema = criar_sistema(self.diretorio)
+        criar_historico(sistema, 120, datetime.datetime.now() - datetime.timedelta(days=30))
+        esperado = [p.numero for p in sistema.indice_ingredientes.pedidos_com_ingrediente("calabresa")]
+        self.assertGreater(sistema.arquivar_historico(dias=20), 0)
+
+        relido = criar_sistema(self.diretorio)
+        self.assertEqual(len(relido.indice_clientes.ultimos_pedidos("(11) 99999-0000", 200)), 120)
+        self.assertEqual([p.numero for p in relido.indice_ingredientes.pedidos_com_ingrediente("calabresa")],
+                         esperado)
+
+
+class HistoricoSegmentadoTests(unittest.TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+        self.sistema = criar_sistema(self.diretorio)
+        patch_segmento = mock.patch.object(pizzaria, "TAMANHO_SEGMENTO", 40)
+        patch_segmento.start()
+        self.addCleanup(patch_segmento.stop)
+
+    def recarregar(self):
+        return criar_sistema(self.diretorio)
+
+    def test_ida_e_volta(self):
+        criar_historico(self.sistema, 100, datetime.datetime(2024, 1, 1))
+        # Substituir o histórico força a regravação em segmentos de TAMANHO_SEGMENTO
+        self.sistema.historico_pedidos = self.sistema.historico_pedidos
+        self.sistema.salvar_dados()
+        self.assertEqual([s["quantidade"] for s in self.sistema._segmentos_salvos], [40, 40, 20])
+
+        relido = self.recarregar()
+        # O histórico só é lido quando usado
+        self.assertIsNone(relido._historico)
+        self.assertEqual(relido.quantidade_historico, 100)
+        self.assertEqual(relido.buscar_pedido(55).numero, 55)
+        self.assertIsNone(relido._historico)
+        self.assertEqual(resumo(relido.historico_pedidos), resumo(self.sistema.historico_pedidos))
+
+    def test_entregas_novas_viram_um_segmento_anexado(self):
+        criar_historico(self.sistema, 50, datetime.datetime(2024, 1, 1))
+        self.sistema.salvar_dados()
+        geracao = self.sistema._geracao_historico
+
+        relido = self.recarregar()
+        criar_historico(relido, 5, datetime.datetime(2024, 3, 1), semente=1)
+        relido.salvar_dados()
+        self.assertEqual(relido._geracao_historico, geracao)
+        self.assertEqual([s["quantidade"] for s in relido._segmentos_salvos], [50, 5])
+
+        final = self.recarregar()
+        self.assertEqual([p.numero for p in final.historico_pedidos], list(range(1, 56)))
+        self.assertEqual(final.contador_pedidos, 56)
+
+    def test_historico_substituido_gera_nova_geracao(self):
+        criar_historico(self.sistema, 100, datetime.datetime(2024, 1, 1))
+        self.sistema.salvar_dados()
+        anterior = self.sistema._caminho_historico(self.sistema._geracao_historico)
+
+        relido = self.recarregar()
+        relido.historico_pedidos = relido.historico_pedidos[60:]
+        relido.salvar_dados()
+        self.assertFalse(os.path.exists(anterior))
+        final = self.recarregar()
+        self.assertEqual([p.numero for p in final.historico_pedidos], list(range(61, 101)))
+
+    def test_instantaneo_le_os_segmentos_de_quando_foi_criado(self):
+        criar_historico(self.sistema, 100, datetime.datetime(2024, 1, 1))
+        self.sistema.salvar_dados()
+        relido = self.recarregar()
+        esperado = relido.gerar_relatorio(INICIO, datetime.datetime.now())
+
+        instantaneo = relido.instantaneo()
+        self.assertIsNone(relido._historico)
+        # Uma nova geração apaga o arquivo antigo, que o instantâneo mantém aberto
+        relido.historico_pedidos = relido.historico_pedidos[:10]
+        relido.salvar_dados()
+        with instantaneo:
+            self.assertEqual(instantaneo.gerar_relatorio(INICIO, datetime.datetime.now()), esperado)
+
+    def test_geracao_aberta_so_e_apagada_depois_de_liberada(self):
+        criar_historico(self.sistema, 100, datetime.datetime(2024, 1, 1))
+        self.sistema.salvar_dados()
+        relido = self.recarregar()
+        anterior = relido._caminho_historico(relido._geracao_historico)
+        instantaneo = relido.instantaneo()
+
+        # Como no Windows: arquivo aberto não pode ser apagado
+        remover = os.remove
+
+        def remover_se_fechado(caminho):
+            if caminho == anterior and not instantaneo._arquivo_historico.closed:
+                raise PermissionError(caminho)
+            remover(caminho)
+
+        with mock.patch("os.remove", remover_se_fechado):
+            relido.historico_pedidos = relido.historico_pedidos[:10]
+            relido.salvar_dados()
+            self.assertTrue(os.path.exists(anterior))
+            with instantaneo:
+                self.assertEqual(instantaneo.gerar_relatorio(INICIO, datetime.datetime.now())["total_pedidos"], 100)
+            relido.salvar_dados()
+        self.assertFalse(os.path.exists(anterior))
+        self.assertEqual(self.recarregar().quantidade_historico, 10)
+
+    def test_carga_apaga_geracoes_que_sobraram(self):
+        criar_historico(self.sistema, 10, datetime.datetime(2024, 1, 1))
+        self.sistema.salvar_dados()
+        sobra = self.sistema._caminho_historico(self.sistema._geracao_historico + 5)
+        with open(sobra, "wb"):
+            pass
+        self.assertEqual(self.recarregar().quantidade_historico, 10)
+        self.assertFalse(os.path.exists(sobra))
+
+
+if __name__ == "__main__":
+    unittest.main()